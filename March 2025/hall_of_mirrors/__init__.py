@@ -5,20 +5,123 @@ This package provides tools for solving Hall of Mirrors puzzles, which involve
 placing mirrors to create specific ray trajectories.
 """
 
-from .factorization import ultra_factorizations
-from .path_validation import is_valid_path
-from .simulation import simulate_ray, compute_trajectory_product
+from .factorization import (ultra_factorizations, iter_ultra_factorizations,
+                            count_ultra_factorizations, multiset_permutations)
+from .path_validation import is_valid_path, iter_valid_paths, build_factor_trie, walk_factor_trie
+from .simulation import (MirrorIndex, SIDES, simulate_ray, ray_exit, compute_trajectory_product,
+                         trace_all_borders, border_products_dict, slot_of_position,
+                         position_of_slot)
 from .visualization import plot_solution
-from .solver import solve_puzzle, produce_matrix, is_compatible, merge_layers
+from .solver import (solve_puzzle, iter_solutions, count_solutions, solve_clues,
+                     iter_clue_solutions, solve_canonical, clue_configs,
+                     iter_clue_candidates, clue_layer, produce_matrix,
+                     is_compatible, merge_layers)
+from .bitboard import (Bitboard, EMPTY_BITBOARD, build_bitboard, matrix_to_bitboard,
+                       bitboard_to_matrix, is_compatible_bitboard, merge_bitboards)
+from .batch import stack_layer, is_compatible_batch, merge_layers_batch
+from .parallel import parallel_search
+from .search import (static_search, iter_static_search, mrv_search, iter_mrv_search,
+                     pairwise_compatibility, bitset_search, iter_bitset_search)
+from .propagation import propagate
+from .sat import CDCLSolver, encode_layers, sat_search, iter_sat_search
+from .cells import CellSearch, cell_search
+from .candidate import Candidate
+from .symmetry import (SYMMETRIES, inverse_symmetry, compose_symmetries, swaps_mirrors,
+                       transform_point, transform_cell, transform_slot, transform_config,
+                       transform_bitboard, transform_candidate, transform_layer,
+                       transform_matrix, transform_clues,
+                       transform_solution, canonicalize, canonical_layer_key)
+from .layer_cache import LayerCache, layer_key
+from .stats import SolveStats
+from .budget import (CancelToken, Incomplete, SearchInterrupted, load_checkpoint,
+                     save_checkpoint)
+from .session import PuzzleSession
+from .jobs import parse_spec, solve_spec, border_answer, run_batch
 
 __all__ = [
     'ultra_factorizations',
+    'iter_ultra_factorizations',
+    'count_ultra_factorizations',
+    'multiset_permutations',
     'is_valid_path',
+    'iter_valid_paths',
+    'build_factor_trie',
+    'walk_factor_trie',
+    'MirrorIndex',
     'simulate_ray',
+    'ray_exit',
     'compute_trajectory_product',
+    'SIDES',
+    'trace_all_borders',
+    'border_products_dict',
+    'slot_of_position',
+    'position_of_slot',
     'plot_solution',
     'solve_puzzle',
+    'iter_solutions',
+    'count_solutions',
+    'solve_clues',
+    'iter_clue_solutions',
+    'solve_canonical',
+    'clue_configs',
+    'iter_clue_candidates',
+    'clue_layer',
+    'Candidate',
     'produce_matrix',
     'is_compatible',
-    'merge_layers'
+    'merge_layers',
+    'Bitboard',
+    'EMPTY_BITBOARD',
+    'build_bitboard',
+    'matrix_to_bitboard',
+    'bitboard_to_matrix',
+    'is_compatible_bitboard',
+    'merge_bitboards',
+    'stack_layer',
+    'is_compatible_batch',
+    'merge_layers_batch',
+    'parallel_search',
+    'static_search',
+    'iter_static_search',
+    'mrv_search',
+    'iter_mrv_search',
+    'pairwise_compatibility',
+    'bitset_search',
+    'iter_bitset_search',
+    'propagate',
+    'CDCLSolver',
+    'encode_layers',
+    'sat_search',
+    'iter_sat_search',
+    'CellSearch',
+    'cell_search',
+    'SYMMETRIES',
+    'inverse_symmetry',
+    'compose_symmetries',
+    'swaps_mirrors',
+    'transform_point',
+    'transform_cell',
+    'transform_slot',
+    'transform_config',
+    'transform_bitboard',
+    'transform_candidate',
+    'transform_layer',
+    'transform_matrix',
+    'transform_clues',
+    'transform_solution',
+    'canonicalize',
+    'canonical_layer_key',
+    'LayerCache',
+    'layer_key',
+    'SolveStats',
+    'CancelToken',
+    'Incomplete',
+    'SearchInterrupted',
+    'load_checkpoint',
+    'save_checkpoint',
+    'PuzzleSession',
+    'parse_spec',
+    'solve_spec',
+    'border_answer',
+    'run_batch'
 ]
@@ -0,0 +1,68 @@
+"""
+Batch solver entry point.
+
+Usage:
+    python -m hall_of_mirrors [specs.jsonl] [-o results.jsonl] [-j WORKERS]
+
+Reads one puzzle spec per line (see jobs.parse_spec) from a file or stdin and
+writes one JSON result per line as each puzzle is solved.
+"""
+import argparse
+import sys
+from .jobs import run_batch
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m hall_of_mirrors',
+                                     description='Solve Hall of Mirrors puzzles from JSONL specs.')
+    parser.add_argument('input', nargs='?', default='-',
+                        help="JSONL file of puzzle specs ('-' for stdin, the default)")
+    parser.add_argument('-o', '--output', default='-',
+                        help="file to write JSONL results to ('-' for stdout, the default)")
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='number of worker processes')
+    parser.add_argument('--engine', choices=('backtrack', 'sat', 'cells'),
+                        help='default solving engine')
+    parser.add_argument('--backend', choices=('bitboard', 'numpy', 'matrix'),
+                        help='default state backend')
+    parser.add_argument('--strategy', choices=('mrv', 'bitset', 'static'),
+                        help='default backtracking strategy')
+    parser.add_argument('--cache', metavar='DIR',
+                        help='directory of a persistent candidate layer cache shared by all specs')
+    parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                        help='time allowed per puzzle; slower puzzles are reported as incomplete')
+    parser.add_argument('--checkpoint-dir', metavar='DIR',
+                        help='directory where stopped searches are saved and resumed from on the '
+                             'next run')
+    parser.add_argument('--canonical', action='store_true',
+                        help='solve each puzzle in its canonical orientation, reusing the solutions '
+                             'of rotated or reflected copies')
+    args = parser.parse_args(argv)
+    if args.engine in ('sat', 'cells') and (args.timeout is not None
+                                            or args.checkpoint_dir is not None):
+        parser.error(f"--timeout and --checkpoint-dir need the backtrack engine, "
+                     f"not --engine {args.engine}")
+
+    defaults = {key: value for key, value in (('engine', args.engine),
+                                              ('backend', args.backend),
+                                              ('strategy', args.strategy),
+                                              ('cache', args.cache),
+                                              ('timeout', args.timeout),
+                                              ('checkpoint_dir', args.checkpoint_dir))
+                if value is not None}
+
+    infile = sys.stdin if args.input == '-' else open(args.input)
+    outfile = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        counts = run_batch(infile, outfile, workers=args.workers, defaults=defaults,
+                           canonical=args.canonical)
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+
+    print(', '.join(f"{count} {status}" for status, count in counts.items()), file=sys.stderr)
+    return 1 if counts['error'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
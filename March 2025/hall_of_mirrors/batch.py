@@ -0,0 +1,65 @@
+import numpy as np
+
+# Stacked layers only hold the small cell codes 0, 1, -2, -3 and -4.
+LAYER_DTYPE = np.int8
+
+
+def stack_layer(matrices, grid_size):
+    """
+    Stack the candidate matrices of one clue into a single array.
+
+    Args:
+        matrices: Iterable of (grid_size, grid_size) candidate matrices
+        grid_size: Size of the grid
+
+    Returns:
+        An (n_candidates, grid_size, grid_size) int8 array
+    """
+    matrices = list(matrices)
+    if not matrices:
+        return np.zeros((0, grid_size, grid_size), dtype=LAYER_DTYPE)
+    return np.stack(matrices).astype(LAYER_DTYPE)
+
+
+def is_compatible_batch(base, stack):
+    """
+    Vectorized counterpart of solver.is_compatible.
+
+    Checks every candidate of a stacked layer against the same base matrix in
+    a single NumPy pass.
+
+    Args:
+        base: (grid_size, grid_size) base matrix
+        stack: (n_candidates, grid_size, grid_size) stacked candidate layer
+
+    Returns:
+        A boolean array of length n_candidates, True where compatible
+    """
+    base = np.asarray(base)
+    base_mirror = (base == -2) | (base == -3)
+    base_no_mirror = (base == 1) | (base == -4)
+
+    cand_mirror = (stack == -2) | (stack == -3)
+    cand_no_mirror = (stack == 1) | (stack == -4)
+
+    conflict = (cand_no_mirror & base_mirror) | (cand_mirror & base_no_mirror)
+    conflict |= cand_mirror & base_mirror & (stack != base)
+    return ~conflict.any(axis=(1, 2))
+
+
+def merge_layers_batch(base, stack):
+    """
+    Vectorized counterpart of solver.merge_layers.
+
+    Args:
+        base: (grid_size, grid_size) base matrix
+        stack: (n_candidates, grid_size, grid_size) stacked candidate layer
+
+    Returns:
+        An (n_candidates, grid_size, grid_size) array holding base merged with
+        each candidate
+    """
+    base = np.asarray(base)
+    merged = np.where((stack != 0) & (base == 0), stack, base)
+    merged[stack == -4] = -4
+    return merged.astype(LAYER_DTYPE)
@@ -0,0 +1,311 @@
+"""
+Stage-level benchmark of the solver.
+
+Usage:
+    python -m hall_of_mirrors.benchmark [-o results.json] [--sizes 8 12 16]
+                                        [--memory] [--compare baseline.json]
+
+Times every stage of a solve separately on the puzzles of solution/puzzles.jsonl
+(or any JSONL specs) and on generated grids of increasing size, optionally
+records the peak memory allocated by each stage, and writes everything as
+JSON. With --compare, stages that got slower or hungrier than a stored run
+are reported and the exit code is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from .factorization import iter_ultra_factorizations
+from .simulation import trace_all_borders
+from .solver import (clue_configs, clue_layer, solve_clues, _backend_ops, _slot_clues,
+                     _iter_layer_solutions, _baseline_filter)
+from .propagation import propagate
+from .jobs import parse_spec
+from .generator import generate_puzzle
+
+BENCHMARK_VERSION = 2
+
+# Stages of a solve, in order, with what each one times:
+#   factorize  enumerating the factor tuples of every clue (iter_ultra_factorizations)
+#   validate   factorizing every clue and checking each tuple with is_valid_path
+#              (clue_configs with enumeration='factorize', the unfused pipeline)
+#   fused      enumerating every clue's valid paths with the fused DFS the solver
+#              uses (clue_layer, unfiltered); the later stages start from these
+#   states     building the backend states of every candidate
+#   filter     baseline filtering, and propagation (propagation.propagate) when
+#              enabled
+#   search     finding the first solution
+#   borders    tracing every border of the solution (trace_all_borders)
+#   total      solve_clues end to end, with its streaming pipeline
+STAGES = ('factorize', 'validate', 'fused', 'states', 'filter', 'search', 'borders', 'total')
+
+DEFAULT_SIZES = (8, 12, 16)
+
+DEFAULT_SPECS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'solution', 'puzzles.jsonl')
+
+def _measure(func, repeat, memory=False):
+    """
+    Run func repeat times, then, with memory=True, once more under tracemalloc
+    (which slows it down several times over).
+
+    Returns:
+        A tuple (result, stats) with func's result and a dictionary holding
+        the best wall time in seconds and the peak bytes allocated (None
+        without memory)
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result, {'seconds': best, 'peak_bytes': peak}
+
+def benchmark_stages(clues, grid_size=10, max_tuple_length=None, max_factor=None,
+                     backend='bitboard', strategy='mrv', engine='backtrack', propagation=False,
+                     repeat=3, memory=False):
+    """
+    Time and measure every stage of a solve separately.
+
+    Each stage consumes the output of the one before, as in a real solve, but
+    without the streaming of solve_clues: candidates are enumerated whole and
+    then filtered, so that the stages can be told apart. The 'total' stage
+    runs solve_clues itself.
+
+    Args:
+        clues: Dictionary mapping (side, index) slots to clue numbers
+        grid_size, max_tuple_length, max_factor: As in solver.solve_clues
+        backend, strategy, engine, propagation: Solver options (see
+            solver.solve_puzzle)
+        repeat: Number of timed runs per stage (the best one is kept)
+        memory: If True, also record the peak memory of every stage
+
+    Returns:
+        A dictionary with the puzzle size, candidate counts and a
+        {'seconds', 'peak_bytes'} entry for every stage of STAGES
+    """
+    clue_list, cluepos, max_tuple_length, max_factor = _slot_clues(
+        clues, grid_size, max_tuple_length, max_factor)
+    ops = _backend_ops(backend, grid_size)
+    stages = {}
+
+    def measure(func):
+        return _measure(func, repeat, memory)
+
+    _, stages['factorize'] = measure(
+        lambda: [list(iter_ultra_factorizations(clue_num, max_tuple_length, max_factor))
+                 for clue_num, _, _ in clue_list])
+
+    _, stages['validate'] = measure(
+        lambda: [clue_configs(*clue, grid_size, cluepos, max_tuple_length, max_factor,
+                              enumeration='factorize')
+                 for clue in clue_list])
+
+    layers, stages['fused'] = measure(
+        lambda: [clue_layer(*clue, grid_size, cluepos, max_tuple_length, max_factor)
+                 for clue in clue_list])
+
+    candidate_layers, stages['states'] = measure(
+        lambda: [(candidates, ops.from_bitboards([c.bitboard(grid_size) for c in candidates]))
+                 for candidates in layers])
+
+    if propagation:
+        (filtered, baseline, report), stages['filter'] = measure(
+            lambda: propagate(candidate_layers, ops.empty, ops))
+        solved = not report['contradiction']
+    else:
+        (filtered, baseline), stages['filter'] = measure(
+            lambda: _baseline_filter(candidate_layers, ops.empty, ops))
+        solved = all(candidates for candidates, _ in filtered)
+    layer_states = [states for _, states in filtered]
+    solution, stages['search'] = measure(
+        lambda: next(_iter_layer_solutions(layer_states, baseline, ops, grid_size,
+                                           strategy, engine), None) if solved else None)
+
+    final_matrix = (ops.to_matrix(solution[1]) if solution is not None
+                    else np.zeros((grid_size, grid_size), dtype=int))
+    _, stages['borders'] = measure(lambda: trace_all_borders(final_matrix, grid_size))
+
+    _, stages['total'] = measure(
+        lambda: solve_clues(clues, grid_size, max_tuple_length, max_factor,
+                            backend=backend, strategy=strategy, engine=engine,
+                            propagation=propagation))
+
+    return {
+        'grid_size': grid_size,
+        'clues': len(clue_list),
+        'candidates': sum(len(candidates) for candidates in layers),
+        'filtered_candidates': sum(len(candidates) for candidates, _ in filtered),
+        'solved': solution is not None,
+        'stages': stages,
+    }
+
+def run_benchmarks(instances, repeat=3, memory=False, **options):
+    """
+    Benchmark a set of puzzles.
+
+    Args:
+        instances: Iterable of (name, clues, kwargs) tuples, with kwargs holding
+            grid_size and optionally max_tuple_length and max_factor
+        repeat: Number of timed runs per stage
+        memory: If True, also record the peak memory of every stage
+        **options: Solver options for benchmark_stages (backend, strategy, engine,
+            propagation)
+
+    Returns:
+        A JSON-ready dictionary with the environment and the per-instance
+        results of benchmark_stages
+    """
+    results = {}
+    for name, clues, kwargs in instances:
+        results[name] = benchmark_stages(clues, repeat=repeat, memory=memory, **kwargs,
+                                         **options)
+    return {
+        'benchmark_version': BENCHMARK_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'memory': memory,
+        'options': options,
+        'instances': results,
+    }
+
+def spec_instances(path):
+    """(name, clues, kwargs) benchmark instances from a JSONL file of specs."""
+    instances = []
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            spec = json.loads(line)
+            clues, kwargs = parse_spec(spec)
+            kwargs = {key: kwargs[key] for key in ('grid_size', 'max_tuple_length', 'max_factor')
+                      if key in kwargs}
+            instances.append((str(spec.get('id', line_no)), clues, kwargs))
+    return instances
+
+def generated_instances(sizes=DEFAULT_SIZES, seed=0):
+    """
+    (name, clues, kwargs) benchmark instances on generated grids.
+
+    Each grid of size N holds N random non-adjacent mirrors (see
+    generator.generate_puzzle), and all of its border products are given as
+    clues.
+    """
+    instances = []
+    for n in sizes:
+        clues, kwargs = parse_spec(generate_puzzle(n, n_mirrors=n, seed=seed + n))
+        instances.append((f"generated-{n}x{n}", clues, {'grid_size': kwargs['grid_size']}))
+    return instances
+
+def compare_results(current, baseline, threshold=0.25, min_seconds=0.005, min_bytes=65536):
+    """
+    Find the stages that regressed against a stored benchmark run.
+
+    A stage regresses when its time or peak memory grows by more than
+    threshold (relative) and by more than min_seconds or min_bytes (absolute),
+    so that noise on very fast stages is not reported. Memory is only
+    compared when both runs recorded it.
+
+    Args:
+        current: Result of run_benchmarks
+        baseline: Earlier result of run_benchmarks
+        threshold: Allowed relative growth
+        min_seconds: Ignored time growth
+        min_bytes: Ignored memory growth
+
+    Returns:
+        A list of dictionaries (instance, stage, metric, baseline, current,
+        ratio), one per regression
+    """
+    regressions = []
+    for name, result in current['instances'].items():
+        old = baseline.get('instances', {}).get(name)
+        if old is None:
+            continue
+        for stage, stats in result['stages'].items():
+            old_stats = old['stages'].get(stage)
+            if old_stats is None:
+                continue
+            for metric, slack in (('seconds', min_seconds), ('peak_bytes', min_bytes)):
+                before, after = old_stats.get(metric), stats[metric]
+                if before is None or after is None:
+                    continue
+                if after > before * (1 + threshold) and after - before > slack:
+                    regressions.append({'instance': name, 'stage': stage, 'metric': metric,
+                                        'baseline': before, 'current': after,
+                                        'ratio': after / before if before else float('inf')})
+    return regressions
+
+def format_results(results):
+    """Render benchmark results as a text table, one row per instance and stage."""
+    lines = [f"{'instance':<20} {'stage':<11} {'seconds':>10} {'peak KiB':>10}"]
+    for name, result in results['instances'].items():
+        for stage in STAGES:
+            stats = result['stages'][stage]
+            peak = '-' if stats['peak_bytes'] is None else f"{stats['peak_bytes'] / 1024:.1f}"
+            lines.append(f"{name:<20} {stage:<11} {stats['seconds']:>10.4f} {peak:>10}")
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m hall_of_mirrors.benchmark',
+                                     description='Benchmark the solver stage by stage.')
+    parser.add_argument('-o', '--output', help='file to write the JSON results to')
+    parser.add_argument('--specs', default=DEFAULT_SPECS,
+                        help="JSONL puzzle specs to benchmark ('' to skip)")
+    parser.add_argument('--sizes', type=int, nargs='*', default=list(DEFAULT_SIZES),
+                        help='sizes of the generated grids')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated grids')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage')
+    parser.add_argument('--memory', action='store_true',
+                        help='also record the peak memory of every stage (much slower)')
+    parser.add_argument('--backend', choices=('bitboard', 'numpy', 'matrix'), default='bitboard')
+    parser.add_argument('--strategy', choices=('mrv', 'bitset', 'static'), default='mrv')
+    parser.add_argument('--engine', choices=('backtrack', 'sat'), default='backtrack')
+    parser.add_argument('--propagation', action='store_true',
+                        help='propagate constraints before the search')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='JSON results of an earlier run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='relative growth reported as a regression')
+    args = parser.parse_args(argv)
+
+    instances = spec_instances(args.specs) if args.specs else []
+    instances += generated_instances(args.sizes, args.seed)
+    results = run_benchmarks(instances, repeat=args.repeat, memory=args.memory,
+                             backend=args.backend, strategy=args.strategy, engine=args.engine,
+                             propagation=args.propagation)
+    print(format_results(results), file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['instance']} {r['stage']} {r['metric']}: "
+                  f"{r['baseline']:.6g} -> {r['current']:.6g} (x{r['ratio']:.2f})", file=sys.stderr)
+        if regressions:
+            return 1
+        print('no regressions', file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import numpy as np
+from collections import namedtuple
+
+# A grid state stored as four bitmasks over the grid_size x grid_size cells.
+# Cell (x, y) maps to bit y * grid_size + x, i.e. the row-major position of
+# mat[y, x] in the matrix form. The masks mirror the matrix encoding:
+#   path      -> 1  (cell crossed by a ray, no mirror allowed)
+#   mirror_a  -> -3
+#   mirror_b  -> -2
+#   forbidden -> -4 (orthogonally adjacent to a mirror)
+Bitboard = namedtuple('Bitboard', ['path', 'mirror_a', 'mirror_b', 'forbidden'])
+
+EMPTY_BITBOARD = Bitboard(0, 0, 0, 0)
+
+MATRIX_CODES = {'path': 1, 'mirror_a': -3, 'mirror_b': -2, 'forbidden': -4}
+
+
+def build_bitboard(mirrors, path_cells, grid_size):
+    """
+    Build a bitboard directly from a mirror configuration and a ray path.
+
+    The result is the bitboard form of the matrix that produce_matrix or
+    is_valid_path would build for the same mirrors and path: mirrors are placed
+    in order with their orthogonal neighbours marked forbidden, and path cells
+    only mark cells that are still empty.
+
+    Args:
+        mirrors: List of (x, y, type) tuples
+        path_cells: Iterable of (x, y) cells crossed by the ray
+        grid_size: Size of the grid
+
+    Returns:
+        A Bitboard
+    """
+    cells = {}
+    for (mx, my, mtype) in mirrors:
+        cells[my * grid_size + mx] = 'mirror_a' if mtype == 'A' else 'mirror_b'
+        for (adj_x, adj_y) in [(mx+1, my), (mx-1, my), (mx, my+1), (mx, my-1)]:
+            if 0 <= adj_x < grid_size and 0 <= adj_y < grid_size:
+                cells[adj_y * grid_size + adj_x] = 'forbidden'
+    for (cx, cy) in path_cells:
+        cells.setdefault(cy * grid_size + cx, 'path')
+
+    masks = dict.fromkeys(Bitboard._fields, 0)
+    for bit, kind in cells.items():
+        masks[kind] |= 1 << bit
+    return Bitboard(**masks)
+
+
+def _flags_to_mask(flags):
+    """Pack a flat boolean array into an int with bit i set for flags[i]."""
+    packed = np.packbits(flags, bitorder='little')
+    return int.from_bytes(packed.tobytes(), 'little')
+
+
+def _mask_to_flags(mask, n_cells):
+    """Inverse of _flags_to_mask, returning a boolean array of length n_cells."""
+    raw = mask.to_bytes((n_cells + 7) // 8, 'little')
+    bits = np.unpackbits(np.frombuffer(raw, dtype=np.uint8), bitorder='little')
+    return bits[:n_cells].astype(bool)
+
+
+def matrix_to_bitboard(mat):
+    """
+    Convert a candidate or merged matrix into its bitboard form.
+
+    Args:
+        mat: Square numpy matrix using the 1/-2/-3/-4 cell encoding
+
+    Returns:
+        A Bitboard
+    """
+    flat = np.asarray(mat).ravel()
+    return Bitboard(*(_flags_to_mask(flat == MATRIX_CODES[field])
+                      for field in Bitboard._fields))
+
+
+def bitboard_to_matrix(bb, grid_size):
+    """
+    Convert a bitboard back into the matrix encoding.
+
+    Args:
+        bb: A Bitboard
+        grid_size: Size of the grid
+
+    Returns:
+        A (grid_size, grid_size) numpy int matrix
+    """
+    n_cells = grid_size * grid_size
+    flat = np.zeros(n_cells, dtype=int)
+    for field in Bitboard._fields:
+        flat[_mask_to_flags(getattr(bb, field), n_cells)] = MATRIX_CODES[field]
+    return flat.reshape(grid_size, grid_size)
+
+
+def is_compatible_bitboard(base, cand):
+    """
+    Bitboard counterpart of solver.is_compatible.
+
+    A candidate is rejected if it puts a path or forbidden cell on a base
+    mirror, a mirror on a base path or forbidden cell, or a mirror of the
+    other type on a base mirror.
+
+    Args:
+        base: Base Bitboard
+        cand: Candidate Bitboard
+
+    Returns:
+        True if compatible, False otherwise
+    """
+    if (cand.path | cand.forbidden) & (base.mirror_a | base.mirror_b):
+        return False
+    if (cand.mirror_a | cand.mirror_b) & (base.path | base.forbidden):
+        return False
+    return not (cand.mirror_a & base.mirror_b or cand.mirror_b & base.mirror_a)
+
+
+def merge_bitboards(base, cand):
+    """
+    Bitboard counterpart of solver.merge_layers.
+
+    Candidate cells fill empty base cells, and forbidden candidate cells
+    always override the base.
+
+    Args:
+        base: Base Bitboard
+        cand: Candidate Bitboard
+
+    Returns:
+        The merged Bitboard
+    """
+    empty = ~(base.path | base.mirror_a | base.mirror_b | base.forbidden)
+    keep = ~cand.forbidden
+    return Bitboard(
+        (base.path | (cand.path & empty)) & keep,
+        (base.mirror_a | (cand.mirror_a & empty)) & keep,
+        (base.mirror_b | (cand.mirror_b & empty)) & keep,
+        base.forbidden | cand.forbidden,
+    )
@@ -0,0 +1,179 @@
+import json
+import os
+import time
+
+# Bump whenever the search order or the frontier format changes, so a
+# checkpoint is never resumed by a search it does not describe.
+CHECKPOINT_VERSION = 2
+
+class CancelToken:
+    """
+    Deadline and cancellation flag of a solve.
+
+    The solver polls the token while enumerating candidates (every few
+    hundred nodes of the path search, in the worker pool too), while
+    propagating and before every search node, and stops cleanly once it has
+    expired. cancel() may be called from another thread or a signal handler.
+    """
+
+    def __init__(self, timeout=None, event=None):
+        """
+        Args:
+            timeout: Optional time budget in seconds, counted from now
+            event: Optional threading or multiprocessing Event that cancels
+                the token once set, so that one flag can stop tokens in other
+                processes
+        """
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.event = event
+        self.cancelled = False
+
+    def cancel(self):
+        """Ask the solve to stop."""
+        self.cancelled = True
+        if self.event is not None:
+            self.event.set()
+
+    def reason(self):
+        """'cancelled' or 'deadline' once the token has expired, otherwise None."""
+        if self.cancelled or (self.event is not None and self.event.is_set()):
+            return 'cancelled'
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return 'deadline'
+        return None
+
+    def remaining(self):
+        """Seconds left before the deadline (None without one)."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        """
+        Raises:
+            SearchInterrupted: If the token has expired (without a frontier)
+        """
+        reason = self.reason()
+        if reason is not None:
+            raise SearchInterrupted(reason)
+
+class SearchInterrupted(Exception):
+    """
+    Raised by a search whose token expired.
+
+    Attributes:
+        reason: 'cancelled' or 'deadline'
+        frontier: Where the search stopped (see search.iter_mrv_search), or
+            None if it stopped before searching
+    """
+
+    def __init__(self, reason, frontier=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.frontier = frontier
+
+class Incomplete:
+    """
+    Result of a solve stopped by its deadline or cancellation.
+
+    It is falsy, so 'if not solution' catches both this and None (no
+    solution), but it is not None: the puzzle may still have a solution.
+
+    Attributes:
+        reason: 'cancelled' or 'deadline'
+        checkpoint: Checkpoint dictionary to resume the solve from (pass it,
+            or the file it was saved to, as checkpoint= to the solver)
+    """
+
+    def __init__(self, reason, checkpoint):
+        self.reason = reason
+        self.checkpoint = checkpoint
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return (f"Incomplete({self.reason!r}, frontier depth "
+                f"{len(self.checkpoint['frontier'])})")
+
+    def save(self, path):
+        """Write the checkpoint to a file."""
+        save_checkpoint(path, self.checkpoint)
+
+def make_checkpoint(fingerprint, frontier):
+    """
+    Build a checkpoint dictionary.
+
+    Args:
+        fingerprint: JSON-ready description of the search (clues, bounds and
+            options), checked when resuming
+        frontier: Frontier of an interrupted search (None or [] to start over)
+
+    Returns:
+        The checkpoint dictionary
+    """
+    return {'version': CHECKPOINT_VERSION,
+            'fingerprint': json.loads(json.dumps(fingerprint)),
+            'frontier': [[int(value) if value is not None else None for value in frame]
+                         for frame in frontier or []]}
+
+def save_checkpoint(path, checkpoint):
+    """Write a checkpoint to a file atomically."""
+    tmp = f"{os.fspath(path)}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+def load_checkpoint(path):
+    """
+    Read a checkpoint file.
+
+    Returns:
+        The checkpoint dictionary, or None if there is no usable file
+    """
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(checkpoint, dict) or checkpoint.get('version') != CHECKPOINT_VERSION:
+        return None
+    return checkpoint
+
+def resume_frontier(checkpoint, fingerprint):
+    """
+    The frontier to resume from, after checking that a checkpoint matches.
+
+    Raises:
+        ValueError: If the checkpoint was made by a different search
+    """
+    if checkpoint is None:
+        return None
+    if checkpoint.get('fingerprint') != json.loads(json.dumps(fingerprint)):
+        raise ValueError("checkpoint was made for a different puzzle or solver options")
+    return checkpoint['frontier']
+
+class PeriodicCheckpoint:
+    """
+    Callable saving the search frontier to a file at most every 'interval'
+    seconds, so that a killed solve can be resumed.
+    """
+
+    def __init__(self, path, fingerprint, interval=60.0):
+        """
+        Args:
+            path: Checkpoint file
+            fingerprint: As in make_checkpoint
+            interval: Minimum number of seconds between two saves
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+        self.interval = interval
+        self._last = time.monotonic()
+
+    def __call__(self, frontier):
+        """Save frontier() if the last save is older than the interval."""
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            save_checkpoint(self.path, make_checkpoint(self.fingerprint, frontier()))
+            self._last = now
@@ -0,0 +1,131 @@
+from array import array
+from .simulation import simulate_ray
+from .bitboard import Bitboard, bitboard_to_matrix
+
+# Path cells are stored as y * grid_size + x in unsigned 16-bit entries, which
+# covers grids of up to 256 x 256 cells. Mirrors are stored flat as
+# x, y, type triples of 16-bit entries, with type 0 for A and 1 for B.
+PATH_TYPECODE = 'H'
+MIRROR_TYPECODE = 'h'
+
+_MIRROR_CODES = {'A': 0, 'B': 1}
+_MIRROR_TYPES = ('A', 'B')
+
+class Candidate:
+    """
+    One candidate placement of a clue: its mirrors and the cells its ray crosses.
+
+    Candidates store only what the ray touches, so their size grows with the
+    path length instead of the grid area. Dense forms (Bitboard or matrix) are
+    built on demand. A candidate iterates and indexes like its list of
+    (x, y, type) mirrors.
+    """
+    __slots__ = ('_mirrors', 'path')
+
+    def __init__(self, mirrors, path):
+        """
+        Args:
+            mirrors: Sequence of (x, y, type) mirrors in the order the ray meets them
+            path: Iterable of cell indices (y * grid_size + x) in ray order,
+                mirror cells included
+        """
+        self._mirrors = array(MIRROR_TYPECODE)
+        for (x, y, mtype) in mirrors:
+            self._mirrors.extend((x, y, _MIRROR_CODES[mtype]))
+        self.path = array(PATH_TYPECODE, path)
+
+    @property
+    def mirrors(self):
+        """The mirrors as a tuple of (x, y, type) tuples, in ray order."""
+        flat = self._mirrors
+        return tuple((flat[k], flat[k + 1], _MIRROR_TYPES[flat[k + 2]])
+                     for k in range(0, len(flat), 3))
+
+    @classmethod
+    def from_config(cls, config, side, index, grid_size):
+        """
+        Build a candidate from a mirror configuration by tracing its ray.
+
+        Args:
+            config: List of (x, y, type) mirrors
+            side: Starting side of the clue
+            index: Starting index of the clue on its side
+            grid_size: Size of the grid
+
+        Returns:
+            A Candidate
+        """
+        path = simulate_ray(side, index, config, grid_size)
+        return cls(config, (y * grid_size + x for x, y in path))
+
+    def cells(self, grid_size):
+        """The path as a list of (x, y) cells."""
+        return [(cell % grid_size, cell // grid_size) for cell in self.path]
+
+    def bitboard(self, grid_size):
+        """The Bitboard of the candidate, as produce_matrix(..., as_bitboard=True) builds it."""
+        flat = self._mirrors
+        mirror_a = mirror_b = near = 0
+        for k in range(0, len(flat), 3):
+            x, y = flat[k], flat[k + 1]
+            bit = 1 << (y * grid_size + x)
+            if flat[k + 2]:
+                mirror_b |= bit
+            else:
+                mirror_a |= bit
+            if x > 0:
+                near |= bit >> 1
+            if x < grid_size - 1:
+                near |= bit << 1
+            if y > 0:
+                near |= bit >> grid_size
+            if y < grid_size - 1:
+                near |= bit << grid_size
+        path = 0
+        for cell in self.path:
+            path |= 1 << cell
+        # A candidate's mirrors are never adjacent, so no mirror is forbidden;
+        # path cells only count where nothing else is.
+        return Bitboard(path & ~(mirror_a | mirror_b | near), mirror_a, mirror_b, near)
+
+    def matrix(self, grid_size):
+        """The dense matrix of the candidate, as produce_matrix builds it."""
+        return bitboard_to_matrix(self.bitboard(grid_size), grid_size)
+
+    def sort_key(self):
+        """
+        Key of the canonical candidate order: by mirrors, then path cells.
+
+        Layers are searched in this order, so it does not depend on the
+        enumeration, the cache or the symmetry a layer was obtained from.
+        """
+        return self._mirrors, self.path
+
+    def __len__(self):
+        return len(self._mirrors) // 3
+
+    def __iter__(self):
+        return iter(self.mirrors)
+
+    def __getitem__(self, k):
+        return self.mirrors[k]
+
+    def __eq__(self, other):
+        if not isinstance(other, Candidate):
+            return NotImplemented
+        return self._mirrors == other._mirrors and self.path == other.path
+
+    def __hash__(self):
+        return hash((self._mirrors.tobytes(), self.path.tobytes()))
+
+    def __repr__(self):
+        return f"Candidate({list(self.mirrors)!r}, path of {len(self.path)} cells)"
+
+    def __getstate__(self):
+        return self._mirrors.tobytes(), self.path.tobytes()
+
+    def __setstate__(self, state):
+        self._mirrors = array(MIRROR_TYPECODE)
+        self._mirrors.frombytes(state[0])
+        self.path = array(PATH_TYPECODE)
+        self.path.frombytes(state[1])
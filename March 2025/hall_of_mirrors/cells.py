@@ -0,0 +1,298 @@
+from .simulation import MIRROR_RULES, entry_state
+
+# Cell domains. UNKNOWN cells can still become EMPTY or hold either mirror.
+UNKNOWN, EMPTY = 0, 1
+MIRROR_VALUES = ('A', 'B')
+
+def _prime_limit_checker(limit):
+    """
+    Build a test for whether a product can still be split into segment lengths.
+
+    Every segment is at most 'limit' long, so a remaining product is only
+    reachable if none of its prime factors exceeds 'limit'.
+    """
+    primes = [p for p in range(2, limit + 1) if all(p % q for q in range(2, p))]
+    memo = {}
+
+    def reachable(q):
+        if q in memo:
+            return memo[q]
+        r = q
+        for p in primes:
+            while r % p == 0:
+                r //= p
+        memo[q] = r == 1
+        return memo[q]
+
+    return reachable
+
+class _Ray:
+    """Partial trace of a clued ray: everything up to its first undecided cell."""
+    __slots__ = ('side', 'index', 'value', 'x', 'y', 'dx', 'dy', 'product', 'seg',
+                 'mirrors', 'done')
+
+    def __init__(self, side, index, value, grid_size):
+        self.side, self.index, self.value = side, index, value
+        self.x, self.y, self.dx, self.dy = entry_state(side, index, grid_size)
+        self.product = 1      # Product of the completed segments
+        self.seg = 0          # Steps taken in the current segment
+        self.mirrors = ()     # Mirrors met so far, in path order
+        self.done = False
+
+    def snapshot(self):
+        return (self.x, self.y, self.dx, self.dy, self.product, self.seg,
+                self.mirrors, self.done)
+
+    def restore(self, snap):
+        (self.x, self.y, self.dx, self.dy, self.product, self.seg,
+         self.mirrors, self.done) = snap
+
+class CellSearch:
+    """
+    Search over cell values instead of per-clue candidate enumeration.
+
+    Every cell has the domain {empty, A, B}. Each clued ray is traced through
+    the decided cells up to its first undecided one (its frontier). A frontier
+    value is only allowed if the running product still divides the clue, the
+    remaining product can still be made of segments that fit the grid, the
+    straight line ahead still offers a place to stop, and no mirror would sit
+    next to another. Forced frontier values are propagated; otherwise the
+    search branches on the frontier of the ray with the fewest allowed values.
+    """
+
+    def __init__(self, clues, grid_size):
+        """
+        Args:
+            clues: List of (side, index, value) clues
+            grid_size: Size of the grid
+        """
+        self.grid_size = grid_size
+        self.cells = [UNKNOWN] * (grid_size * grid_size)
+        self.trail = []
+        self.rays = [_Ray(side, index, value, grid_size) for side, index, value in clues]
+        self.clued = {(side, index): value for side, index, value in clues}
+        self.reachable = _prime_limit_checker(grid_size + 1)
+        self.nodes = 0
+        self.backtracks = 0
+
+    # Cell access -----------------------------------------------------------
+
+    def _inside(self, x, y):
+        return 0 <= x < self.grid_size and 0 <= y < self.grid_size
+
+    def _get(self, x, y):
+        return self.cells[y * self.grid_size + x]
+
+    def _neighbours(self, x, y):
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if self._inside(nx, ny):
+                yield nx, ny
+
+    def _assign(self, x, y, value):
+        """Decide a cell (and the neighbours of a mirror). Returns False on conflict."""
+        current = self._get(x, y)
+        if current != UNKNOWN:
+            return current == value
+        self.cells[y * self.grid_size + x] = value
+        self.trail.append(y * self.grid_size + x)
+        if value in MIRROR_VALUES:
+            for nx, ny in self._neighbours(x, y):
+                if not self._assign(nx, ny, EMPTY):
+                    return False
+        return True
+
+    # Ray tracing -----------------------------------------------------------
+
+    def _advance(self, ray):
+        """Walk a ray through decided cells. Returns False if it breaks its clue."""
+        while not ray.done:
+            nx, ny = ray.x + ray.dx, ray.y + ray.dy
+            length = ray.seg + 1
+            if not self._inside(nx, ny):
+                if ray.product * length != ray.value:
+                    return False
+                exit_slot = self._exit_slot(nx, ny)
+                if self.clued.get(exit_slot, ray.value) != ray.value:
+                    return False
+                ray.x, ray.y, ray.seg, ray.done = nx, ny, length, True
+                return True
+            cell = self._get(nx, ny)
+            if cell == UNKNOWN:
+                return True
+            ray.x, ray.y = nx, ny
+            if cell == EMPTY:
+                ray.seg = length
+                continue
+            ray.product *= length
+            if ray.value % ray.product:
+                return False
+            ray.seg = 0
+            ray.mirrors = ray.mirrors + ((nx, ny, cell),)
+            ray.dx, ray.dy = MIRROR_RULES[cell][(ray.dx, ray.dy)]
+        return True
+
+    def _exit_slot(self, x, y):
+        n = self.grid_size
+        if y == n:
+            return 'top', x
+        if y == -1:
+            return 'bottom', x
+        if x == -1:
+            return 'left', y
+        return 'right', y
+
+    def _can_stop_ahead(self, ray, start, remaining):
+        """
+        Whether the current segment can still end at some length >= start, given
+        that the cells before it are empty.
+        """
+        dx, dy = ray.dx, ray.dy
+        # Lengths are measured from where the current segment started.
+        x, y = ray.x - dx * ray.seg, ray.y - dy * ray.seg
+        length = start
+        while True:
+            cx, cy = x + dx * length, y + dy * length
+            if not self._inside(cx, cy):
+                return (remaining == length and
+                        self.clued.get(self._exit_slot(cx, cy), ray.value) == ray.value)
+            cell = self._get(cx, cy)
+            if cell != EMPTY and remaining % length == 0 and self.reachable(remaining // length):
+                if cell != UNKNOWN or remaining // length > 1 or self._exits_after(cx, cy, dx, dy):
+                    return True
+            if cell in MIRROR_VALUES:
+                return False
+            length += 1
+
+    def _exits_after(self, x, y, dx, dy):
+        """Whether some mirror at (x, y) sends a ray arriving along (dx, dy) straight out."""
+        for mtype in MIRROR_VALUES:
+            ndx, ndy = MIRROR_RULES[mtype][(dx, dy)]
+            if not self._inside(x + ndx, y + ndy):
+                return True
+        return False
+
+    def _frontier_options(self, ray):
+        """Values allowed at the frontier cell of an unfinished ray."""
+        x, y = ray.x + ray.dx, ray.y + ray.dy
+        length = ray.seg + 1
+        remaining = ray.value // ray.product
+        options = []
+        if self._can_stop_ahead(ray, length + 1, remaining):
+            options.append(EMPTY)
+        if remaining % length == 0 and self.reachable(remaining // length):
+            if not any(self._get(nx, ny) in MIRROR_VALUES for nx, ny in self._neighbours(x, y)):
+                for mtype in MIRROR_VALUES:
+                    # A last factor of 1 means the reflected ray leaves at once.
+                    if remaining == length:
+                        ndx, ndy = MIRROR_RULES[mtype][(ray.dx, ray.dy)]
+                        if (self._inside(x + ndx, y + ndy) or
+                                self.clued.get(self._exit_slot(x + ndx, y + ndy),
+                                               ray.value) != ray.value):
+                            continue
+                    options.append(mtype)
+        return x, y, options
+
+    # Search ----------------------------------------------------------------
+
+    def _propagate(self):
+        """
+        Advance every ray and apply forced frontier values until nothing changes.
+
+        Returns:
+            The branching choice (x, y, options) of the most constrained ray,
+            'solved' when every ray is complete, or None on a contradiction
+        """
+        while True:
+            best = None
+            forced = False
+            for ray in self.rays:
+                if not self._advance(ray):
+                    return None
+                if ray.done:
+                    continue
+                x, y, options = self._frontier_options(ray)
+                if not options:
+                    return None
+                if len(options) == 1:
+                    if not self._assign(x, y, options[0]):
+                        return None
+                    forced = True
+                    break
+                # Fewest options first, then the ray with the least product left.
+                key = (len(options), ray.value // ray.product)
+                if best is None or key < best[0]:
+                    best = (key, x, y, options)
+            if not forced:
+                return best[1:] if best is not None else 'solved'
+
+    def _save(self):
+        return len(self.trail), [ray.snapshot() for ray in self.rays]
+
+    def _undo(self, saved):
+        size, snaps = saved
+        while len(self.trail) > size:
+            self.cells[self.trail.pop()] = UNKNOWN
+        for ray, snap in zip(self.rays, snaps):
+            ray.restore(snap)
+
+    def solutions(self):
+        """
+        Yield every mirror layout satisfying the clues.
+
+        Cells no clued ray passes through are left empty, so each yielded layout
+        is the unique completion of one assignment of the traced cells. The
+        search runs on an explicit stack, one frame per branching cell, so its
+        depth is not bounded by the recursion limit on large grids.
+
+        Yields:
+            Dictionaries mapping (x, y) to mirror type 'A' or 'B'
+        """
+        n = self.grid_size
+        # Frames of (state on entry, state before branching, x, y, options left)
+        stack = []
+        entered = True
+        while True:
+            if entered:
+                self.nodes += 1
+                saved = self._save()
+                choice = self._propagate()
+                if choice == 'solved':
+                    yield {(i % n, i // n): value for i, value in enumerate(self.cells)
+                           if value in MIRROR_VALUES}
+                if choice is None or choice == 'solved':
+                    self.backtracks += 1
+                    self._undo(saved)
+                else:
+                    x, y, options = choice
+                    stack.append((saved, self._save(), x, y, iter(options)))
+            if not stack:
+                return
+            saved, inner, x, y, options = stack[-1]
+            entered = False
+            for value in options:
+                self._undo(inner)
+                if self._assign(x, y, value):
+                    entered = True
+                    break
+            if not entered:
+                stack.pop()
+                self.backtracks += 1
+                self._undo(saved)
+
+def cell_search(clues, grid_size):
+    """
+    Find a mirror layout satisfying clues by searching directly over cell values.
+
+    Unlike the candidate-layer pipeline this never enumerates factorizations,
+    so it has no tuple length or factor bounds and handles clues with many
+    factors on large grids.
+
+    Args:
+        clues: List of (side, index, value) clues
+        grid_size: Size of the grid
+
+    Returns:
+        A dictionary mapping (x, y) to mirror type 'A' or 'B', or None if the
+        clues have no solution
+    """
+    return next(CellSearch(clues, grid_size).solutions(), None)
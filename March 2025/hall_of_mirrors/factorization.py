@@ -1,34 +1,29 @@
-import itertools
+from math import factorial
 
-def ultra_factorizations(nums, max_tuple_length, max_factor):
+def core_factorizations(n, max_tuple_length, max_factor, memo=None):
     """
-    For each number in the input list 'nums', generate all valid factorizations (as tuples)
-    satisfying the following:
-      - The product of the factors equals the number.
-      - Only factors up to max_factor are allowed.
-      - The length of the tuple is at most max_tuple_length.
-      - Factor 1, if used, may only appear as the first element, the last element, or both.
-    
-    Every possible ordering (i.e. permutation) of the factors is produced.
-    
+    Generate all sorted (non-decreasing) tuples of factors (>=2) that multiply to n,
+    using factors up to max_factor and at most max_tuple_length factors.
+
     Args:
-        nums: List of integers to factorize
-        max_tuple_length: Maximum length of factorization tuples
+        n: Integer to factorize
+        max_tuple_length: Maximum number of factors
         max_factor: Maximum allowed factor value
-        
+        memo: Optional dictionary shared between calls to reuse sub-results
+
     Returns:
-        A list of lists. The i-th sublist contains all valid factorization tuples for nums[i].
+        A set of sorted factor tuples
     """
-    
-    # Memoization dictionary for core factorizations
-    memo = {}
+    if memo is None:
+        memo = {}
+
     def factorize(n, start, remaining_length):
         """
         Recursively generate all sorted (non-decreasing) tuples of factors (>=2) that multiply to n,
         using factors in the range [start, max_factor]. Only factorizations with total length up
         to the given remaining_length are returned.
         """
-        key = (n, start, remaining_length)
+        key = (n, start, remaining_length, max_factor)
         if key in memo:
             return memo[key]
         results = set()
@@ -49,36 +44,145 @@ def ultra_factorizations(nums, max_tuple_length, max_factor):
         memo[key] = results
         return results
 
-    all_results = []
-    for n in nums:
-        result_set = set()
-        # Special handling for n==1.
-        if n == 1:
-            if max_tuple_length >= 1:
-                result_set.add((1,))
-            if max_tuple_length >= 2:
-                result_set.add((1, 1))
-            all_results.append(list(result_set))
-            continue
-
-        # Compute core factorizations for n using factors >=2.
-        core_set = factorize(n, 2, max_tuple_length)
-        # For each core factorization, produce every ordering and add possible boundary 1's.
-        for core in core_set:
-            # Generate all unique permutations of the core tuple.
-            perms = set(itertools.permutations(core))
-            for perm in perms:
-                # The core permutation itself (without any added 1's)
-                if len(perm) <= max_tuple_length:
-                    result_set.add(perm)
-                # Add a 1 at the beginning, if room.
-                if len(perm) + 1 <= max_tuple_length:
-                    result_set.add((1,) + perm)
-                # Add a 1 at the end, if room.
-                if len(perm) + 1 <= max_tuple_length:
-                    result_set.add(perm + (1,))
-                # Add 1's at both the beginning and end, if room.
-                if len(perm) + 2 <= max_tuple_length:
-                    result_set.add((1,) + perm + (1,))
-        all_results.append(list(result_set))
-    return all_results
+    return factorize(n, 2, max_tuple_length)
+
+def multiset_permutations(items):
+    """
+    Yield every distinct ordering of a multiset exactly once, in lexicographic order.
+
+    Unlike set(itertools.permutations(items)), repeated elements never produce
+    duplicate orderings, so nothing has to be generated and thrown away.
+
+    Args:
+        items: Iterable of comparable elements (repeats allowed)
+
+    Yields:
+        Tuples, one per distinct permutation
+    """
+    perm = sorted(items)
+    n = len(perm)
+    while True:
+        yield tuple(perm)
+        # Find the rightmost position that can still be increased.
+        i = n - 2
+        while i >= 0 and perm[i] >= perm[i + 1]:
+            i -= 1
+        if i < 0:
+            return
+        # Swap it with the smallest larger element to its right, then
+        # restore the suffix to ascending order.
+        j = n - 1
+        while perm[j] <= perm[i]:
+            j -= 1
+        perm[i], perm[j] = perm[j], perm[i]
+        perm[i + 1:] = reversed(perm[i + 1:])
+
+def count_multiset_permutations(items):
+    """
+    Number of distinct orderings of a multiset (the multinomial coefficient).
+    """
+    counts = {}
+    for item in items:
+        counts[item] = counts.get(item, 0) + 1
+    total = factorial(len(items))
+    for c in counts.values():
+        total //= factorial(c)
+    return total
+
+def iter_ultra_factorizations(n, max_tuple_length, max_factor, memo=None):
+    """
+    Lazily yield the factorization tuples of a single number.
+
+    Yields exactly the tuples that ultra_factorizations lists for n, without
+    duplicates and without materializing them: cores in sorted order, each
+    core's permutations in lexicographic order, each permutation followed by
+    its variants with boundary 1's.
+
+    Args:
+        n: Integer to factorize
+        max_tuple_length: Maximum length of factorization tuples
+        max_factor: Maximum allowed factor value
+        memo: Optional dictionary shared between calls to reuse core factorizations
+
+    Yields:
+        Factorization tuples
+    """
+    # Special handling for n==1.
+    if n == 1:
+        if max_tuple_length >= 1:
+            yield (1,)
+        if max_tuple_length >= 2:
+            yield (1, 1)
+        return
+
+    for core in sorted(core_factorizations(n, max_tuple_length, max_factor, memo)):
+        for perm in multiset_permutations(core):
+            # The core permutation itself (without any added 1's)
+            yield perm
+            # Add a 1 at the beginning and at the end, if room.
+            if len(perm) + 1 <= max_tuple_length:
+                yield (1,) + perm
+                yield perm + (1,)
+            # Add 1's at both the beginning and end, if room.
+            if len(perm) + 2 <= max_tuple_length:
+                yield (1,) + perm + (1,)
+
+def count_ultra_factorizations(n, max_tuple_length, max_factor, memo=None):
+    """
+    Count the factorization tuples of a single number without listing them.
+
+    Args:
+        n: Integer to factorize
+        max_tuple_length: Maximum length of factorization tuples
+        max_factor: Maximum allowed factor value
+        memo: Optional dictionary shared between calls to reuse core factorizations
+
+    Returns:
+        The number of tuples iter_ultra_factorizations would yield
+    """
+    if n == 1:
+        return int(max_tuple_length >= 1) + int(max_tuple_length >= 2)
+
+    total = 0
+    for core in core_factorizations(n, max_tuple_length, max_factor, memo):
+        variants = 1
+        if len(core) + 1 <= max_tuple_length:
+            variants += 2
+        if len(core) + 2 <= max_tuple_length:
+            variants += 1
+        total += variants * count_multiset_permutations(core)
+    return total
+
+def ultra_factorizations(nums, max_tuple_length, max_factor, lazy=False, count_only=False):
+    """
+    For each number in the input list 'nums', generate all valid factorizations (as tuples)
+    satisfying the following:
+      - The product of the factors equals the number.
+      - Only factors up to max_factor are allowed.
+      - The length of the tuple is at most max_tuple_length.
+      - Factor 1, if used, may only appear as the first element, the last element, or both.
+
+    Every possible ordering (i.e. permutation) of the factors is produced.
+
+    Args:
+        nums: List of integers to factorize
+        max_tuple_length: Maximum length of factorization tuples
+        max_factor: Maximum allowed factor value
+        lazy: If True, return one generator per number instead of lists
+        count_only: If True, return only the number of tuples for each number
+
+    Returns:
+        A list with one entry per number in nums. The i-th entry is the list of all
+        valid factorization tuples for nums[i], a generator over them if lazy is
+        True, or their count if count_only is True.
+    """
+    # Memoization dictionary for core factorizations, shared by all numbers
+    memo = {}
+    if count_only:
+        return [count_ultra_factorizations(n, max_tuple_length, max_factor, memo)
+                for n in nums]
+    if lazy:
+        return [iter_ultra_factorizations(n, max_tuple_length, max_factor, memo)
+                for n in nums]
+    return [list(iter_ultra_factorizations(n, max_tuple_length, max_factor, memo))
+            for n in nums]
@@ -0,0 +1,207 @@
+"""
+Random puzzle generator.
+
+Usage:
+    python -m hall_of_mirrors.generator --size 20 [--count 10] [--seed 0]
+                                        [--clues 40] [--unique] [-o specs.jsonl]
+
+Places random mirrors on a grid, computes every border product and reveals a
+subset of them as clues. The puzzles are written as JSONL specs that
+python -m hall_of_mirrors (see jobs.parse_spec) solves directly.
+"""
+import argparse
+import json
+import random
+import sys
+from itertools import islice
+import numpy as np
+from .simulation import SIDES, trace_all_borders, border_products_dict
+from .solver import iter_clue_solutions
+
+def random_layout(grid_size, n_mirrors, rng):
+    """
+    Place mirrors on random cells, no two of them orthogonally adjacent.
+
+    Args:
+        grid_size: Size of the grid
+        n_mirrors: Number of mirrors to place
+        rng: random.Random instance
+
+    Returns:
+        A sorted list of (x, y, type) mirrors
+
+    Raises:
+        ValueError: If n_mirrors do not fit on the grid this way
+    """
+    cells = [(x, y) for y in range(grid_size) for x in range(grid_size)]
+    rng.shuffle(cells)
+    layout = {}
+    for (x, y) in cells:
+        if len(layout) == n_mirrors:
+            break
+        if any((x + dx, y + dy) in layout for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))):
+            continue
+        layout[(x, y)] = rng.choice('AB')
+    if len(layout) < n_mirrors:
+        raise ValueError(f"could not place {n_mirrors} non-adjacent mirrors "
+                         f"on a {grid_size}x{grid_size} grid")
+    return sorted((x, y, mtype) for (x, y), mtype in layout.items())
+
+def layout_matrix(layout, grid_size):
+    """The grid matrix of a mirror layout (-3 for A mirrors, -2 for B mirrors)."""
+    mat = np.zeros((grid_size, grid_size), dtype=int)
+    for (x, y, mtype) in layout:
+        mat[y, x] = -3 if mtype == 'A' else -2
+    return mat
+
+def layout_products(layout, grid_size):
+    """Dictionary mapping every (side, index) slot to its trajectory product."""
+    products, _ = trace_all_borders(layout_matrix(layout, grid_size), grid_size)
+    return border_products_dict(products)
+
+def _rival_slots(clues, products, grid_size, max_tuple_length, max_factor, options):
+    """
+    Slots that rule out a solution of the clues other than the hidden layout.
+
+    A single solution is not enough: mirrors that no clued path crosses are
+    not pinned down, so the solver may find a layout other than the hidden
+    one, with different border products.
+
+    Returns:
+        None if the clues have exactly one solution and its border products
+        are products, otherwise the slots where one of the first two
+        solutions found disagrees with products (empty if they cannot be told
+        apart by their border products, or if the bounds exclude every
+        solution)
+    """
+    found = [solution_products for _, _, solution_products in islice(
+        iter_clue_solutions(clues, grid_size, max_tuple_length, max_factor, **options), 2)]
+    rivals = [slot for slot in products
+              if any(other[slot] != products[slot] for other in found)]
+    if len(found) == 1 and not rivals:
+        return None
+    return rivals
+
+def generate_puzzle(grid_size, n_mirrors=None, n_clues=None, unique=False, seed=None,
+                    max_clue=None, max_tuple_length=None, max_factor=None, max_attempts=20,
+                    **options):
+    """
+    Generate a random puzzle as a spec.
+
+    A random layout of non-adjacent mirrors is drawn and its border products
+    are computed; n_clues of them are revealed. With unique=True, further
+    clues are revealed (each one chosen among the slots where a second
+    solution disagrees with the layout) until the solution is unique; layouts
+    that cannot be pinned down that way are redrawn.
+
+    Args:
+        grid_size: Size of the grid
+        n_mirrors: Number of mirrors (default grid_size)
+        n_clues: Number of clues revealed at first (default all 4 * grid_size)
+        unique: If True, reveal clues until the puzzle has a single solution
+        seed: Seed of the random generator, for reproducible puzzles
+        max_clue: If given, only reveal clues up to this value
+        max_tuple_length, max_factor: Bounds used by the uniqueness check and
+            stored in the spec (defaults as in solver.solve_clues)
+        max_attempts: Number of layouts drawn before giving up on uniqueness
+        **options: iter_clue_solutions options for the uniqueness check
+            (default engine 'cells', which scales best with the grid size)
+
+    Returns:
+        A spec dictionary (see jobs.parse_spec) with the clues as
+        [side, index, value] lists, plus the seed, the hidden layout as
+        'solution' and whether uniqueness was established as 'unique'
+
+    Raises:
+        ValueError: If no valid puzzle was found
+    """
+    rng = random.Random(seed)
+    options.setdefault('engine', 'cells')
+    for _ in range(max_attempts):
+        layout = random_layout(grid_size, grid_size if n_mirrors is None else n_mirrors, rng)
+        products = layout_products(layout, grid_size)
+        slots = [slot for slot in products if max_clue is None or products[slot] <= max_clue]
+        rng.shuffle(slots)
+        count = len(slots) if n_clues is None else min(n_clues, len(slots))
+        clues = {slot: products[slot] for slot in slots[:count]}
+        hidden = slots[count:]
+        if not clues:
+            continue
+
+        if unique:
+            while True:
+                rivals = _rival_slots(clues, products, grid_size, max_tuple_length,
+                                      max_factor, options)
+                if rivals is None:
+                    break
+                candidates = [slot for slot in rivals if slot in hidden]
+                if not candidates:
+                    clues = None
+                    break
+                slot = rng.choice(candidates)
+                hidden.remove(slot)
+                clues[slot] = products[slot]
+            if clues is None:
+                continue
+
+        spec = {
+            'id': f"random-{grid_size}x{grid_size}-{seed}",
+            'grid_size': grid_size,
+            'seed': seed,
+            'clues': [[side, index, clues[(side, index)]]
+                      for side in SIDES for index in range(grid_size) if (side, index) in clues],
+            'solution': [list(mirror) for mirror in layout],
+            'unique': unique,
+        }
+        if max_tuple_length is not None:
+            spec['max_tuple_length'] = max_tuple_length
+        if max_factor is not None:
+            spec['max_factor'] = max_factor
+        return spec
+    raise ValueError(f"no puzzle found in {max_attempts} attempts")
+
+def generate_puzzles(count, grid_size, seed=0, **kwargs):
+    """
+    Generate count puzzles with consecutive seeds.
+
+    Args:
+        count: Number of puzzles
+        grid_size: Size of the grids
+        seed: Seed of the first puzzle
+        **kwargs: Further generate_puzzle arguments
+
+    Yields:
+        Spec dictionaries
+    """
+    for k in range(count):
+        yield generate_puzzle(grid_size, seed=seed + k, **kwargs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m hall_of_mirrors.generator',
+                                     description='Generate random Hall of Mirrors puzzles.')
+    parser.add_argument('--size', type=int, required=True, help='grid size')
+    parser.add_argument('--count', type=int, default=1, help='number of puzzles')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first puzzle')
+    parser.add_argument('--mirrors', type=int, help='mirrors per grid (default: the grid size)')
+    parser.add_argument('--clues', type=int, help='clues revealed at first (default: all)')
+    parser.add_argument('--max-clue', type=int, help='only reveal clues up to this value')
+    parser.add_argument('--unique', action='store_true',
+                        help='reveal clues until the solution is unique')
+    parser.add_argument('-o', '--output', default='-',
+                        help="file to write the JSONL specs to ('-' for stdout, the default)")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        for spec in generate_puzzles(args.count, args.size, args.seed, n_mirrors=args.mirrors,
+                                     n_clues=args.clues, max_clue=args.max_clue,
+                                     unique=args.unique):
+            out.write(json.dumps(spec) + '\n')
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
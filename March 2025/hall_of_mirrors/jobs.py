@@ -0,0 +1,242 @@
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from .simulation import SIDES
+from .solver import solve_clues, solve_canonical
+from .budget import CancelToken, Incomplete
+
+# Spec keys passed through to solve_clues as solver options.
+SOLVER_OPTIONS = ('backend', 'enumeration', 'strategy', 'propagation', 'engine')
+
+def parse_spec(spec):
+    """
+    Validate a puzzle spec and turn it into solve_clues arguments.
+
+    A spec is a JSON object such as:
+        {"id": "march-2025", "grid_size": 10,
+         "clues": [{"side": "top", "index": 2, "value": 112}, ...]}
+    Clues may also be given as [side, index, value] lists. The optional keys
+    max_tuple_length, max_factor and the solver options (backend, enumeration,
+    strategy, propagation, engine) are passed on to solve_clues.
+
+    Args:
+        spec: Decoded spec dictionary
+
+    Returns:
+        A tuple (clues, kwargs) with clues keyed by (side, index) and the
+        remaining solve_clues keyword arguments
+
+    Raises:
+        ValueError: If the spec is malformed
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("spec must be a JSON object")
+    grid_size = spec.get('grid_size', 10)
+    if not isinstance(grid_size, int) or grid_size < 1:
+        raise ValueError(f"invalid grid_size: {grid_size!r}")
+
+    clues = {}
+    for clue in spec.get('clues', []):
+        if isinstance(clue, dict):
+            side, index, value = clue.get('side'), clue.get('index'), clue.get('value')
+        elif isinstance(clue, (list, tuple)) and len(clue) == 3:
+            side, index, value = clue
+        else:
+            raise ValueError(f"invalid clue: {clue!r}")
+        if side not in SIDES:
+            raise ValueError(f"unknown side: {side!r}")
+        if not isinstance(index, int) or not 0 <= index < grid_size:
+            raise ValueError(f"index out of range: {side} {index!r}")
+        if not isinstance(value, int) or value < 1:
+            raise ValueError(f"invalid clue value: {value!r}")
+        if (side, index) in clues:
+            raise ValueError(f"duplicate clue slot: {side} {index}")
+        clues[(side, index)] = value
+    if not clues:
+        raise ValueError("spec has no clues")
+
+    kwargs = {'grid_size': grid_size}
+    for key in ('max_tuple_length', 'max_factor') + SOLVER_OPTIONS:
+        if key in spec:
+            kwargs[key] = spec[key]
+    return clues, kwargs
+
+def border_answer(trajectory_products, clues, grid_size):
+    """
+    Compute the puzzle answer from the border products.
+
+    Args:
+        trajectory_products: Dictionary mapping (side, index) to products
+        clues: The clued (side, index) slots
+        grid_size: Size of the grid
+
+    Returns:
+        A tuple (sums, answer) with the sum of the unclued products of every
+        side and the product of those sums
+    """
+    sums = {side: sum(trajectory_products[(side, i)] for i in range(grid_size)
+                      if (side, i) not in clues)
+            for side in SIDES}
+    answer = 1
+    for side in SIDES:
+        answer *= sums[side]
+    return sums, answer
+
+def _checkpoint_path(directory, spec_id):
+    """Checkpoint file of a spec in a checkpoint directory."""
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', str(spec_id))
+    return os.path.join(directory, f"{name}.checkpoint.json")
+
+def solve_spec(spec, defaults=None, memo=None):
+    """
+    Solve one puzzle spec and describe the outcome as a JSON-ready dictionary.
+
+    Errors are reported in the result instead of raised, so one bad spec does
+    not stop a batch. A timeout or checkpoint_dir with a spec whose engine is
+    not 'backtrack' is such an error.
+
+    Args:
+        spec: Decoded spec dictionary
+        defaults: Optional solve_clues keyword arguments the spec can override,
+            plus 'timeout' (seconds allowed per spec) and 'checkpoint_dir' (a
+            directory where stopped searches are saved, and resumed from when
+            the spec is solved again)
+        memo: If given, solve through the canonical orientation with
+            solve_canonical, sharing this memo of canonical solutions
+
+    Returns:
+        A dictionary with the spec id, a status ('solved', 'no_solution',
+        'incomplete' or 'error') and, when solved, the mirrors, border
+        products, per-side sums, answer and timings in seconds; incomplete
+        results hold the reason and the checkpoint file, if any
+    """
+    start = time.perf_counter()
+    result = {'id': spec.get('id') if isinstance(spec, dict) else None}
+    try:
+        clues, kwargs = parse_spec(spec)
+        kwargs = {**(defaults or {}), **kwargs}
+        grid_size = kwargs['grid_size']
+        timeout = kwargs.pop('timeout', None)
+        checkpoint_dir = kwargs.pop('checkpoint_dir', None)
+        engine = kwargs.get('engine', 'backtrack')
+        if engine != 'backtrack' and (timeout is not None or checkpoint_dir is not None):
+            raise ValueError(f"timeout and checkpoint_dir need the backtrack engine, "
+                             f"not engine {engine!r}")
+        if checkpoint_dir is not None:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            kwargs['checkpoint'] = _checkpoint_path(checkpoint_dir, result['id'])
+        solve_start = time.perf_counter()
+        if timeout is not None:
+            kwargs['token'] = CancelToken(timeout)
+        if memo is None:
+            solution = solve_clues(clues, **kwargs)
+        else:
+            solution = solve_canonical(clues, memo=memo, **kwargs)
+        solve_time = time.perf_counter() - solve_start
+    except Exception as exc:
+        result.update(status='error', error=f"{type(exc).__name__}: {exc}")
+        result['timings'] = {'total': time.perf_counter() - start}
+        return result
+
+    if isinstance(solution, Incomplete):
+        result.update(status='incomplete', reason=solution.reason,
+                      checkpoint=kwargs.get('checkpoint'))
+    elif solution is None:
+        result['status'] = 'no_solution'
+    else:
+        _, final_matrix, trajectory_products = solution
+        sums, answer = border_answer(trajectory_products, clues, grid_size)
+        mirrors = sorted((x, y, 'A' if final_matrix[y, x] == -3 else 'B')
+                         for y in range(grid_size) for x in range(grid_size)
+                         if final_matrix[y, x] in (-3, -2))
+        result.update(
+            status='solved',
+            mirrors=[list(mirror) for mirror in mirrors],
+            products={side: [trajectory_products[(side, i)] for i in range(grid_size)]
+                      for side in SIDES},
+            sums=sums,
+            answer=answer,
+        )
+    result['timings'] = {'solve': solve_time, 'total': time.perf_counter() - start}
+    return result
+
+def _decode(line_no, line):
+    """Decode one JSONL line; undecodable lines become error results."""
+    try:
+        spec = json.loads(line)
+    except json.JSONDecodeError as exc:
+        return None, {'id': None, 'line': line_no, 'status': 'error',
+                      'error': f"JSONDecodeError: {exc}"}
+    if isinstance(spec, dict) and spec.get('id') is None:
+        spec['id'] = line_no
+    return spec, None
+
+# Canonical solutions memoized by each worker process
+_WORKER_MEMO = {}
+
+def _solve_line(task):
+    """Process pool entry point for solve_spec."""
+    spec, defaults, canonical = task
+    return solve_spec(spec, defaults, _WORKER_MEMO if canonical else None)
+
+def run_batch(lines, out, workers=None, defaults=None, max_pending=None, canonical=False):
+    """
+    Solve a stream of JSONL puzzle specs, writing one JSONL result per spec.
+
+    Results are written and flushed as soon as each puzzle finishes, so with
+    several workers they come out in completion order; match them to their
+    specs by id (the line number when a spec has none). Specs are read lazily
+    and at most max_pending of them are in flight at once.
+
+    Args:
+        lines: Iterable of JSONL lines (blank lines are skipped)
+        out: Writable text stream for the results
+        workers: If greater than 1, solve in a pool of this many processes
+        defaults: Optional solve_clues keyword arguments for every spec, plus
+            'timeout' and 'checkpoint_dir' (see solve_spec)
+        max_pending: Maximum number of specs submitted but not written yet
+            (default 4 per worker)
+        canonical: If True, solve every spec through its canonical orientation
+            and memoize the canonical solutions (per worker process), so
+            rotated or reflected copies of a puzzle are solved once
+
+    Returns:
+        A dictionary counting the results by status
+    """
+    counts = {'solved': 0, 'no_solution': 0, 'incomplete': 0, 'error': 0}
+    memo = {} if canonical else None
+
+    def emit(result):
+        counts[result['status']] += 1
+        out.write(json.dumps(result) + '\n')
+        out.flush()
+
+    tasks = ((line_no, line) for line_no, line in enumerate(lines, 1) if line.strip())
+
+    if workers is None or workers <= 1:
+        for line_no, line in tasks:
+            spec, error = _decode(line_no, line)
+            emit(error if error is not None else solve_spec(spec, defaults, memo))
+        return counts
+
+    if max_pending is None:
+        max_pending = 4 * workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for line_no, line in tasks:
+            spec, error = _decode(line_no, line)
+            if error is not None:
+                emit(error)
+                continue
+            pending.add(pool.submit(_solve_line, (spec, defaults, canonical)))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    emit(future.result())
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                emit(future.result())
+    return counts
@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from .candidate import Candidate
+from .symmetry import canonical_layer_key, inverse_symmetry, transform_layer
+
+# Bump whenever candidate generation or the on-disk format changes, so stale
+# layers are never reused.
+CACHE_VERSION = 3
+
+DEFAULT_MAX_BYTES = 256 * 2**20
+
+INDEX_NAME = 'index.json'
+
+_MIRROR_CODES = {'A': 0, 'B': 1}
+_MIRROR_TYPES = ('A', 'B')
+
+def _canonical_key(clue_num, side, index, grid_size, cluepos, max_tuple_length, max_factor,
+                   enumeration):
+    """layer_key and the symmetry taking the layer to its stored orientation."""
+    name, (clue_num, (side, index), blocked) = canonical_layer_key(clue_num, side, index,
+                                                                   grid_size, cluepos)
+    payload = json.dumps([CACHE_VERSION, grid_size, side, index, clue_num,
+                          max_tuple_length, max_factor, enumeration, blocked])
+    return hashlib.sha256(payload.encode()).hexdigest(), name
+
+def layer_key(clue_num, side, index, grid_size, cluepos, max_tuple_length, max_factor,
+              enumeration='fused'):
+    """
+    Content key of a clue's candidate layer.
+
+    Besides the clue itself, the enumeration bounds and the enumeration that
+    built it, a layer only depends on which border positions hold a different
+    clue (a path may not exit there).
+    Layers that are rotations or reflections of each other share a key and
+    are stored once, in the canonical orientation of symmetry.canonical_layer_key.
+
+    Returns:
+        A hex digest usable as a file name
+    """
+    return _canonical_key(clue_num, side, index, grid_size, cluepos,
+                          max_tuple_length, max_factor, enumeration)[0]
+
+class LayerCache:
+    """
+    Size-bounded on-disk cache of candidate layers.
+
+    Every layer is stored as two .npy files named after its key: the mirror
+    configurations and the path cells of its candidates, one row per
+    candidate padded with -1, so a layer's size follows its path lengths
+    rather than the grid area. A read loads both whole, since every
+    candidate of a layer is needed at once. An index file records the
+    version, size and last use of every entry. It is rewritten by flush,
+    which also evicts the least recently used entries once the total size
+    exceeds max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            directory: Cache directory (created if missing)
+            max_bytes: Upper bound on the total size of the stored layers
+        """
+        self.directory = os.fspath(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._index = None
+        # Changes not written to the index yet
+        self._touched = {}
+        self._added = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    # Index -----------------------------------------------------------------
+
+    def _index_path(self):
+        return os.path.join(self.directory, INDEX_NAME)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path()) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+        if not isinstance(index, dict) or index.get('version') != CACHE_VERSION:
+            # Unknown or outdated cache: start over
+            self._remove_files(name for name in self._entry_names()
+                               if name.split('.')[0] not in self._added)
+            index = {'version': CACHE_VERSION, 'entries': {}}
+        return index
+
+    def _save_index(self, index):
+        tmp = f"{self._index_path()}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, self._index_path())
+
+    def _entries(self):
+        if self._index is None:
+            self._index = self._load_index()
+        return self._index['entries']
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.mirrors.npy', base + '.path.npy'
+
+    def _entry_names(self):
+        return [name for name in os.listdir(self.directory) if name.endswith('.npy')]
+
+    def _remove_files(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _evict(self, index):
+        """Drop least recently used entries until the size bound holds; True if any were."""
+        entries = index['entries']
+        total = sum(entry['size'] for entry in entries.values())
+        evicted = False
+        for key in sorted(entries, key=lambda k: entries[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            total -= entries.pop(key)['size']
+            self._remove_files(os.path.basename(path) for path in self._paths(key))
+            evicted = True
+        return evicted
+
+    # Public API ------------------------------------------------------------
+
+    def get(self, key):
+        """
+        Look up a layer.
+
+        Args:
+            key: Key from layer_key
+
+        Returns:
+            The list of Candidates, as returned by solver.clue_layer, or None
+            on a miss
+        """
+        mirrors_path, path_path = self._paths(key)
+        try:
+            if key not in self._added and key not in self._entries():
+                raise FileNotFoundError(key)
+            mirrors = np.load(mirrors_path)
+            paths = np.load(path_path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        candidates = [Candidate([(x, y, _MIRROR_TYPES[t]) for x, y, t in config if t >= 0],
+                                [cell for cell in path if cell >= 0])
+                      for config, path in zip(mirrors.tolist(), paths.tolist())]
+        self._touched[key] = time.time()
+        self.hits += 1
+        return candidates
+
+    def put(self, key, candidates):
+        """
+        Store a layer. It is recorded in the index by the next flush.
+
+        Args:
+            key: Key from layer_key
+            candidates: List of Candidates
+        """
+        width = max((len(c.mirrors) for c in candidates), default=0)
+        mirrors = np.full((len(candidates), width, 3), -1, dtype=np.int16)
+        length = max((len(c.path) for c in candidates), default=0)
+        paths = np.full((len(candidates), length), -1, dtype=np.int32)
+        for k, candidate in enumerate(candidates):
+            for j, (x, y, mtype) in enumerate(candidate.mirrors):
+                mirrors[k, j] = (x, y, _MIRROR_CODES[mtype])
+            paths[k, :len(candidate.path)] = candidate.path
+
+        mirrors_path, path_path = self._paths(key)
+        for path, array in ((mirrors_path, mirrors), (path_path, paths)):
+            tmp = f"{path[:-4]}.{os.getpid()}.tmp.npy"
+            np.save(tmp, array)
+            os.replace(tmp, path)
+        self._added[key] = {'size': os.path.getsize(mirrors_path) + os.path.getsize(path_path),
+                            'last_used': time.time(),
+                            'candidates': len(candidates)}
+
+    def flush(self):
+        """
+        Record the layers used and stored since the last flush in the index,
+        then evict least recently used layers beyond max_bytes.
+
+        The index is re-read first, so processes sharing the directory only
+        lose each other's last-use times in a race, never their layers.
+        """
+        index = self._load_index()
+        entries = index['entries']
+        for key, last_used in self._touched.items():
+            if key in entries:
+                entries[key]['last_used'] = last_used
+        entries.update(self._added)
+        changed = bool(self._touched or self._added)
+        self._touched, self._added = {}, {}
+        if self._evict(index) or changed:
+            self._save_index(index)
+        self._index = index
+
+    def clear(self):
+        """Remove every stored layer."""
+        self._touched, self._added = {}, {}
+        self._remove_files(self._entry_names())
+        self._index = {'version': CACHE_VERSION, 'entries': {}}
+        self._save_index(self._index)
+
+    def size(self):
+        """Total size in bytes of the stored layers, including unflushed ones."""
+        entries = {**self._entries(), **self._added}
+        return sum(entry['size'] for entry in entries.values())
+
+    def __len__(self):
+        return len(self._entries().keys() | self._added.keys())
+
+def cached_clue_layers(cache, tasks, build):
+    """
+    Resolve clue_layer tasks through a cache.
+
+    Args:
+        cache: A LayerCache
+        tasks: Dictionary mapping (clue_num, side, index) to the remaining
+            clue_layer arguments (grid_size, cluepos, max_tuple_length,
+            max_factor, enumeration)
+        build: Function computing the layers of a task dictionary, e.g. the
+            serial or process pool layer builder
+
+    Returns:
+        A dictionary mapping each task key to its list of Candidates
+    """
+    layers, missing, keys = {}, {}, {}
+    for task, args in tasks.items():
+        keys[task] = _canonical_key(*task, *args)
+        key, name = keys[task]
+        layer = cache.get(key)
+        if layer is None:
+            missing[task] = args
+        else:
+            layers[task] = transform_layer(layer, inverse_symmetry(name), args[0])
+    if missing:
+        for task, layer in build(missing).items():
+            key, name = keys[task]
+            cache.put(key, transform_layer(layer, name, tasks[task][0]))
+            layers[task] = layer
+    cache.flush()
+    return layers
@@ -0,0 +1,266 @@
+import multiprocessing as mp
+from queue import Empty
+from .search import search_tree, pairwise_compatibility
+
+# How many search nodes a worker expands between checks for cancellation and
+# for idle workers waiting on work.
+CHECK_INTERVAL = 64
+
+# How long the main process waits on results before checking that every
+# worker is still alive.
+POLL_INTERVAL = 0.5
+
+_MISSING = object()
+
+def _replay(prefix, tree):
+    """
+    The node reached by a prefix of (layer, index) choices, or None if one of
+    them is rejected there.
+    """
+    node, expand, descend = tree
+    for layer, k in prefix:
+        expanded = expand(node)
+        if expanded is None or expanded[0] != layer:
+            return None
+        payload = next((payload for index, payload in expanded[1] if index == k), _MISSING)
+        if payload is _MISSING:
+            return None
+        node = descend(node, layer, k, payload)
+        if node is None:
+            return None
+    return node
+
+def _chosen(path, n_layers):
+    """The candidate index list of a complete path of (layer, index) choices."""
+    chosen = [None] * n_layers
+    for layer, k in path:
+        chosen[layer] = k
+    return chosen
+
+def split_prefixes(tree, n_layers, min_tasks, max_depth):
+    """
+    Expand the top levels of the search tree breadth-first into subtree prefixes.
+
+    Args:
+        tree: (root, expand, descend) of the search (see search.search_tree)
+        n_layers: Number of layers
+        min_tasks: Stop expanding once at least this many prefixes exist
+        max_depth: Never expand deeper than this many layers
+
+    Returns:
+        A tuple (prefixes, solution) where prefixes is a list of tuples of
+        (layer, index) choices and solution is the candidate index list of a
+        solution found while expanding (or None)
+    """
+    root, expand, descend = tree
+    expanded = expand(root)
+    if expanded is None:
+        return [], []
+    frontier = [((), root, expanded)]
+    depth = 0
+    while frontier and depth < min(max_depth, n_layers) and len(frontier) < min_tasks:
+        next_frontier = []
+        for prefix, node, (layer, options) in frontier:
+            for k, payload in options:
+                child = descend(node, layer, k, payload)
+                if child is None:
+                    continue
+                expanded = expand(child)
+                if expanded is None:
+                    return [], _chosen(prefix + ((layer, k),), n_layers)
+                next_frontier.append((prefix + ((layer, k),), child, expanded))
+        frontier = next_frontier
+        depth += 1
+    return [prefix for prefix, _, _ in frontier], None
+
+def _explore(prefix, tree, n_layers, shared):
+    """
+    Depth-first search of the subtree below a prefix, with an explicit stack so
+    that unexplored sibling branches can be handed to idle workers.
+
+    Returns:
+        The candidate index list of a solution, or None
+    """
+    tasks, pending, idle, stop = shared
+    _, expand, descend = tree
+
+    node = _replay(prefix, tree)
+    if node is None:
+        return None
+    path = list(prefix)
+    expanded = expand(node)
+    if expanded is None:
+        return _chosen(path, n_layers)
+
+    # Each frame holds the depth, the node, the layer it assigns and the
+    # options not tried yet (consumed from the end).
+    stack = [(len(path), node, expanded[0], list(expanded[1])[::-1])]
+    nodes = 0
+    while stack:
+        depth, node, layer, todo = stack[-1]
+        if not todo:
+            stack.pop()
+            continue
+
+        nodes += 1
+        if nodes % CHECK_INTERVAL == 0:
+            if stop.is_set():
+                return None
+            if idle.value > 0:
+                _donate(stack, path, tasks, pending)
+                if not todo:
+                    continue
+
+        k, payload = todo.pop()
+        child = descend(node, layer, k, payload)
+        if child is None:
+            continue
+        del path[depth:]
+        path.append((layer, k))
+        expanded = expand(child)
+        if expanded is None:
+            return _chosen(path, n_layers)
+        stack.append((depth + 1, child, expanded[0], list(expanded[1])[::-1]))
+    return None
+
+def _donate(stack, path, tasks, pending):
+    """
+    Move half of the untried candidates of the shallowest open frame to the
+    shared task queue, as new prefixes.
+    """
+    for depth, _, layer, todo in stack:
+        if len(todo) > 1 or (todo and depth < stack[-1][0]):
+            n_give = max(1, len(todo) // 2)
+            given, todo[:n_give] = todo[:n_give], []
+            with pending.get_lock():
+                pending.value += len(given)
+            for k, _ in given:
+                tasks.put(tuple(path[:depth]) + ((layer, k),))
+            return
+
+def _worker(backend, grid_size, strategy, layer_states, baseline, compat, shared, results):
+    """Process entry point: explore prefixes from the task queue until done or cancelled."""
+    from .solver import _backend_ops
+    ops = _backend_ops(backend, grid_size)
+    tree = search_tree(layer_states, baseline, ops, strategy, compat)
+    tasks, pending, idle, stop = shared
+    # Prefixes left in the queue after a cancellation must not block exit.
+    tasks.cancel_join_thread()
+    waiting = False
+    while not stop.is_set():
+        try:
+            prefix = tasks.get(timeout=0.01)
+        except Empty:
+            if not waiting:
+                waiting = True
+                with idle.get_lock():
+                    idle.value += 1
+            if pending.value == 0:
+                break
+            continue
+        if waiting:
+            waiting = False
+            with idle.get_lock():
+                idle.value -= 1
+
+        solution = _explore(prefix, tree, len(layer_states), shared)
+        if solution is not None:
+            results.put(solution)
+            stop.set()
+        with pending.get_lock():
+            pending.value -= 1
+    results.put(None)
+
+def parallel_search(layer_states, baseline, backend, grid_size, workers, strategy='mrv',
+                    split_depth=3, tasks_per_worker=8):
+    """
+    Backtracking search over candidate layers spread across worker processes.
+
+    Workers explore the search tree of the serial strategy (see
+    search.search_tree), so the layer and candidate order is the same. The
+    top levels of the tree are split into subtree prefixes that workers take
+    from a shared queue. A worker that sees idle workers hands half of its
+    shallowest unexplored branches back to the queue, and the first solution
+    found cancels every other worker. When the puzzle has several solutions,
+    the one returned may differ from the serial search.
+
+    Args:
+        layer_states: Per-layer candidate states (lists or stacked arrays), in
+            search order
+        baseline: Starting state the candidates are merged onto
+        backend: Solver state backend name (see solve_puzzle)
+        grid_size: Size of the grid
+        workers: Number of worker processes
+        strategy: Search strategy, 'mrv', 'static' or 'bitset' (see
+            solver.solve_puzzle)
+        split_depth: Maximum number of layers expanded before handing out work
+        tasks_per_worker: Initial number of prefixes to aim for per worker
+
+    Returns:
+        A list with the chosen candidate index of every layer, or None if there
+        is no solution
+
+    Raises:
+        RuntimeError: If a worker process dies
+    """
+    from .solver import _backend_ops
+    ops = _backend_ops(backend, grid_size)
+    # The bitset table is built once here rather than in every worker
+    compat = pairwise_compatibility(layer_states, ops) if strategy == 'bitset' else None
+    tree = search_tree(layer_states, baseline, ops, strategy, compat)
+    if tree is None:
+        return None
+
+    prefixes, solution = split_prefixes(tree, len(layer_states), workers * tasks_per_worker,
+                                        split_depth)
+    if solution is not None:
+        return solution
+    if not prefixes:
+        return None
+
+    ctx = mp.get_context()
+    tasks = ctx.Queue()
+    results = ctx.Queue()
+    pending = ctx.Value('i', len(prefixes))
+    idle = ctx.Value('i', 0)
+    stop = ctx.Event()
+    shared = (tasks, pending, idle, stop)
+    for prefix in prefixes:
+        tasks.put(prefix)
+
+    procs = [ctx.Process(target=_worker,
+                         args=(backend, grid_size, strategy, layer_states, baseline, compat,
+                               shared, results),
+                         daemon=True)
+             for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+
+    solution = None
+    finished = 0
+    try:
+        while finished < workers:
+            try:
+                item = results.get(timeout=POLL_INTERVAL)
+            except Empty:
+                # A worker that exits normally has already sent its None, so
+                # only a failure exit means that its None will never come.
+                failed = [proc.exitcode for proc in procs if proc.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError(f"search worker exited with code {failed[0]}")
+                continue
+            if item is None:
+                finished += 1
+            elif solution is None:
+                solution = item
+                stop.set()
+    except BaseException:
+        stop.set()
+        for proc in procs:
+            proc.terminate()
+        raise
+    finally:
+        for proc in procs:
+            proc.join()
+        tasks.cancel_join_thread()
+    return solution
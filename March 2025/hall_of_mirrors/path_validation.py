@@ -1,7 +1,13 @@
 import numpy as np
+from .bitboard import build_bitboard
+from .simulation import MIRROR_RULES, entry_state
+
+# Number of DFS nodes visited between two polls of a cancel token.
+TOKEN_POLL_NODES = 256
 
 def is_valid_path(factors, side, index, grid_size, clue_num, cluepos, start_pos=None, 
-                 direction=None, mirrors=None, trajectory=None, top_level=True):
+                 direction=None, mirrors=None, trajectory=None, top_level=True,
+                 as_bitboard=False):
     """
     Checks if a path with the given factorization, starting side and index is valid 
     within the grid constraints.
@@ -18,12 +24,14 @@ def is_valid_path(factors, side, index, grid_size, clue_num, cluepos, start_pos=
         mirrors: List of placed mirrors (for recursive calls)
         trajectory: List of cells in the ray's path (for recursive calls)
         top_level: Whether this is the top-level call (vs. recursive)
+        as_bitboard: If True, emit Bitboard states instead of numpy matrices
         
     Returns:
         If top_level is True:
             A tuple of (mirror_configs, matrix_list) where:
             - mirror_configs is a list of valid mirror configurations
-            - matrix_list is a list of (matrix, index) tuples
+            - matrix_list is a list of (matrix, index) tuples, where matrix is
+              a Bitboard when as_bitboard is True
         Otherwise:
             A list of valid mirror configurations
     """
@@ -60,8 +68,10 @@ def is_valid_path(factors, side, index, grid_size, clue_num, cluepos, start_pos=
     
     x, y = start_pos
     dx, dy = direction
-    current_mirrors = mirrors.copy()
-    current_trajectory = trajectory.copy()
+    # Neither list is mutated below (extensions build new lists), so they
+    # can be shared with the caller instead of copied.
+    current_mirrors = mirrors
+    current_trajectory = trajectory
     
     # Mirror reflection rules for types A and B.
     mirror_rules = {
@@ -127,6 +137,7 @@ def is_valid_path(factors, side, index, grid_size, clue_num, cluepos, start_pos=
                         current_mirrors + [(cell_x, cell_y, mt)],
                         new_trajectory,
                         top_level=False,
+                        as_bitboard=as_bitboard,
                     )
                     solutions.extend(sols)
                 
@@ -142,6 +153,9 @@ def is_valid_path(factors, side, index, grid_size, clue_num, cluepos, start_pos=
                 if (end_x == -0.5 or end_x == grid_size + 0.5 or
                     end_y == -0.5 or end_y == grid_size + 0.5) and not exit_clash:
                     final_trajectory = new_trajectory
+                    if as_bitboard:
+                        bb = build_bitboard(current_mirrors, final_trajectory, grid_size)
+                        return maybe_convert([(current_mirrors, bb)])
                     # Create the NumPy matrix.
                     mat = np.zeros((grid_size, grid_size), dtype=int)
                     # Mark the trajectory cells with 1's.
@@ -165,3 +179,208 @@ def is_valid_path(factors, side, index, grid_size, clue_num, cluepos, start_pos=
     
     except KeyError:
         return maybe_convert([])
+
+
+def iter_valid_paths(clue_num, side, index, grid_size, cluepos, max_tuple_length, max_factor,
+                     with_path=False, token=None):
+    """
+    Enumerate the mirror configurations of a clue by a DFS over segment lengths.
+
+    Produces the configurations of running is_valid_path on every tuple of
+    ultra_factorizations([clue_num], max_tuple_length, max_factor) whose ray
+    really meets their mirrors, but fuses the two stages: starting from the
+    entry point, each step only tries divisors of the remaining product that
+    stop inside the grid no later than the first earlier mirror in the way
+    (which then reflects the ray again), on a new cell that is neither crossed
+    already nor adjacent to an earlier mirror, and the final segment must
+    leave the grid exactly. Tuples that cannot fit the board are never
+    generated.
+
+    Args:
+        clue_num: The clue number (product of the segment lengths)
+        side: Starting side ('top', 'right', 'bottom', 'left')
+        index: Starting index on the specified side
+        grid_size: Size of the grid
+        cluepos: Dictionary mapping positions to clue numbers
+        max_tuple_length: Maximum number of segments
+        max_factor: Maximum allowed segment length (apart from boundary 1's)
+        with_path: If True, also yield the cells the ray crosses, which the
+            DFS already knows, so they need not be traced again
+        token: Optional budget.CancelToken, polled every TOKEN_POLL_NODES
+            nodes of the DFS
+
+    Yields:
+        Mirror configurations (lists of (x, y, type) tuples) in path order,
+        or (configuration, path) pairs if with_path is set, with the path as a
+        list of cell indices y * grid_size + x in ray order (as simulate_ray
+        orders its cells)
+
+    Raises:
+        budget.SearchInterrupted: When the token expires
+    """
+    x0, y0, dx0, dy0 = entry_state(side, index, grid_size)
+    mirrors = []
+    runs = []  # Earlier segments as (x, y, dx, dy, length)
+    nodes = 0
+
+    def wall_distance(x, y, dx, dy):
+        # Number of steps until the ray leaves the grid.
+        if dx == 1:
+            return grid_size - x
+        if dx == -1:
+            return x + 1
+        if dy == 1:
+            return grid_size - y
+        return y + 1
+
+    def crossed(cx, cy):
+        # Whether an earlier segment passed through (cx, cy) between its ends.
+        for (sx, sy, sdx, sdy, length) in runs:
+            if sdx and cy == sy and 0 < (cx - sx) * sdx < length:
+                return True
+            if sdy and cx == sx and 0 < (cy - sy) * sdy < length:
+                return True
+        return False
+
+    def dfs(x, y, dx, dy, remaining, depth):
+        nonlocal nodes
+        nodes += 1
+        if token is not None and nodes % TOKEN_POLL_NODES == 0:
+            token.check()
+        distance = wall_distance(x, y, dx, dy)
+
+        # Steps until the ray runs into one of its own mirrors (or leaves).
+        clear = distance
+        for (mx, my, _) in mirrors:
+            if dx and my == y and 0 < (mx - x) * dx < clear:
+                clear = (mx - x) * dx
+            elif dy and mx == x and 0 < (my - y) * dy < clear:
+                clear = (my - y) * dy
+
+        # Final segment: must use up the remaining product and exit the grid.
+        if remaining == distance == clear and (remaining == 1 or remaining <= max_factor):
+            exit_pos = (x + dx * distance + 0.5, y + dy * distance + 0.5)
+            if cluepos.get(exit_pos, clue_num) == clue_num:
+                if with_path:
+                    path = []
+                    for (sx, sy, sdx, sdy, length) in runs:
+                        path.extend((sy + sdy * k) * grid_size + sx + sdx * k
+                                    for k in range(1, length + 1))
+                    path.extend((y + dy * k) * grid_size + x + dx * k for k in range(1, distance))
+                    yield list(mirrors), path
+                else:
+                    yield list(mirrors)
+
+        # Non-final segments need room for at least one more factor after them.
+        if depth + 2 > max_tuple_length:
+            return
+        # Factor 1 is only allowed as the very first segment.
+        lowest = 1 if depth == 0 else 2
+        for length in range(lowest, min(distance - 1, clear, max_factor, remaining) + 1):
+            if remaining % length:
+                continue
+            cell_x = x + dx * length
+            cell_y = y + dy * length
+            if length == clear < distance:
+                # Meeting an earlier mirror again, from its other side.
+                types = [mt for (mx, my, mt) in mirrors if (mx, my) == (cell_x, cell_y)][:1]
+            elif crossed(cell_x, cell_y) or any(
+                    abs(mx - cell_x) + abs(my - cell_y) == 1 for (mx, my, _) in mirrors):
+                continue
+            else:
+                types = ('A', 'B')
+            runs.append((x, y, dx, dy, length))
+            for mt in types:
+                new_dx, new_dy = MIRROR_RULES[mt][(dx, dy)]
+                mirrors.append((cell_x, cell_y, mt))
+                yield from dfs(cell_x, cell_y, new_dx, new_dy, remaining // length, depth + 1)
+                mirrors.pop()
+            runs.pop()
+
+    if max_tuple_length >= 1:
+        yield from dfs(x0, y0, dx0, dy0, clue_num, 0)
+
+# Key marking that a factor tuple ends at a trie node.
+TRIE_END = None
+
+def build_factor_trie(factor_tuples):
+    """
+    Organize factor tuples into a prefix trie.
+
+    Each node is a dictionary mapping a segment length to the child node; the
+    TRIE_END key marks nodes where a tuple ends.
+
+    Args:
+        factor_tuples: Iterable of factor tuples
+
+    Returns:
+        The root node of the trie
+    """
+    root = {}
+    for factors in factor_tuples:
+        node = root
+        for length in factors:
+            node = node.setdefault(length, {})
+        node[TRIE_END] = True
+    return root
+
+def walk_factor_trie(trie, side, index, grid_size, clue_num, cluepos, token=None):
+    """
+    Find the valid mirror configurations of all factor tuples stored in a trie.
+
+    Equivalent to calling is_valid_path on every tuple of the trie, but the ray
+    advances once per trie edge, so a prefix shared by many tuples is traced
+    (and branched on A/B mirrors) only once.
+
+    Args:
+        trie: Root node built by build_factor_trie
+        side: Starting side ('top', 'right', 'bottom', 'left')
+        index: Starting index on the specified side
+        grid_size: Size of the grid (assuming square grid)
+        clue_num: The clue number to check against
+        cluepos: Dictionary mapping positions to clue numbers
+        token: Optional budget.CancelToken, polled every TOKEN_POLL_NODES
+            trie nodes
+
+    Returns:
+        A list of valid mirror configurations
+
+    Raises:
+        budget.SearchInterrupted: When the token expires
+    """
+    x0, y0, dx0, dy0 = entry_state(side, index, grid_size)
+    mirrors = []
+    configs = []
+    nodes = 0
+
+    def walk(node, x, y, dx, dy):
+        nonlocal nodes
+        nodes += 1
+        if token is not None and nodes % TOKEN_POLL_NODES == 0:
+            token.check()
+        for length, child in node.items():
+            if length is TRIE_END:
+                continue
+            end_x = x + dx * length
+            end_y = y + dy * length
+            inside = 0 <= end_x < grid_size and 0 <= end_y < grid_size
+
+            # A tuple ending on this edge: the segment must exit the grid.
+            if TRIE_END in child and not inside:
+                on_border = end_x in (-1, grid_size) or end_y in (-1, grid_size)
+                exit_pos = (end_x + 0.5, end_y + 0.5)
+                if on_border and cluepos.get(exit_pos, clue_num) == clue_num:
+                    configs.append(list(mirrors))
+
+            # Longer tuples: the segment must end on a mirror inside the grid.
+            if len(child) > (TRIE_END in child) and inside:
+                if any(abs(mx - end_x) + abs(my - end_y) == 1 for (mx, my, _) in mirrors):
+                    continue
+                for mt in ('A', 'B'):
+                    new_dx, new_dy = MIRROR_RULES[mt][(dx, dy)]
+                    mirrors.append((end_x, end_y, mt))
+                    walk(child, end_x, end_y, new_dx, new_dy)
+                    mirrors.pop()
+
+    walk(trie, x0, y0, dx0, dy0)
+    return configs
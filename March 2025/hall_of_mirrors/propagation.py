@@ -0,0 +1,145 @@
+import numpy as np
+from .bitboard import Bitboard
+from .search import _iter_bits, _popcount
+
+def _decided_cells(state):
+    """Number of cells of a state (Bitboard or matrix) that are no longer empty."""
+    if isinstance(state, Bitboard):
+        return _popcount(state.path | state.mirror_a | state.mirror_b | state.forbidden)
+    return int(np.count_nonzero(state))
+
+def propagate(layers, baseline, ops, compat=None, alive=None, token=None):
+    """
+    Prune candidate layers to a fixpoint before backtracking.
+
+    Repeats the following until nothing changes:
+      - drop candidates incompatible with the baseline;
+      - drop candidates that have no compatible partner left in some other
+        layer (arc consistency over pairwise compatibility bitsets);
+      - merge layers reduced to a single candidate into the baseline;
+      - merge into the baseline the cells on which every surviving candidate
+        of a layer agrees.
+
+    Args:
+        layers: List of (configs, states) candidate layers
+        baseline: Starting state
+        ops: Backend operations (see solver._backend_ops)
+        compat: Optional pairwise_compatibility table of the layers, e.g.
+            kept from an earlier call. Without it, the compatibility of a
+            candidate with another layer is only checked when arc consistency
+            first asks for it, against that layer's surviving candidates.
+        alive: Optional bitmask per layer of the candidates to start from
+            (default all of them)
+        token: Optional budget.CancelToken polled once per layer revision
+
+    Returns:
+        A tuple (layers, baseline, report) with the pruned layers, the
+        strengthened baseline and a dictionary describing what was pruned.
+        report['contradiction'] is True when some layer lost every candidate,
+        in which case the puzzle has no solution.
+
+    Raises:
+        budget.SearchInterrupted: When the token expires
+    """
+    n_layers = len(layers)
+    layer_states = [states for _, states in layers]
+    if alive is None:
+        alive = [(1 << len(states)) - 1 for states in layer_states]
+    else:
+        alive = list(alive)
+    merged = [False] * n_layers
+
+    report = {
+        'initial_candidates': sum(_popcount(mask) for mask in alive),
+        'removed_by_baseline': 0,
+        'removed_by_arc_consistency': 0,
+        'merged_layers': 0,
+        'cells_fixed_by_consensus': 0,
+        'initial_decided_cells': _decided_cells(baseline),
+        'rounds': 0,
+        'contradiction': False,
+    }
+
+    if compat is not None:
+        def support(i, j, a):
+            return compat[i][j][a] & alive[j]
+    else:
+        # Rows computed so far; a row only covers the candidates of layer j
+        # alive when it was computed, which stays correct as they only shrink.
+        rows = {}
+
+        def support(i, j, a):
+            row = rows.get((i, j, a))
+            if row is None:
+                row = 0
+                for k in ops.filter_indices(layer_states[i][a], layer_states[j],
+                                            list(_iter_bits(alive[j]))):
+                    row |= 1 << int(k)
+                rows[(i, j, a)] = row
+            return row & alive[j]
+
+    changed = True
+    while changed and not report['contradiction']:
+        changed = False
+        report['rounds'] += 1
+
+        # Unary constraint: compatibility with the current baseline.
+        for i in range(n_layers):
+            indices = list(_iter_bits(alive[i]))
+            keep = 0
+            for k in ops.filter_indices(baseline, layer_states[i], indices):
+                keep |= 1 << int(k)
+            if keep != alive[i]:
+                report['removed_by_baseline'] += len(indices) - _popcount(keep)
+                alive[i] = keep
+        if not all(alive):
+            report['contradiction'] = True
+            break
+
+        # Arc consistency: every candidate needs a partner in every other layer.
+        revised = True
+        while revised:
+            revised = False
+            for i in range(n_layers):
+                if token is not None:
+                    token.check()
+                keep = alive[i]
+                for a in _iter_bits(alive[i]):
+                    if any(not support(i, j, a) for j in range(n_layers) if j != i):
+                        keep &= ~(1 << a)
+                if keep != alive[i]:
+                    report['removed_by_arc_consistency'] += _popcount(alive[i] ^ keep)
+                    alive[i] = keep
+                    revised = True
+            if not all(alive):
+                report['contradiction'] = True
+                break
+        if report['contradiction']:
+            break
+
+        # Strengthen the baseline with single candidates and agreed cells.
+        for i in range(n_layers):
+            if merged[i]:
+                continue
+            indices = list(_iter_bits(alive[i]))
+            before = _decided_cells(baseline)
+            if len(indices) == 1:
+                baseline = ops.merge(baseline, layer_states[i][indices[0]])
+                merged[i] = True
+                report['merged_layers'] += 1
+                changed = True
+            else:
+                baseline = ops.merge(baseline, ops.consensus(layer_states[i], indices))
+                fixed = _decided_cells(baseline) - before
+                if fixed:
+                    report['cells_fixed_by_consensus'] += fixed
+                    changed = True
+
+    pruned = []
+    for (configs, states), mask in zip(layers, alive):
+        indices = list(_iter_bits(mask))
+        pruned.append(([configs[k] for k in indices],
+                       ops.make_layer([states[k] for k in indices])))
+    report['final_candidates'] = sum(len(configs) for configs, _ in pruned)
+    report['decided_cells'] = _decided_cells(baseline)
+    return pruned, baseline, report
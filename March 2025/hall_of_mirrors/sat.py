@@ -0,0 +1,415 @@
+import heapq
+from .bitboard import Bitboard, matrix_to_bitboard
+from .search import _iter_bits
+
+# Layers larger than this use a sequential counter for "at most one" instead of
+# pairwise exclusion clauses.
+PAIRWISE_AMO_LIMIT = 6
+
+def _luby(i):
+    """The i-th term (1-based) of the Luby restart sequence 1, 1, 2, 1, 1, 2, 4, ..."""
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while i != (1 << k) - 1:
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+    return 1 << (k - 1)
+
+class CDCLSolver:
+    """
+    Conflict-driven clause-learning SAT solver.
+
+    Clauses are lists of non-zero ints in DIMACS style (v for a variable, -v for
+    its negation). The solver uses two watched literals per clause, first-UIP
+    clause learning with non-chronological backjumping, VSIDS variable
+    activities, phase saving and Luby restarts.
+    """
+
+    def __init__(self, restart_base=64, decay=0.95):
+        self.num_vars = 0
+        self.clauses = []
+        self.watches = []
+        self.values = []      # per variable: -1 unassigned, else 0/1
+        self.levels = []
+        self.reasons = []
+        self.activity = []
+        self.phase = []
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        self.heap = []
+        self.var_inc = 1.0
+        self.decay = decay
+        self.restart_base = restart_base
+        self.unsat = False
+        self.conflicts = 0
+        self.decisions = 0
+
+    # Literal codes: variable v maps to 2*(v-1) (positive) and 2*(v-1)+1 (negative).
+    @staticmethod
+    def _code(lit):
+        return 2 * (abs(lit) - 1) + (lit < 0)
+
+    def new_var(self):
+        """Create a variable and return its (positive) DIMACS index."""
+        self.num_vars += 1
+        self.watches.extend(([], []))
+        self.values.append(-1)
+        self.levels.append(0)
+        self.reasons.append(None)
+        self.activity.append(0.0)
+        self.phase.append(1)  # 1 means the negative literal is tried first
+        heapq.heappush(self.heap, (0.0, self.num_vars - 1))
+        return self.num_vars
+
+    def _lit_value(self, code):
+        value = self.values[code >> 1]
+        return -1 if value < 0 else value ^ (code & 1)
+
+    def add_clause(self, lits):
+        """
+        Add a clause. After solve() the search is reset to level 0 first, so
+        clauses (e.g. blocking a found model) can be added between calls while
+        the learnt clauses and activities are kept.
+
+        Returns:
+            False if the clause makes the formula trivially unsatisfiable
+        """
+        if self.unsat:
+            return False
+        self._backtrack(0)
+        codes = []
+        for lit in lits:
+            code = self._code(lit)
+            if code ^ 1 in codes:
+                return True  # Tautology
+            if code not in codes:
+                codes.append(code)
+        # Drop literals already false at level 0; skip clauses already satisfied.
+        codes = [c for c in codes if self._lit_value(c) != 0]
+        if any(self._lit_value(c) == 1 for c in codes):
+            return True
+        if not codes:
+            self.unsat = True
+            return False
+        if len(codes) == 1:
+            self._enqueue(codes[0], None)
+            if self._propagate() is not None:
+                self.unsat = True
+                return False
+            return True
+        self._attach(codes)
+        return True
+
+    def _attach(self, codes):
+        self.clauses.append(codes)
+        ci = len(self.clauses) - 1
+        self.watches[codes[0]].append(ci)
+        self.watches[codes[1]].append(ci)
+        return ci
+
+    def _enqueue(self, code, reason):
+        var = code >> 1
+        self.values[var] = (code & 1) ^ 1
+        self.levels[var] = len(self.trail_lim)
+        self.reasons[var] = reason
+        self.trail.append(code)
+
+    def _propagate(self):
+        """Unit propagation. Returns the index of a conflicting clause, or None."""
+        clauses = self.clauses
+        while self.qhead < len(self.trail):
+            false_lit = self.trail[self.qhead] ^ 1
+            self.qhead += 1
+            watchers = self.watches[false_lit]
+            self.watches[false_lit] = kept = []
+            for pos, ci in enumerate(watchers):
+                c = clauses[ci]
+                if c[0] == false_lit:
+                    c[0], c[1] = c[1], c[0]
+                if self._lit_value(c[0]) == 1:
+                    kept.append(ci)
+                    continue
+                for k in range(2, len(c)):
+                    if self._lit_value(c[k]) != 0:
+                        c[1], c[k] = c[k], c[1]
+                        self.watches[c[1]].append(ci)
+                        break
+                else:
+                    kept.append(ci)
+                    if self._lit_value(c[0]) == 0:
+                        kept.extend(watchers[pos + 1:])
+                        self.qhead = len(self.trail)
+                        return ci
+                    self._enqueue(c[0], ci)
+        return None
+
+    def _bump(self, var):
+        self.activity[var] += self.var_inc
+        if self.activity[var] > 1e100:
+            self.activity = [a * 1e-100 for a in self.activity]
+            self.var_inc *= 1e-100
+            self.heap = [(-a, v) for v, a in enumerate(self.activity) if self.values[v] < 0]
+            heapq.heapify(self.heap)
+        if self.values[var] < 0:
+            heapq.heappush(self.heap, (-self.activity[var], var))
+
+    def _analyze(self, confl):
+        """First-UIP conflict analysis. Returns (learnt clause codes, backjump level)."""
+        seen = set()
+        learnt = [None]
+        counter = 0
+        current = len(self.trail_lim)
+        p = None
+        idx = len(self.trail) - 1
+        ci = confl
+        while True:
+            c = self.clauses[ci]
+            for q in (c if p is None else c[1:]):
+                var = q >> 1
+                if var not in seen and self.levels[var] > 0:
+                    seen.add(var)
+                    self._bump(var)
+                    if self.levels[var] == current:
+                        counter += 1
+                    else:
+                        learnt.append(q)
+            while (self.trail[idx] >> 1) not in seen:
+                idx -= 1
+            p = self.trail[idx]
+            idx -= 1
+            seen.discard(p >> 1)
+            counter -= 1
+            if counter == 0:
+                break
+            ci = self.reasons[p >> 1]
+        learnt[0] = p ^ 1
+
+        if len(learnt) == 1:
+            return learnt, 0
+        # Watch the literal of the highest remaining level second.
+        best = max(range(1, len(learnt)), key=lambda i: self.levels[learnt[i] >> 1])
+        learnt[1], learnt[best] = learnt[best], learnt[1]
+        return learnt, self.levels[learnt[1] >> 1]
+
+    def _backtrack(self, level):
+        if len(self.trail_lim) <= level:
+            return
+        start = self.trail_lim[level]
+        for code in self.trail[start:]:
+            var = code >> 1
+            self.phase[var] = code & 1
+            self.values[var] = -1
+            self.reasons[var] = None
+            heapq.heappush(self.heap, (-self.activity[var], var))
+        del self.trail[start:]
+        del self.trail_lim[level:]
+        self.qhead = len(self.trail)
+
+    def _pick_branch(self):
+        while self.heap:
+            _, var = heapq.heappop(self.heap)
+            if self.values[var] < 0:
+                return 2 * var + self.phase[var]
+        return None
+
+    def solve(self, max_conflicts=None):
+        """
+        Search for a satisfying assignment.
+
+        Args:
+            max_conflicts: Optional conflict budget
+
+        Returns:
+            True if satisfiable, False if unsatisfiable, None if the budget ran out
+        """
+        if self.unsat:
+            return False
+        if self._propagate() is not None:
+            self.unsat = True
+            return False
+
+        restarts = 0
+        restart_limit = self.restart_base * _luby(1)
+        conflicts_since_restart = 0
+        while True:
+            confl = self._propagate()
+            if confl is not None:
+                self.conflicts += 1
+                conflicts_since_restart += 1
+                if not self.trail_lim:
+                    self.unsat = True
+                    return False
+                learnt, level = self._analyze(confl)
+                self._backtrack(level)
+                if len(learnt) == 1:
+                    self._enqueue(learnt[0], None)
+                else:
+                    self._enqueue(learnt[0], self._attach(learnt))
+                self.var_inc /= self.decay
+                if max_conflicts is not None and self.conflicts >= max_conflicts:
+                    return None
+                continue
+
+            if conflicts_since_restart >= restart_limit:
+                restarts += 1
+                conflicts_since_restart = 0
+                restart_limit = self.restart_base * _luby(restarts + 1)
+                self._backtrack(0)
+                continue
+
+            code = self._pick_branch()
+            if code is None:
+                return True
+            self.decisions += 1
+            self.trail_lim.append(len(self.trail))
+            self._enqueue(code, None)
+
+    def value(self, var):
+        """Truth value of a variable in the model found by solve()."""
+        return self.values[var - 1] == 1
+
+def _to_bitboard(state):
+    return state if isinstance(state, Bitboard) else matrix_to_bitboard(state)
+
+def encode_layers(layer_states, baseline, grid_size, solver=None):
+    """
+    Encode a candidate selection problem as CNF.
+
+    Variables are created for every candidate and for the A and B mirror of
+    every cell some candidate puts a mirror on. Clauses state that:
+      - exactly one candidate is chosen per layer;
+      - a chosen candidate fixes its mirrors and keeps mirrors off its path and
+        forbidden cells;
+      - a cell holds at most one mirror type;
+      - mirrors are never placed in orthogonally adjacent cells;
+      - the baseline's mirrors and mirror-free cells hold.
+
+    Args:
+        layer_states: Per-layer candidate states (Bitboards or matrices)
+        baseline: Baseline state (Bitboard or matrix)
+        grid_size: Size of the grid
+        solver: Optional solver to add the clauses to (a new CDCLSolver by default)
+
+    Returns:
+        A tuple (solver, candidate_vars) where candidate_vars[i][a] is the
+        variable of candidate a of layer i
+    """
+    if solver is None:
+        solver = CDCLSolver()
+    layers = [[_to_bitboard(state) for state in states] for states in layer_states]
+    baseline = _to_bitboard(baseline)
+
+    # Cell variables, only where a mirror is possible at all.
+    mirror_cells = baseline.mirror_a | baseline.mirror_b
+    for states in layers:
+        for bb in states:
+            mirror_cells |= bb.mirror_a | bb.mirror_b
+    cell_a, cell_b = {}, {}
+    for cell in _iter_bits(mirror_cells):
+        cell_a[cell] = solver.new_var()
+        cell_b[cell] = solver.new_var()
+        solver.add_clause([-cell_a[cell], -cell_b[cell]])
+
+    def no_mirror(cells):
+        for cell in _iter_bits(cells & mirror_cells):
+            yield cell
+
+    # Adjacency rule between every pair of neighbouring mirror cells.
+    for cell in cell_a:
+        x, y = cell % grid_size, cell // grid_size
+        for other in ((cell + 1) if x + 1 < grid_size else None,
+                      (cell + grid_size) if y + 1 < grid_size else None):
+            if other in cell_a:
+                for m1 in (cell_a[cell], cell_b[cell]):
+                    for m2 in (cell_a[other], cell_b[other]):
+                        solver.add_clause([-m1, -m2])
+
+    # Baseline facts.
+    for cell in _iter_bits(baseline.mirror_a):
+        solver.add_clause([cell_a[cell]])
+    for cell in _iter_bits(baseline.mirror_b):
+        solver.add_clause([cell_b[cell]])
+    for cell in no_mirror(baseline.path | baseline.forbidden):
+        solver.add_clause([-cell_a[cell]])
+        solver.add_clause([-cell_b[cell]])
+
+    candidate_vars = []
+    for states in layers:
+        xs = [solver.new_var() for _ in states]
+        candidate_vars.append(xs)
+        for x, bb in zip(xs, states):
+            for cell in _iter_bits(bb.mirror_a):
+                solver.add_clause([-x, cell_a[cell]])
+            for cell in _iter_bits(bb.mirror_b):
+                solver.add_clause([-x, cell_b[cell]])
+            for cell in no_mirror(bb.path | bb.forbidden):
+                solver.add_clause([-x, -cell_a[cell]])
+                solver.add_clause([-x, -cell_b[cell]])
+
+        # Exactly one candidate per layer.
+        solver.add_clause(xs)
+        if len(xs) <= PAIRWISE_AMO_LIMIT:
+            for i in range(len(xs)):
+                for j in range(i + 1, len(xs)):
+                    solver.add_clause([-xs[i], -xs[j]])
+        else:
+            # Sequential counter: s[i] is true once one of xs[0..i] is chosen.
+            s = [solver.new_var() for _ in xs[:-1]]
+            solver.add_clause([-xs[0], s[0]])
+            for i in range(1, len(xs) - 1):
+                solver.add_clause([-xs[i], s[i]])
+                solver.add_clause([-s[i - 1], s[i]])
+                solver.add_clause([-xs[i], -s[i - 1]])
+            solver.add_clause([-xs[-1], -s[-1]])
+
+    return solver, candidate_vars
+
+def iter_sat_search(layer_states, baseline, ops, grid_size, max_conflicts=None):
+    """
+    Enumerate candidate selections with the CDCL engine.
+
+    After each model a clause blocking its selection is added and the same
+    solver is resumed, so learnt clauses carry over between solutions.
+
+    Args:
+        layer_states: Per-layer candidate states (lists or stacked arrays)
+        baseline: Starting state the candidates are merged onto
+        ops: Backend operations (see solver._backend_ops)
+        grid_size: Size of the grid
+        max_conflicts: Optional conflict budget per solve() call; exceeding it
+            ends the enumeration
+
+    Yields:
+        Tuples (chosen, final_state) where chosen holds the selected candidate
+        index of every layer
+    """
+    solver, candidate_vars = encode_layers(layer_states, baseline, grid_size)
+    while solver.solve(max_conflicts):
+        chosen = [next(a for a, x in enumerate(xs) if solver.value(x)) for xs in candidate_vars]
+        state = baseline
+        for states, k in zip(layer_states, chosen):
+            state = ops.merge(state, states[k])
+        yield chosen, state
+        if not solver.add_clause([-xs[k] for xs, k in zip(candidate_vars, chosen)]):
+            return
+
+def sat_search(layer_states, baseline, ops, grid_size, max_conflicts=None):
+    """
+    Select one candidate per layer with the CDCL engine.
+
+    Args:
+        layer_states: Per-layer candidate states (lists or stacked arrays)
+        baseline: Starting state the candidates are merged onto
+        ops: Backend operations (see solver._backend_ops)
+        grid_size: Size of the grid
+        max_conflicts: Optional conflict budget; exceeding it returns None
+
+    Returns:
+        A tuple (chosen, final_state) where chosen holds the selected candidate
+        index of every layer, or None if there is no solution
+    """
+    return next(iter_sat_search(layer_states, baseline, ops, grid_size, max_conflicts), None)
@@ -0,0 +1,422 @@
+from .budget import SearchInterrupted
+
+_DONE = object()
+
+def _iter_stack_search(root, expand, descend, n_layers, stats=None, token=None, resume=None,
+                       checkpoint=None):
+    """
+    Depth-first search over an explicit stack of frames, shared by the
+    strategies below.
+
+    Every frame holds a node, the layer it assigns and an iterator over the
+    candidates to try. The frontier of the search is one [layer, position,
+    index] entry per frame: the number of candidates of the layer already
+    taken from the iterator, and the last of them. Below the top frame, that
+    last candidate is the one being explored. Since expand is deterministic,
+    a frontier is enough to rebuild the stack and continue.
+
+    Args:
+        root: Node of the empty assignment
+        expand: Function mapping a node to None when every layer is assigned,
+            otherwise to (layer, options) with options an iterable of
+            (index, payload) pairs, in the order they are tried
+        descend: Function (node, layer, index, payload) returning the child
+            node, or None if the candidate is rejected
+        n_layers: Number of layers
+        stats, token, resume, checkpoint: See iter_mrv_search
+
+    Yields:
+        Tuples (chosen, node) for every node where all layers are assigned
+
+    Raises:
+        SearchInterrupted: When the token expires, with the frontier
+        ValueError: If resume does not match the search
+    """
+    chosen = [None] * n_layers
+    stack = []
+
+    def frontier():
+        return [[layer, position, index] for _, layer, _, position, index in stack]
+
+    expanded = expand(root)
+    if expanded is None:
+        yield chosen, root
+        return
+    node = root
+    for depth, (layer, position, index) in enumerate(resume or [[expanded[0], 0, None]]):
+        if expanded is None or expanded[0] != layer:
+            raise ValueError("frontier does not match the search")
+        options = iter(expanded[1])
+        payload, last = None, None
+        for _ in range(position):
+            last, payload = next(options, (_DONE, None))
+        if position and last != index:
+            raise ValueError("frontier does not match the search")
+        stack.append([node, layer, options, position, index])
+        if depth < len(resume or []) - 1:
+            node = descend(node, layer, index, payload)
+            if node is None:
+                raise ValueError("frontier does not match the search")
+            chosen[layer] = index
+            expanded = expand(node)
+
+    while stack:
+        if token is not None:
+            reason = token.reason()
+            if reason is not None:
+                raise SearchInterrupted(reason, frontier())
+        if checkpoint is not None:
+            checkpoint(frontier)
+
+        frame = stack[-1]
+        node, layer, options = frame[:3]
+        depth = len(stack) - 1
+        entry = next(options, None)
+        if entry is None:
+            stack.pop()
+            chosen[layer] = None
+            if stack and stats is not None:
+                parent = stack[-1]
+                stats.exit_node(depth - 1, parent[1], parent[4])
+            continue
+
+        k, payload = entry
+        frame[3] += 1
+        frame[4] = k
+        child = descend(node, layer, k, payload)
+        if child is None:
+            continue
+        chosen[layer] = k
+        if stats is not None:
+            stats.enter_node(depth, layer, k)
+        expanded = expand(child)
+        if expanded is None:
+            if stats is not None:
+                stats.solution_found(list(chosen))
+            yield list(chosen), child
+            if stats is not None:
+                stats.exit_node(depth, layer, k)
+        else:
+            stack.append([child, expanded[0], iter(expanded[1]), 0, None])
+
+def _static_tree(layer_states, baseline, ops):
+    """(root, expand, descend) of iter_static_search, see _iter_stack_search."""
+    n_layers = len(layer_states)
+
+    # Nodes are (depth, state) pairs; candidates are checked lazily
+    def expand(node):
+        i, current = node
+        if i == n_layers:
+            return None
+        return i, ((k, None) for k in ops.compatible_indices(current, layer_states[i]))
+
+    def descend(node, layer, k, _):
+        return layer + 1, ops.merge(node[1], layer_states[layer][k])
+
+    return (0, baseline), expand, descend
+
+def iter_static_search(layer_states, baseline, ops, stats=None, token=None, resume=None,
+                       checkpoint=None):
+    """
+    Backtracking search taking the layers in their given order, yielding every
+    solution.
+
+    Args:
+        layer_states: Per-layer candidate states (lists or stacked arrays)
+        baseline: Starting state the candidates are merged onto
+        ops: Backend operations (see solver._backend_ops)
+        stats, token, resume, checkpoint: See iter_mrv_search
+
+    Yields:
+        Tuples (chosen, final_state) where chosen holds the selected candidate
+        index of every layer
+    """
+    for chosen, (_, final_state) in _iter_stack_search(*_static_tree(layer_states, baseline, ops),
+                                                       len(layer_states), stats, token, resume,
+                                                       checkpoint):
+        yield chosen, final_state
+
+def static_search(layer_states, baseline, ops, stats=None):
+    """
+    Backtracking search taking the layers in their given order.
+
+    Args:
+        layer_states: Per-layer candidate states (lists or stacked arrays)
+        baseline: Starting state the candidates are merged onto
+        ops: Backend operations (see solver._backend_ops)
+        stats: Optional stats.SolveStats recording the nodes of the search
+
+    Returns:
+        A tuple (chosen, final_state) where chosen holds the selected candidate
+        index of every layer, or None if there is no solution
+    """
+    return next(iter_static_search(layer_states, baseline, ops, stats), None)
+
+def _forward_check(state, domains, layer_states, ops, skip):
+    """
+    Restrict every open domain to the candidates compatible with 'state'.
+
+    Returns:
+        The new domains, or None as soon as one of them becomes empty
+    """
+    new_domains = {}
+    for layer, domain in domains.items():
+        if layer == skip:
+            continue
+        pruned = ops.filter_indices(state, layer_states[layer], domain)
+        if not len(pruned):
+            return None
+        new_domains[layer] = pruned
+    return new_domains
+
+def _mrv_tree(layer_states, baseline, ops):
+    """
+    (root, expand, descend) of iter_mrv_search, see _iter_stack_search, or
+    None if forward checking the baseline already empties a layer.
+    """
+    domains = _forward_check(baseline,
+                             {layer: range(len(states)) for layer, states in enumerate(layer_states)},
+                             layer_states, ops, skip=None)
+    if domains is None:
+        return None
+
+    # Nodes are (state, domains) pairs
+    def expand(node):
+        current, domains = node
+        if not domains:
+            return None
+        layer = min(domains, key=lambda l: (len(domains[l]), l))
+        states = layer_states[layer]
+
+        # Forward-check every value first so they can be ordered by how much
+        # room they leave to the other layers.
+        options = []
+        for k in domains[layer]:
+            new_state = ops.merge(current, states[k])
+            new_domains = _forward_check(new_state, domains, layer_states, ops, skip=layer)
+            if new_domains is not None:
+                room = sum(len(d) for d in new_domains.values())
+                options.append((-room, len(options), k, new_state, new_domains))
+        options.sort(key=lambda option: option[:2])
+        return layer, [(k, (new_state, new_domains))
+                       for _, _, k, new_state, new_domains in options]
+
+    def descend(node, layer, k, child):
+        return child
+
+    return (baseline, domains), expand, descend
+
+def iter_mrv_search(layer_states, baseline, ops, stats=None, token=None, resume=None,
+                    checkpoint=None):
+    """
+    Backtracking search with dynamic layer ordering and forward checking,
+    yielding every solution.
+
+    At each node the open layer with the fewest candidates still compatible
+    with the current state (minimum remaining values) is assigned next. After
+    each merge every other open layer is pruned against the new state, and
+    the branch is abandoned as soon as one becomes empty. Candidates are tried
+    least-constraining first, i.e. those leaving the most candidates in the
+    other layers. The pruned domains along the current branch are kept while
+    the search resumes after a solution.
+
+    The search runs over an explicit stack, so it can be stopped by a token
+    and resumed from the frontier it stopped at.
+
+    Args:
+        layer_states: Per-layer candidate states (lists or stacked arrays)
+        baseline: Starting state the candidates are merged onto
+        ops: Backend operations (see solver._backend_ops)
+        stats: Optional stats.SolveStats recording the nodes of the search
+        token: Optional budget.CancelToken polled before every node
+        resume: Optional frontier of an interrupted run of the same search
+            (budget.SearchInterrupted.frontier), to continue from there
+        checkpoint: Optional callable (e.g. budget.PeriodicCheckpoint) called
+            before every node with a function returning the frontier
+
+    Yields:
+        Tuples (chosen, final_state) where chosen holds the selected candidate
+        index of every layer
+
+    Raises:
+        budget.SearchInterrupted: When the token expires
+    """
+    tree = _mrv_tree(layer_states, baseline, ops)
+    if tree is None:
+        return
+    for chosen, (final_state, _) in _iter_stack_search(*tree, len(layer_states), stats, token,
+                                                       resume, checkpoint):
+        yield chosen, final_state
+
+def mrv_search(layer_states, baseline, ops, stats=None):
+    """
+    Backtracking search with dynamic layer ordering and forward checking.
+
+    See iter_mrv_search for the search order.
+
+    Args:
+        layer_states: Per-layer candidate states (lists or stacked arrays)
+        baseline: Starting state the candidates are merged onto
+        ops: Backend operations (see solver._backend_ops)
+        stats: Optional stats.SolveStats recording the nodes of the search
+
+    Returns:
+        A tuple (chosen, final_state) where chosen holds the selected candidate
+        index of every layer, or None if there is no solution
+    """
+    return next(iter_mrv_search(layer_states, baseline, ops, stats), None)
+
+def _popcount(mask):
+    return bin(mask).count('1')
+
+def _iter_bits(mask):
+    """Yield the indices of the set bits of 'mask', lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+def pairwise_compatibility(layer_states, ops, token=None):
+    """
+    Precompute which candidates of every pair of layers can coexist.
+
+    Compatibility is checked cell by cell, so a set of candidates can be merged
+    without conflict exactly when every pair of them is compatible. This table
+    therefore answers every compatibility question of the search up front.
+
+    Args:
+        layer_states: Per-layer candidate states (lists or stacked arrays)
+        ops: Backend operations (see solver._backend_ops)
+        token: Optional budget.CancelToken polled before every row
+
+    Returns:
+        A nested list compat where compat[i][j][a] is a bitset (int) over the
+        candidates of layer j, with bit k set when candidate a of layer i and
+        candidate k of layer j are compatible (compat[i][i] is None)
+
+    Raises:
+        budget.SearchInterrupted: When the token expires
+    """
+    n_layers = len(layer_states)
+    compat = [[None] * n_layers for _ in range(n_layers)]
+    for i in range(n_layers):
+        for j in range(i + 1, n_layers):
+            rows = []
+            for a in range(len(layer_states[i])):
+                if token is not None:
+                    token.check()
+                mask = 0
+                for k in ops.compatible_indices(layer_states[i][a], layer_states[j]):
+                    mask |= 1 << int(k)
+                rows.append(mask)
+            # Compatibility is symmetric, so layer j's row is the transpose.
+            cols = [0] * len(layer_states[j])
+            for a, mask in enumerate(rows):
+                for k in _iter_bits(mask):
+                    cols[k] |= 1 << a
+            compat[i][j] = rows
+            compat[j][i] = cols
+    return compat
+
+def _bitset_tree(compat, layer_sizes):
+    """
+    (root, expand, descend) of iter_bitset_search, see _iter_stack_search, or
+    None if some layer is empty.
+    """
+    if any(size == 0 for size in layer_sizes):
+        return None
+
+    # Nodes are (remaining, open_layers) pairs
+    def expand(node):
+        remaining, open_layers = node
+        if not open_layers:
+            return None
+        layer = min(open_layers, key=lambda l: (_popcount(remaining[l]), l))
+        return layer, ((k, None) for k in _iter_bits(remaining[layer]))
+
+    def descend(node, layer, k, _):
+        remaining, open_layers = node
+        masks = compat[layer]
+        new_remaining = list(remaining)
+        rest = [l for l in open_layers if l != layer]
+        for j in rest:
+            new_remaining[j] = remaining[j] & masks[j][k]
+            if not new_remaining[j]:
+                return None
+        return new_remaining, rest
+
+    root = [(1 << size) - 1 for size in layer_sizes], list(range(len(layer_sizes)))
+    return root, expand, descend
+
+def iter_bitset_search(compat, layer_sizes, stats=None, token=None, resume=None,
+                       checkpoint=None):
+    """
+    Backtracking search over a pairwise compatibility table, yielding every
+    solution.
+
+    The remaining candidates of an open layer are the bitwise AND of the masks
+    of the candidates already chosen, so the search never touches a matrix.
+    The open layer with the fewest remaining candidates is assigned next, and a
+    branch is abandoned as soon as some open layer has none left.
+
+    Args:
+        compat: Table built by pairwise_compatibility
+        layer_sizes: Number of candidates in each layer
+        stats, token, resume, checkpoint: See iter_mrv_search
+
+    Yields:
+        Lists with the chosen candidate index of every layer
+    """
+    tree = _bitset_tree(compat, layer_sizes)
+    if tree is None:
+        return
+    for chosen, _ in _iter_stack_search(*tree, len(layer_sizes), stats, token, resume,
+                                        checkpoint):
+        yield chosen
+
+def bitset_search(compat, layer_sizes, stats=None):
+    """
+    Backtracking search over a pairwise compatibility table.
+
+    See iter_bitset_search for the search order.
+
+    Args:
+        compat: Table built by pairwise_compatibility
+        layer_sizes: Number of candidates in each layer
+        stats: Optional stats.SolveStats recording the nodes of the search
+
+    Returns:
+        A list with the chosen candidate index of every layer, or None if there
+        is no solution
+    """
+    return next(iter_bitset_search(compat, layer_sizes, stats), None)
+
+def search_tree(layer_states, baseline, ops, strategy, compat=None):
+    """
+    The search tree explored by a backtracking strategy, for searches that
+    walk it themselves (see parallel.parallel_search).
+
+    Args:
+        layer_states: Per-layer candidate states (lists or stacked arrays)
+        baseline: Starting state the candidates are merged onto
+        ops: Backend operations (see solver._backend_ops)
+        strategy: 'mrv', 'static' or 'bitset' (see solver.solve_puzzle)
+        compat: For 'bitset', the pairwise_compatibility table of the layers
+            (computed if not given)
+
+    Returns:
+        A tuple (root, expand, descend) as taken by _iter_stack_search, or
+        None if the search fails at the root
+
+    Raises:
+        ValueError: If the strategy is unknown
+    """
+    if strategy == 'mrv':
+        return _mrv_tree(layer_states, baseline, ops)
+    if strategy == 'static':
+        return _static_tree(layer_states, baseline, ops)
+    if strategy == 'bitset':
+        if compat is None:
+            compat = pairwise_compatibility(layer_states, ops)
+        return _bitset_tree(compat, [len(states) for states in layer_states])
+    raise ValueError(f"Unknown strategy: {strategy!r}")
@@ -0,0 +1,206 @@
+from itertools import islice
+from .simulation import SIDES, ray_exit
+from .search import pairwise_compatibility
+from .propagation import propagate
+from .layer_cache import LayerCache, cached_clue_layers
+from .solver import (clue_layer, _backend_ops, _slot_clues, _iter_layer_solutions, _report,
+                     _clue_layers_parallel)
+
+class PuzzleSession:
+    """
+    A puzzle whose clues are added and removed one at a time, re-solved
+    incrementally.
+
+    A clue's candidates only depend on the other clues through the exit-clash
+    rule: a path may not leave the grid through a slot holding a different
+    clue. The session therefore enumerates every clue's candidates once,
+    without that rule, and records the slot each candidate exits through; the
+    rule is applied as a mask when solving, and an edit only recomputes the
+    masks of the clues with candidates exiting through the changed slot. The
+    pairwise compatibility of the candidates of two clues is computed once
+    per pair and reused by propagation. Layers and compatibility tables of
+    removed clues are kept, so undoing an edit costs no enumeration.
+    """
+
+    def __init__(self, grid_size=10, clues=None, max_tuple_length=None, max_factor=None,
+                 backend='bitboard', enumeration='fused', strategy='mrv', workers=None,
+                 cache=None):
+        """
+        Args:
+            grid_size: Size of the grid
+            clues: Optional initial clues, keyed by (side, index) slot
+            max_tuple_length, max_factor: As in solver.solve_clues
+            backend, enumeration, strategy, workers, cache: As in
+                solver.solve_puzzle (the search always uses the backtrack
+                engine with propagation)
+        """
+        _, _, self.max_tuple_length, self.max_factor = _slot_clues(
+            {}, grid_size, max_tuple_length, max_factor)
+        self.grid_size = grid_size
+        self.enumeration = enumeration
+        self.strategy = strategy
+        self.workers = workers
+        if cache is not None and not isinstance(cache, LayerCache):
+            cache = LayerCache(cache)
+        self.cache = cache
+        self._ops = _backend_ops(backend, grid_size)
+        self._clues = {}
+        # (value, side, index) -> (candidates, states, exits), exits mapping
+        # every exit slot to the bitmask of the candidates leaving through it
+        self._layers = {}
+        # Slot -> bitmask of the candidates of its clue allowed by the others
+        self._allowed = {}
+        # ((value, side, index), (value, side, index)) -> compatibility rows
+        self._compat = {}
+        # (layers, baseline) of the current clues, (None, None) if they
+        # contradict each other, or None after an edit
+        self._prepared = None
+        for (side, index), value in (clues or {}).items():
+            self.add_clue(side, index, value)
+
+    @property
+    def clues(self):
+        """The current clues, keyed by (side, index) slot."""
+        return dict(self._clues)
+
+    # Edits -----------------------------------------------------------------
+
+    def add_clue(self, side, index, value):
+        """
+        Set the clue of a border slot, replacing the one it held.
+
+        Raises:
+            ValueError: If the slot or value is invalid
+        """
+        if side not in SIDES:
+            raise ValueError(f"unknown side: {side!r}")
+        if not isinstance(index, int) or not 0 <= index < self.grid_size:
+            raise ValueError(f"index out of range: {side} {index!r}")
+        if not isinstance(value, int) or value < 1:
+            raise ValueError(f"invalid clue value: {value!r}")
+        if self._clues.get((side, index)) == value:
+            return
+        self._clues[(side, index)] = value
+        self._invalidate((side, index))
+
+    def remove_clue(self, side, index):
+        """
+        Remove the clue of a border slot.
+
+        Raises:
+            KeyError: If the slot holds no clue
+        """
+        del self._clues[(side, index)]
+        self._invalidate((side, index))
+
+    def _invalidate(self, slot):
+        """Forget the exit masks that depend on the clue of slot."""
+        self._prepared = None
+        self._allowed.pop(slot, None)
+        for other, value in self._clues.items():
+            layer = self._layers.get((value, *other))
+            if layer is not None and slot in layer[2]:
+                self._allowed.pop(other, None)
+
+    # Incremental state -----------------------------------------------------
+
+    def _build_layers(self, tasks):
+        """Enumerate the unrestricted candidates of new clues, with their exits."""
+        args = (self.grid_size, {}, self.max_tuple_length, self.max_factor, self.enumeration)
+        tasks = {task: args for task in tasks}
+        if self.cache is not None:
+            built = cached_clue_layers(self.cache, tasks, self._build)
+        else:
+            built = self._build(tasks)
+        for (value, side, index), candidates in built.items():
+            # Searched in canonical order, as by solver.solve_clues
+            candidates = sorted(candidates, key=lambda candidate: candidate.sort_key())
+            exits = {}
+            for k, candidate in enumerate(candidates):
+                slot = ray_exit(side, index, candidate.mirrors, self.grid_size)
+                exits[slot] = exits.get(slot, 0) | 1 << k
+            states = self._ops.from_bitboards([c.bitboard(self.grid_size) for c in candidates])
+            self._layers[(value, side, index)] = candidates, states, exits
+
+    def _build(self, tasks):
+        if self.workers is not None and self.workers > 1:
+            return _clue_layers_parallel(tasks, self.workers)
+        return {task: clue_layer(*task, *args) for task, args in tasks.items()}
+
+    def _allowed_mask(self, slot):
+        """Bitmask of the candidates of a clue not exiting through a different clue."""
+        if slot not in self._allowed:
+            value = self._clues[slot]
+            candidates, _, exits = self._layers[(value, *slot)]
+            mask = (1 << len(candidates)) - 1
+            for exit_slot, exiting in exits.items():
+                if self._clues.get(exit_slot, value) != value:
+                    mask &= ~exiting
+            self._allowed[slot] = mask
+        return self._allowed[slot]
+
+    def _pair(self, first, second):
+        """Compatibility rows of the candidates of clue first against clue second."""
+        if (first, second) not in self._compat:
+            table = pairwise_compatibility([self._layers[first][1], self._layers[second][1]],
+                                           self._ops)
+            self._compat[(first, second)] = table[0][1]
+            self._compat[(second, first)] = table[1][0]
+        return self._compat[(first, second)]
+
+    def _prepare(self):
+        """
+        The propagated (candidates, states) layers and baseline of the current
+        clues, in the order of clues, or (None, None) if they have no solution.
+        """
+        if self._prepared is not None:
+            return self._prepared
+        tasks = [(value, side, index) for (side, index), value in self._clues.items()]
+        missing = [task for task in tasks if task not in self._layers]
+        if missing:
+            self._build_layers(missing)
+
+        n_layers = len(tasks)
+        layers = [self._layers[task][:2] for task in tasks]
+        alive = [self._allowed_mask(task[1:]) for task in tasks]
+        compat = [[None if i == j else self._pair(tasks[i], tasks[j]) for j in range(n_layers)]
+                  for i in range(n_layers)]
+        pruned, baseline, report = propagate(layers, self._ops.empty, self._ops, compat, alive)
+        self._prepared = (None, None) if report['contradiction'] else (pruned, baseline)
+        return self._prepared
+
+    # Solving ---------------------------------------------------------------
+
+    def iter_solutions(self):
+        """
+        Lazily enumerate every solution of the current clues.
+
+        Yields:
+            (configs, matrix, products) tuples as returned by solver.solve_clues,
+            with configs in the order of clues
+        """
+        layers, baseline = self._prepare()
+        if layers is None:
+            return
+        layer_states = [states for _, states in layers]
+        for chosen, final_state in _iter_layer_solutions(layer_states, baseline, self._ops,
+                                                         self.grid_size, self.strategy,
+                                                         'backtrack'):
+            yield _report(layers, chosen, final_state, self._ops, self.grid_size)
+
+    def solve(self):
+        """
+        Solve the current clues.
+
+        Returns:
+            A tuple (configs, matrix, products) as in solver.solve_clues, or
+            None if there is no solution
+        """
+        return next(self.iter_solutions(), None)
+
+    def count_solutions(self, limit=2):
+        """
+        Count the solutions of the current clues, stopping once 'limit' are
+        found (see solver.count_solutions).
+        """
+        return sum(1 for _ in islice(self.iter_solutions(), limit))
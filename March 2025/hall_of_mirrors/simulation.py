@@ -1,127 +1,309 @@
 import numpy as np
+from bisect import bisect_left, bisect_right
 
-def simulate_ray(clue_side, clue_index, mirror_config, grid_size=10):
+# Mirror reflection rules for types A and B, keyed by incoming direction.
+MIRROR_RULES = {
+    'A': {(0, 1): (1, 0), (1, 0): (0, 1), (0, -1): (-1, 0), (-1, 0): (0, -1)},
+    'B': {(0, 1): (-1, 0), (-1, 0): (0, 1), (0, -1): (1, 0), (1, 0): (0, -1)}
+}
+
+def entry_state(side, index, grid_size):
+    """
+    Starting state of a ray entering the grid from a border slot.
+
+    Args:
+        side: Starting side ('top', 'right', 'bottom', 'left')
+        index: Starting index on the specified side
+        grid_size: Size of the grid
+
+    Returns:
+        A tuple (x, y, dx, dy) where (x, y) is the cell just outside the grid
+        the ray starts from and (dx, dy) its direction
+    """
+    if side == 'top':
+        return index, grid_size, 0, -1
+    if side == 'right':
+        return grid_size, index, -1, 0
+    if side == 'bottom':
+        return index, -1, 0, 1
+    if side == 'left':
+        return -1, index, 1, 0
+    raise ValueError(f"Unknown side: {side!r}")
+
+class MirrorIndex:
+    """
+    Next-mirror index for one mirror layout.
+
+    For every row and column it keeps the sorted coordinates of its mirrors, so
+    the next mirror (or the wall) from any cell in any direction is found by
+    bisection. Tracing a ray then costs one lookup per reflection instead of
+    one step per cell, and building the index only touches the mirrors.
+    """
+    __slots__ = ('grid_size', 'types', 'rows', 'cols')
+
+    def __init__(self, mirrors, grid_size):
+        """
+        Args:
+            mirrors: Iterable of (x, y, type) mirrors. If a cell is listed
+                twice, the first entry wins, as in simulate_ray.
+            grid_size: Size of the grid
+        """
+        self.grid_size = grid_size
+        self.types = {}
+        for (mx, my, mtype) in mirrors:
+            self.types.setdefault((mx, my), mtype)
+        rows, cols = {}, {}
+        for (mx, my) in self.types:
+            rows.setdefault(my, []).append(mx)
+            cols.setdefault(mx, []).append(my)
+        for coords in rows.values():
+            coords.sort()
+        for coords in cols.values():
+            coords.sort()
+        self.rows = rows
+        self.cols = cols
+
+    @classmethod
+    def from_config(cls, mirror_config, grid_size):
+        """
+        Build the index from a list of (x, y, type) mirrors.
+        """
+        return cls(mirror_config, grid_size)
+
+    @classmethod
+    def from_matrix(cls, mat):
+        """
+        Build the index from a grid matrix (-3 for A mirrors, -2 for B mirrors).
+        """
+        mat = np.asarray(mat)
+        ys, xs = np.nonzero((mat == -3) | (mat == -2))
+        types = np.where(mat[ys, xs] == -3, 'A', 'B')
+        return cls(zip(xs.tolist(), ys.tolist(), types.tolist()), mat.shape[0])
+
+    def next_stop(self, x, y, dx, dy):
+        """
+        Find where a ray at (x, y) moving along (dx, dy) stops next.
+
+        Args:
+            x, y: Current position (a cell, or the cell just outside the grid)
+            dx, dy: Direction of travel
+
+        Returns:
+            A tuple (stop_x, stop_y, mirror_type), where mirror_type is None when
+            the ray leaves the grid at (stop_x, stop_y)
+        """
+        n = self.grid_size
+        if dx:
+            line, pos = self.rows.get(y), x
+        else:
+            line, pos = self.cols.get(x), y
+        step = dx + dy
+        stop = n if step == 1 else -1
+        if line:
+            if step == 1:
+                i = bisect_right(line, pos)
+                if i < len(line):
+                    stop = line[i]
+            else:
+                i = bisect_left(line, pos) - 1
+                if i >= 0:
+                    stop = line[i]
+        if dx:
+            return stop, y, self.types.get((stop, y))
+        return x, stop, self.types.get((x, stop))
+
+    def segments(self, side, index):
+        """
+        Yield the segments of the ray entering from a border slot.
+
+        Args:
+            side: The starting side ('top', 'right', 'bottom', 'left')
+            index: The starting index on the specified side
+
+        Yields:
+            Tuples (x, y, dx, dy, stop_x, stop_y, mirror_type): the segment
+            starts at (x, y) moving along (dx, dy) and ends at the stop cell,
+            with mirror_type None for the final segment leaving the grid
+        """
+        x, y, dx, dy = entry_state(side, index, self.grid_size)
+        while True:
+            stop_x, stop_y, mtype = self.next_stop(x, y, dx, dy)
+            yield x, y, dx, dy, stop_x, stop_y, mtype
+            if mtype is None:
+                return
+            x, y = stop_x, stop_y
+            dx, dy = MIRROR_RULES[mtype][(dx, dy)]
+
+def simulate_ray(clue_side, clue_index, mirror_config, grid_size=10, mirror_index=None):
     """
     Simulates a ray's trajectory from a given starting position with the specified mirror configuration.
-    
+
     Args:
         clue_side: The starting side ('top', 'right', 'bottom', 'left')
         clue_index: The starting index on the specified side
         mirror_config: The mirror configuration (list of (x, y, type) tuples)
         grid_size: Size of the grid (assuming square grid)
-        
+        mirror_index: Optional prebuilt MirrorIndex for mirror_config
+
     Returns:
         A list of (x, y) cell coordinates representing the ray's path
     """
-    # Determine starting position and direction based on the clue.
-    if clue_side == "top":
-        pos = (clue_index + 0.5, grid_size + 0.5)
-        d = (0, -1)
-    elif clue_side == "bottom":
-        pos = (clue_index + 0.5, -0.5)
-        d = (0, 1)
-    elif clue_side == "left":
-        pos = (-0.5, clue_index + 0.5)
-        d = (1, 0)
-    elif clue_side == "right":
-        pos = (grid_size + 0.5, clue_index + 0.5)
-        d = (-1, 0)
-    else:
+    if clue_side not in ("top", "bottom", "left", "right"):
         return []
-    
+    if mirror_index is None:
+        mirror_index = MirrorIndex.from_config(mirror_config, grid_size)
+
     ray_path = []
-    # Continue simulation until the ray goes off the grid.
-    while True:
-        pos = (pos[0] + d[0], pos[1] + d[1])
-        cell_x = int(pos[0] - 0.5)
-        cell_y = int(pos[1] - 0.5)
-        if not (0 <= cell_x < grid_size and 0 <= cell_y < grid_size):
-            break
-        ray_path.append((cell_x, cell_y))
-        # Check if a mirror is present at this cell
-        hit = None
-        for (mx, my, mtype) in mirror_config:
-            if mx == cell_x and my == cell_y:
-                hit = mtype
-                break
-        if hit is not None:
-            mirror_rules = {
-                'A': {(0, 1): (1, 0), (1, 0): (0, 1), (0, -1): (-1, 0), (-1, 0): (0, -1)},
-                'B': {(0, 1): (-1, 0), (-1, 0): (0, 1), (0, -1): (1, 0), (1, 0): (0, -1)}
-            }
-            d = mirror_rules[hit][d]
+    # Fill in the cells of each segment, up to and including the mirror cell.
+    for x, y, dx, dy, stop_x, stop_y, mtype in mirror_index.segments(clue_side, clue_index):
+        if mtype is None:
+            stop_x, stop_y = stop_x - dx, stop_y - dy
+        steps = abs(stop_x - x) + abs(stop_y - y)
+        ray_path.extend((x + dx * step, y + dy * step) for step in range(1, steps + 1))
     return ray_path
 
-def compute_trajectory_product(mat, side, idx, grid_size):
+def ray_exit(clue_side, clue_index, mirror_config, grid_size=10, mirror_index=None):
+    """
+    Find the border slot through which a ray leaves the grid.
+
+    Args:
+        clue_side: The starting side ('top', 'right', 'bottom', 'left')
+        clue_index: The starting index on the specified side
+        mirror_config: The mirror configuration (list of (x, y, type) tuples)
+        grid_size: Size of the grid (assuming square grid)
+        mirror_index: Optional prebuilt MirrorIndex for mirror_config
+
+    Returns:
+        The (side, index) slot where the ray exits
+    """
+    if mirror_index is None:
+        mirror_index = MirrorIndex.from_config(mirror_config, grid_size)
+    for _, _, _, _, stop_x, stop_y, _ in mirror_index.segments(clue_side, clue_index):
+        pass
+    side_id, index = _exit_slot(stop_x, stop_y, grid_size)
+    return SIDES[side_id], index
+
+def compute_trajectory_product(mat, side, idx, grid_size, mirror_index=None):
     """
     Compute the product of segment lengths for a ray trajectory.
-    
+
     Args:
         mat: The grid matrix with mirrors encoded (-3 for A mirrors, -2 for B mirrors)
         side: The starting side ('top', 'right', 'bottom', 'left')
         idx: The starting index on the specified side
         grid_size: Size of the grid
-        
+        mirror_index: Optional prebuilt MirrorIndex for mat, to share between rays
+
     Returns:
         The product of all segment lengths in the trajectory
     """
-    # Mirror reflection rules
-    mirror_rules_A = {(0, 1):(1, 0), (1, 0):(0, 1), (0, -1):(-1, 0), (-1, 0):(0, -1)}
-    mirror_rules_B = {(0, 1):(-1, 0), (-1, 0):(0, 1), (0, -1):(1, 0), (1, 0):(0, -1)}
-    
-    # Determine starting position and direction
-    if side == "top":
-        pos = (idx + 0.5, grid_size + 0.5)
-        d = (0, -1)
-    elif side == "bottom":
-        pos = (idx + 0.5, -0.5)
-        d = (0, 1)
-    elif side == "left":
-        pos = (-0.5, idx + 0.5)
-        d = (1, 0)
-    elif side == "right":
-        pos = (grid_size + 0.5, idx + 0.5)
-        d = (-1, 0)
-    else:
+    if side not in ("top", "bottom", "left", "right"):
         return 0
+    if mirror_index is None:
+        mirror_index = MirrorIndex.from_matrix(mat)
 
     product = 1
-
-    while True:
-        seg_length = 0
-        # Advance in the current segment
-        while True:
-            # Compute new position
-            new_pos = (pos[0] + d[0], pos[1] + d[1])
-            # Convert new_pos to cell indices
-            cell_x = int(new_pos[0] - 0.5)
-            cell_y = int(new_pos[1] - 0.5)
-            # Check if new_pos is in bounds
-            if not (0 <= cell_x < grid_size and 0 <= cell_y < grid_size):
-                break  # Out-of-bounds: segment ends
-            # Check if the new cell contains a mirror
-            if mat[cell_y, cell_x] in (-2, -3):
-                break  # Hit a mirror: segment ends
-            # Otherwise, accept the step
-            pos = new_pos
-            seg_length += 1
-        # End of segment; multiply product
-        product *= (seg_length + 1)
-        # Now, check why we stopped
-        new_pos = (pos[0] + d[0], pos[1] + d[1])
-        cell_x = int(new_pos[0] - 0.5)
-        cell_y = int(new_pos[1] - 0.5)
-        # If out-of-bounds, we are done
-        if not (0 <= cell_x < grid_size and 0 <= cell_y < grid_size):
-            break
-        # Otherwise, we hit a mirror; determine its type
-        mirror_val = mat[cell_y, cell_x]
-        # Reflect the ray accordingly
-        if mirror_val == -3:  # Mirror type A
-            d = mirror_rules_A[d]
-        elif mirror_val == -2:  # Mirror type B
-            d = mirror_rules_B[d]
-        # Set pos to the mirror cell (starting new segment from there)
-        pos = new_pos
-    
+    for x, y, _, _, stop_x, stop_y, _ in mirror_index.segments(side, idx):
+        # Segment length is the distance to the mirror, or to the point just
+        # outside the grid for the final segment.
+        product *= abs(stop_x - x) + abs(stop_y - y)
     return product
+
+# Border sides in the order used by trace_all_borders arrays.
+SIDES = ("top", "bottom", "left", "right")
+
+def slot_of_position(pos, grid_size):
+    """
+    Convert a cluepos border position into a (side, index) slot.
+
+    Args:
+        pos: Half-integer (x, y) position just outside the grid
+        grid_size: Size of the grid
+
+    Returns:
+        A tuple (side, index)
+    """
+    x, y = pos
+    if y == grid_size + 0.5:
+        return 'top', int(x - 0.5)
+    if y == -0.5:
+        return 'bottom', int(x - 0.5)
+    if x == -0.5:
+        return 'left', int(y - 0.5)
+    if x == grid_size + 0.5:
+        return 'right', int(y - 0.5)
+    raise ValueError(f"Not a border position: {pos!r}")
+
+def position_of_slot(side, index, grid_size):
+    """
+    Inverse of slot_of_position: the cluepos position of a (side, index) slot.
+    """
+    if side == 'top':
+        return (index + 0.5, grid_size + 0.5)
+    if side == 'bottom':
+        return (index + 0.5, -0.5)
+    if side == 'left':
+        return (-0.5, index + 0.5)
+    if side == 'right':
+        return (grid_size + 0.5, index + 0.5)
+    raise ValueError(f"Unknown side: {side!r}")
+
+def _exit_slot(stop_x, stop_y, grid_size):
+    """Border slot (side id, index) of the point just outside the grid where a ray leaves."""
+    if stop_y == grid_size:
+        return SIDES.index("top"), stop_x
+    if stop_y == -1:
+        return SIDES.index("bottom"), stop_x
+    if stop_x == -1:
+        return SIDES.index("left"), stop_y
+    return SIDES.index("right"), stop_y
+
+def trace_all_borders(mat, grid_size=None):
+    """
+    Compute the trajectory product of every border slot, tracing each light path once.
+
+    Paths are reversible: the ray entering at one slot leaves at another with the
+    same product, so both endpoints are filled from a single trace.
+
+    Args:
+        mat: The grid matrix with mirrors encoded (-3 for A mirrors, -2 for B mirrors)
+        grid_size: Size of the grid (defaults to the matrix size)
+
+    Returns:
+        A tuple (products, exits) where:
+        - products is a (4, grid_size) array of trajectory products indexed by
+          (side id, index), with side ids following SIDES
+        - exits is a (4, grid_size, 2) int array holding the (side id, index)
+          slot where the ray entering at each slot leaves the grid
+    """
+    mat = np.asarray(mat)
+    if grid_size is None:
+        grid_size = mat.shape[0]
+    mirror_index = MirrorIndex.from_matrix(mat)
+
+    products = [[0] * grid_size for _ in SIDES]
+    exits = np.full((len(SIDES), grid_size, 2), -1, dtype=int)
+    for side_id, side in enumerate(SIDES):
+        for idx in range(grid_size):
+            if exits[side_id, idx, 0] >= 0:
+                continue  # Already filled as the exit of an earlier trace
+            product = 1
+            for x, y, _, _, stop_x, stop_y, _ in mirror_index.segments(side, idx):
+                product *= abs(stop_x - x) + abs(stop_y - y)
+            exit_side, exit_idx = _exit_slot(stop_x, stop_y, grid_size)
+            products[side_id][idx] = products[exit_side][exit_idx] = product
+            exits[side_id, idx] = (exit_side, exit_idx)
+            exits[exit_side, exit_idx] = (side_id, idx)
+
+    # Products of long paths on large grids can outgrow int64.
+    largest = max((max(row) for row in products), default=0)
+    dtype = np.int64 if largest < 2**63 else object
+    return np.array(products, dtype=dtype), exits
+
+def border_products_dict(products):
+    """
+    Convert a trace_all_borders products array into a {(side, index): product} dictionary.
+    """
+    return {(side, idx): int(products[side_id][idx])
+            for side_id, side in enumerate(SIDES)
+            for idx in range(len(products[side_id]))}
@@ -1,9 +1,35 @@
+import os
+import time
 import numpy as np
-from .factorization import ultra_factorizations
-from .path_validation import is_valid_path
-from .simulation import simulate_ray, compute_trajectory_product
+from collections import namedtuple
+from contextlib import nullcontext
+from functools import reduce
+from itertools import islice
+from operator import and_
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_EXCEPTION
+from .factorization import iter_ultra_factorizations, count_ultra_factorizations
+from .path_validation import (is_valid_path, iter_valid_paths, build_factor_trie,
+                              walk_factor_trie)
+from .simulation import (MirrorIndex, simulate_ray, trace_all_borders, border_products_dict,
+                         slot_of_position, position_of_slot)
+from .bitboard import (Bitboard, EMPTY_BITBOARD, build_bitboard, bitboard_to_matrix,
+                       is_compatible_bitboard, merge_bitboards)
+from .batch import LAYER_DTYPE, stack_layer, is_compatible_batch, merge_layers_batch
+from .parallel import parallel_search
+from .search import (iter_static_search, iter_mrv_search, pairwise_compatibility,
+                     iter_bitset_search)
+from .propagation import propagate
+from .sat import iter_sat_search
+from .cells import CellSearch, cell_search
+from .candidate import Candidate
+from .layer_cache import LayerCache, cached_clue_layers
+from .budget import (CancelToken, SearchInterrupted, Incomplete, PeriodicCheckpoint,
+                     make_checkpoint, load_checkpoint, resume_frontier)
+from .symmetry import (canonicalize, canonical_layer_key, compose_symmetries, inverse_symmetry,
+                       transform_layer, transform_slot, transform_solution)
 
-def produce_matrix(config, clue_num, clue_info, grid_size=10):
+def produce_matrix(config, clue_num, clue_info, grid_size=10, as_bitboard=False):
     """
     Given a mirror configuration and a clue, produce a candidate matrix.
     
@@ -12,10 +38,15 @@ def produce_matrix(config, clue_num, clue_info, grid_size=10):
         clue_num: Clue number
         clue_info: Information about the clue (side, index)
         grid_size: Size of the grid
+        as_bitboard: If True, return the candidate as a Bitboard instead
         
     Returns:
-        A numpy matrix with the mirror configuration and ray path
+        A numpy matrix (or Bitboard) with the mirror configuration and ray path
     """
+    if as_bitboard:
+        ray_path = simulate_ray(clue_info[0], clue_info[1], config, grid_size)
+        return build_bitboard(config, ray_path, grid_size)
+
     mat = np.zeros((grid_size, grid_size), dtype=int)
     # Place mirrors and adjacent -4's
     for (mx, my, mtype) in config:
@@ -85,7 +116,633 @@ def merge_layers(base, cand):
                 new[i, j] = -4
     return new
 
-def solve_puzzle(numbers, cluepos, dic, max_tuple_length, max_factor, grid_size=10):
+_Backend = namedtuple('_Backend', ['empty', 'from_bitboards', 'make_layer',
+                                   'compatible_indices', 'filter_indices', 'merge',
+                                   'consensus', 'to_matrix'])
+
+def _backend_ops(backend, grid_size, stats=None):
+    """
+    Return the operations used to build, filter and merge candidate layers
+    for a solver state backend. With a stats.SolveStats, compatibility checks
+    are counted.
+    """
+    compatible_bitboard, compatible_matrix, compatible_batch = (
+        is_compatible_bitboard, is_compatible, is_compatible_batch)
+    if stats is not None:
+        compatible_bitboard = stats.count_checks(compatible_bitboard)
+        compatible_matrix = stats.count_checks(compatible_matrix)
+        compatible_batch = stats.count_batch_checks(compatible_batch)
+
+    def lazy_indices(compatible):
+        # Scalar backends check candidates one at a time, so the search can
+        # stop checking as soon as a branch succeeds.
+        return lambda base, states: (k for k, state in enumerate(states)
+                                     if compatible(base, state))
+
+    def subset_indices(compatible):
+        return lambda base, states, indices: [k for k in indices
+                                              if compatible(base, states[k])]
+
+    def to_matrices(bitboards):
+        return [bitboard_to_matrix(bb, grid_size) for bb in bitboards]
+
+    def matrix_consensus(stack):
+        # Keep the cells on which every candidate of the stack agrees.
+        return np.where((stack == stack[0]).all(axis=0), stack[0], 0)
+
+    def bitboard_consensus(states, indices):
+        fields = zip(*(states[k] for k in indices))
+        return Bitboard(*(reduce(and_, masks) for masks in fields))
+
+    if backend == 'bitboard':
+        return _Backend(EMPTY_BITBOARD, list, list,
+                        lazy_indices(compatible_bitboard),
+                        subset_indices(compatible_bitboard), merge_bitboards,
+                        bitboard_consensus, lambda bb: bitboard_to_matrix(bb, grid_size))
+    if backend == 'matrix':
+        return _Backend(np.zeros((grid_size, grid_size), dtype=int), to_matrices, list,
+                        lazy_indices(compatible_matrix), subset_indices(compatible_matrix),
+                        merge_layers,
+                        lambda mats, indices: matrix_consensus(np.stack([mats[k] for k in indices])),
+                        lambda mat: mat)
+    if backend == 'numpy':
+        make_layer = lambda mats: stack_layer(mats, grid_size)
+
+        def filter_indices(base, stack, indices):
+            indices = np.asarray(indices, dtype=int)
+            return indices[compatible_batch(base, stack[indices])]
+
+        return _Backend(np.zeros((grid_size, grid_size), dtype=LAYER_DTYPE),
+                        lambda bitboards: make_layer(to_matrices(bitboards)), make_layer,
+                        lambda base, stack: np.flatnonzero(compatible_batch(base, stack)),
+                        filter_indices,
+                        lambda base, cand: merge_layers_batch(base, cand[None])[0],
+                        lambda stack, indices: matrix_consensus(stack[np.asarray(indices, dtype=int)]),
+                        lambda mat: mat.astype(int))
+    raise ValueError(f"Unknown backend: {backend!r}")
+
+def _is_traced_path(config, side, index, grid_size):
+    """
+    Whether a ray entering at (side, index) really meets exactly the mirrors
+    of config, in order. is_valid_path only checks mirror adjacency, so a
+    configuration may route its path through one of its own mirrors; such a
+    ray would reflect there, and its merged matrix would duplicate another
+    candidate's.
+    """
+    mirror_index = MirrorIndex.from_config(config, grid_size)
+    met = [(x, y, mtype) for _, _, _, _, x, y, mtype in mirror_index.segments(side, index)
+           if mtype is not None]
+    return met == list(config)
+
+def _polled(items, token):
+    """Yield from items, checking the cancel token (if any) before each one."""
+    for item in items:
+        if token is not None:
+            token.check()
+        yield item
+
+def clue_configs(clue_num, side, index, grid_size, cluepos, max_tuple_length, max_factor,
+                 enumeration='fused', token=None):
+    """
+    List every valid mirror configuration for a single clue.
+    
+    Args:
+        clue_num: Clue number
+        side: Starting side of the clue
+        index: Starting index of the clue on its side
+        grid_size: Size of the grid
+        cluepos: Dictionary mapping positions to clue numbers
+        max_tuple_length: Maximum factorization tuple length
+        max_factor: Maximum allowed factor
+        enumeration: 'fused' to enumerate factors and geometry together with
+            iter_valid_paths, 'trie' to walk a prefix trie of the
+            ultra_factorizations tuples, or 'factorize' to check every tuple
+            with is_valid_path
+        token: Optional budget.CancelToken polled during the enumeration
+        
+    Returns:
+        A list of mirror configurations whose ray meets exactly their mirrors
+
+    Raises:
+        budget.SearchInterrupted: When the token expires
+    """
+    if enumeration == 'fused':
+        # The fused DFS already rejects paths through their own mirrors
+        return list(iter_valid_paths(clue_num, side, index, grid_size, cluepos,
+                                     max_tuple_length, max_factor, token=token))
+    if enumeration == 'factorize':
+        configs = []
+        # Factorizations are streamed one tuple at a time
+        for factors in _polled(iter_ultra_factorizations(clue_num, max_tuple_length, max_factor),
+                               token):
+            paths = is_valid_path(factors, side, index, grid_size, clue_num, cluepos)
+            if paths:
+                configs.extend(paths[0])
+    elif enumeration == 'trie':
+        trie = build_factor_trie(_polled(iter_ultra_factorizations(clue_num, max_tuple_length,
+                                                                   max_factor), token))
+        configs = walk_factor_trie(trie, side, index, grid_size, clue_num, cluepos, token)
+    else:
+        raise ValueError(f"Unknown enumeration: {enumeration!r}")
+    return [config for config in configs if _is_traced_path(config, side, index, grid_size)]
+
+def iter_clue_candidates(clue_num, side, index, grid_size, cluepos, max_tuple_length,
+                         max_factor, enumeration='fused', token=None):
+    """
+    Lazily enumerate the candidates of a single clue.
+    
+    With the 'fused' and 'factorize' enumerations, candidates are produced as
+    the search finds them, so a consumer that drops some never holds them all.
+    
+    Args:
+        Same as clue_configs
+        
+    Yields:
+        Candidate objects, in the order of clue_configs
+
+    Raises:
+        budget.SearchInterrupted: When the token expires
+    """
+    if enumeration == 'fused':
+        # The DFS hands over the path it walked, so no ray is traced again
+        for config, path in iter_valid_paths(clue_num, side, index, grid_size, cluepos,
+                                             max_tuple_length, max_factor, with_path=True,
+                                             token=token):
+            yield Candidate(config, path)
+        return
+    if enumeration == 'factorize':
+        factor_tuples = _polled(iter_ultra_factorizations(clue_num, max_tuple_length,
+                                                          max_factor), token)
+        configs = (config
+                   for factors in factor_tuples
+                   for paths in [is_valid_path(factors, side, index, grid_size, clue_num, cluepos)]
+                   if paths
+                   for config in paths[0])
+    else:
+        configs = clue_configs(clue_num, side, index, grid_size, cluepos,
+                               max_tuple_length, max_factor, enumeration, token)
+    for config in configs:
+        if enumeration != 'factorize' or _is_traced_path(config, side, index, grid_size):
+            yield Candidate.from_config(config, side, index, grid_size)
+
+def clue_layer(clue_num, side, index, grid_size, cluepos, max_tuple_length, max_factor,
+               enumeration='fused', token=None):
+    """
+    Build the compact candidate layer of a single clue.
+    
+    Args:
+        Same as clue_configs
+        
+    Returns:
+        A list of Candidate objects, one per mirror configuration; their
+        Bitboards or matrices are built on demand
+    """
+    return list(iter_clue_candidates(clue_num, side, index, grid_size, cluepos,
+                                     max_tuple_length, max_factor, enumeration, token))
+
+# How often the process pool is checked for an expired token, in seconds.
+POOL_POLL_INTERVAL = 0.05
+
+# Set in pool workers of a solve with a token: stops them all once set.
+_pool_stop = None
+
+def _init_pool_worker(stop):
+    """Process pool initializer: keep the shared stop event of the solve."""
+    global _pool_stop
+    _pool_stop = stop
+
+def _clue_layer_task(task):
+    """Process pool entry point for clue_layer."""
+    key, args, timeout = task
+    token = None
+    if _pool_stop is not None:
+        token = CancelToken(timeout, event=_pool_stop)
+    return key, clue_layer(*key, *args, token=token)
+
+def _clue_layers_parallel(tasks, workers, token=None):
+    """
+    Build the candidate layers of several clues in a process pool.
+    
+    Args:
+        tasks: Dictionary mapping (clue_num, side, index) to the remaining
+            clue_layer arguments
+        workers: Number of worker processes
+        token: Optional budget.CancelToken; the workers get tokens with the
+            same deadline and all stop as soon as it expires
+        
+    Returns:
+        A dictionary mapping each task key to its list of Candidates
+
+    Raises:
+        budget.SearchInterrupted: When the token expires
+    """
+    # Start the clues with the most factorizations first so that the largest
+    # layers do not end up queued behind small ones.
+    def expected_size(item):
+        (clue_num, _, _), (_, _, max_tuple_length, max_factor, _) = item
+        return count_ultra_factorizations(clue_num, max_tuple_length, max_factor)
+    ordered = sorted(tasks.items(), key=expected_size, reverse=True)
+    
+    if token is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return dict(pool.map(_clue_layer_task,
+                                 [(key, args, None) for key, args in ordered]))
+
+    stop = mp.get_context().Event()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker,
+                             initargs=(stop,)) as pool:
+        futures = [pool.submit(_clue_layer_task, (key, args, token.remaining()))
+                   for key, args in ordered]
+        try:
+            pending = futures
+            while pending:
+                token.check()
+                done, pending = wait(pending, timeout=POOL_POLL_INTERVAL,
+                                     return_when=FIRST_EXCEPTION)
+                for future in done:
+                    # Raises a worker's SearchInterrupted or error here
+                    future.result()
+        except BaseException:
+            # Queued tasks are dropped and running ones stop at their next poll
+            stop.set()
+            for future in futures:
+                future.cancel()
+            raise
+    return dict(future.result() for future in futures)
+
+def _merge_chosen(layer_states, chosen, baseline, ops):
+    """Merge the chosen candidate of every layer onto the baseline."""
+    state = baseline
+    for states, k in zip(layer_states, chosen):
+        state = ops.merge(state, states[k])
+    return state
+
+def _cell_clues(clues, cluepos, grid_size):
+    """Every clue of the puzzle as a (side, index, value) triple."""
+    by_slot = {slot_of_position(pos, grid_size): value for pos, value in cluepos.items()}
+    for clue_num, clue_side, clue_idx in clues:
+        by_slot[(clue_side, clue_idx)] = clue_num
+    return [(side, index, value) for (side, index), value in by_slot.items()]
+
+def _report_layout(mirrors, clues, grid_size, ops):
+    """
+    Report a cell engine layout like the candidate pipeline: one configuration
+    per clue, the merged matrix of their paths and the products.
+    """
+    layout = [(x, y, mtype) for (x, y), mtype in mirrors.items()]
+    chosen_configs, bitboards = [], []
+    for _, clue_side, clue_idx in clues:
+        path = simulate_ray(clue_side, clue_idx, layout, grid_size)
+        config = [(x, y, mirrors[(x, y)]) for (x, y) in path if (x, y) in mirrors]
+        chosen_configs.append(config)
+        bitboards.append(build_bitboard(config, path, grid_size))
+    final_matrix = ops.to_matrix(reduce(ops.merge, ops.from_bitboards(bitboards), ops.empty))
+
+    products, _ = trace_all_borders(final_matrix, grid_size)
+    return chosen_configs, final_matrix, border_products_dict(products)
+
+def _stage(stats, name):
+    """Context manager timing a stage into stats, doing nothing without them."""
+    return nullcontext() if stats is None else stats.stage(name)
+
+def _baseline_filter(layers, baseline, ops):
+    """
+    Filter (candidates, states) layers against the baseline once, without
+    propagation.
+
+    Returns:
+        A tuple (layers, baseline) with the filtered layers and the baseline
+        completed with the unique candidates of the layers
+    """
+    # Add the unique candidates of layers streamed before their baseline
+    # was complete
+    for candidates, states in layers:
+        if len(candidates) == 1:
+            baseline = ops.merge(baseline, states[0])
+
+    # Filter candidate layers using baseline compatibility
+    filtered = []
+    for candidates, states in layers:
+        keep = list(ops.compatible_indices(baseline, states))
+        filtered.append(([candidates[k] for k in keep], ops.make_layer([states[k] for k in keep])))
+    return filtered, baseline
+
+def _prepare_layers(clues, cluepos, max_tuple_length, max_factor, grid_size, ops,
+                    enumeration, workers, propagation, cache=None, stats=None, token=None):
+    """
+    Build and prune the candidate layers of every (clue_num, side, index) clue.
+
+    Candidates are streamed from their enumeration through a compatibility
+    filter, so peak memory follows the surviving candidates rather than the
+    raw enumeration (except for layers built whole by the worker pool, the
+    cache or symmetry sharing, which are filtered right after).
+
+    With a stats.SolveStats, the 'candidates', 'states' and 'filter' stages
+    are timed and the candidates of every clue are counted. With a
+    budget.CancelToken, the enumeration (streamed, whole or in the worker
+    pool) and the propagation stop with SearchInterrupted once it expires.
+
+    Returns:
+        A tuple (layers, baseline) with the filtered (candidates, states)
+        layers and the baseline state, or None if some clue is left without
+        candidates
+    """
+    # Clues sharing a border slot and value are generated once, and so are
+    # clues whose layers are rotations or reflections of each other: only the
+    # first of each symmetry class is built, the others are mapped from it.
+    tasks, shared, classes = {}, {}, {}
+    for clue in clues:
+        task = tuple(clue)
+        if task in tasks or task in shared:
+            continue
+        name, key = canonical_layer_key(*task, grid_size, cluepos)
+        if key in classes:
+            first, first_name = classes[key]
+            shared[task] = first, compose_symmetries(first_name, inverse_symmetry(name))
+        else:
+            classes[key] = task, name
+            tasks[task] = (grid_size, cluepos, max_tuple_length, max_factor, enumeration)
+
+    # Whole layers are only built where they are needed as such: by the worker
+    # pool, for the cache, and for clues whose layer is mapped to others.
+    def build(tasks):
+        if workers is not None and workers > 1:
+            return _clue_layers_parallel(tasks, workers, token)
+        return {key: clue_layer(*key, *args, token=token) for key, args in tasks.items()}
+    with _stage(stats, 'candidates'):
+        if cache is not None:
+            if not isinstance(cache, LayerCache):
+                cache = LayerCache(cache)
+            layers = cached_clue_layers(cache, tasks, build)
+        elif workers is not None and workers > 1:
+            layers = build(tasks)
+        else:
+            layers = build({first: tasks[first] for first, _ in shared.values()})
+        for task, (first, name) in shared.items():
+            layers[task] = transform_layer(layers[first], name, grid_size)
+
+    # Stream every clue's candidates through a filter against the baseline
+    # known so far, smallest expected layers first, so that single-candidate
+    # clues tighten the baseline early. Rejected candidates are never stored.
+    # Each finished layer merges the cells all its survivors agree on.
+    def expected_size(task):
+        return count_ultra_factorizations(task[0], max_tuple_length, max_factor)
+    baseline = EMPTY_BITBOARD
+    kept, counts = {}, {}
+    with _stage(stats, 'candidates'):
+        for task in sorted(layers.keys() | tasks.keys(), key=expected_size):
+            start = time.perf_counter()
+            source = layers.pop(task, None)
+            if source is None:
+                source = iter_clue_candidates(*task, *tasks[task], token)
+            candidates, bitboards = [], []
+            examined = 0
+            for candidate in source:
+                examined += 1
+                if token is not None:
+                    token.check()
+                bb = candidate.bitboard(grid_size)
+                if is_compatible_bitboard(baseline, bb):
+                    candidates.append(candidate)
+                    bitboards.append(bb)
+            counts[task] = examined, len(candidates), time.perf_counter() - start
+            if not candidates:
+                break
+            baseline = merge_bitboards(baseline, Bitboard(*(reduce(and_, masks)
+                                                            for masks in zip(*bitboards))))
+            # Built, cached and mapped layers list their candidates in
+            # different orders; the search (and any checkpoint of it) sees
+            # them in canonical order.
+            order = sorted(range(len(candidates)), key=lambda k: candidates[k].sort_key())
+            kept[task] = [candidates[k] for k in order], [bitboards[k] for k in order]
+    if stats is not None:
+        for clue in clues:
+            if tuple(clue) in counts:
+                stats.add_clue(*clue, *counts[tuple(clue)])
+        stats.compat_checks += sum(examined for examined, _, _ in counts.values())
+    if len(kept) < len(counts):
+        # Some clue was left without candidates
+        return None
+
+    # Create candidate layers as (candidates, states) pairs, building the
+    # dense states only now, in the form the backend searches
+    with _stage(stats, 'states'):
+        candidate_layers = []
+        for clue in clues:
+            candidates, bitboards = kept[tuple(clue)]
+            candidate_layers.append((candidates, ops.from_bitboards(bitboards)))
+        baseline_matrix = ops.from_bitboards([baseline])[0]
+
+    with _stage(stats, 'filter'):
+        if propagation:
+            # Prune the layers to a fixpoint, strengthening the baseline as we go
+            filtered_candidate_layers, baseline_matrix, report = propagate(
+                candidate_layers, baseline_matrix, ops, token=token)
+            if stats is not None:
+                stats.propagation = report
+        else:
+            filtered_candidate_layers, baseline_matrix = _baseline_filter(
+                candidate_layers, baseline_matrix, ops)
+    if stats is not None:
+        stats.set_filtered([len(candidates) for candidates, _ in filtered_candidate_layers])
+    if any(not candidates for candidates, _ in filtered_candidate_layers):
+        return None
+    return filtered_candidate_layers, baseline_matrix
+
+def _iter_layer_solutions(layer_states, baseline, ops, grid_size, strategy, engine,
+                          stats=None, token=None, resume=None, checkpoint=None):
+    """
+    Yield (chosen, final_state) for every solution with a serial engine. The
+    token, resume and checkpoint arguments of the backtracking strategies
+    (see search.iter_mrv_search) are not supported by the SAT engine.
+    """
+    if engine != 'backtrack' and (token is not None or resume or checkpoint is not None):
+        raise ValueError(f"time budgets and checkpoints need the backtrack engine, not {engine!r}")
+    if engine == 'sat':
+        for chosen, final_state in iter_sat_search(layer_states, baseline, ops, grid_size):
+            if stats is not None:
+                stats.solution_found(chosen)
+            yield chosen, final_state
+    elif engine != 'backtrack':
+        raise ValueError(f"Unknown engine: {engine!r}")
+    elif strategy == 'mrv':
+        yield from iter_mrv_search(layer_states, baseline, ops, stats, token, resume,
+                                   checkpoint)
+    elif strategy == 'static':
+        yield from iter_static_search(layer_states, baseline, ops, stats, token, resume,
+                                      checkpoint)
+    elif strategy == 'bitset':
+        compat = pairwise_compatibility(layer_states, ops, token)
+        for chosen in iter_bitset_search(compat, [len(states) for states in layer_states],
+                                         stats, token, resume, checkpoint):
+            yield chosen, _merge_chosen(layer_states, chosen, baseline, ops)
+    else:
+        raise ValueError(f"Unknown strategy: {strategy!r}")
+
+def _report(layers, chosen, final_state, ops, grid_size):
+    """Turn a candidate selection into the (configs, matrix, products) result."""
+    chosen_configs = [list(candidates[k]) for (candidates, _), k in zip(layers, chosen)]
+    final_matrix = ops.to_matrix(final_state)
+    
+    # Calculate all trajectory products, tracing each light path once
+    products, _ = trace_all_borders(final_matrix, grid_size)
+    trajectory_products = border_products_dict(products)
+    
+    return chosen_configs, final_matrix, trajectory_products
+
+def _checkpoint_fingerprint(clues, grid_size, max_tuple_length, max_factor, enumeration,
+                           strategy, propagation):
+    """
+    What a search frontier depends on: the layers, in order, and the search strategy.
+
+    Layers are searched in canonical candidate order and every backend
+    explores them alike, so the backend, the cache and the layer workers are
+    left out: a checkpoint resumes under any of them.
+    """
+    return {'grid_size': grid_size, 'clues': [list(clue) for clue in clues],
+            'max_tuple_length': max_tuple_length, 'max_factor': max_factor,
+            'enumeration': enumeration, 'strategy': strategy, 'propagation': propagation}
+
+def _solve(clues, cluepos, max_tuple_length, max_factor, grid_size, backend='bitboard',
+           enumeration='fused', workers=None, search_workers=None, strategy='mrv',
+           propagation=False, engine='backtrack', cache=None, stats=None, token=None,
+           checkpoint=None, checkpoint_interval=60.0):
+    """solve_puzzle over a list of (clue_num, side, index) clues."""
+    if token is not None or checkpoint is not None:
+        if engine != 'backtrack' or (search_workers is not None and search_workers > 1):
+            raise ValueError("time budgets and checkpoints need the serial backtrack engine")
+        return _solve_resumable(clues, cluepos, max_tuple_length, max_factor, grid_size,
+                                backend, enumeration, workers, strategy, propagation, cache,
+                                stats, token, checkpoint, checkpoint_interval)
+
+    ops = _backend_ops(backend, grid_size, stats)
+    if engine == 'cells':
+        with _stage(stats, 'search'):
+            mirrors = cell_search(_cell_clues(clues, cluepos, grid_size), grid_size)
+        if mirrors is None:
+            return None
+        if stats is not None:
+            stats.solution_found(None)
+        with _stage(stats, 'borders'):
+            return _report_layout(mirrors, clues, grid_size, ops)
+
+    prepared = _prepare_layers(clues, cluepos, max_tuple_length, max_factor, grid_size,
+                               ops, enumeration, workers, propagation, cache, stats)
+    if prepared is None:
+        return None
+    filtered_candidate_layers, baseline_matrix = prepared
+    
+    # Backtracking search using filtered candidates
+    layer_states = [states for _, states in filtered_candidate_layers]
+    with _stage(stats, 'search'):
+        if engine == 'backtrack' and search_workers is not None and search_workers > 1:
+            chosen = parallel_search(layer_states, baseline_matrix, backend, grid_size,
+                                     search_workers, strategy)
+            solution = None
+            if chosen is not None:
+                if stats is not None:
+                    stats.solution_found(chosen)
+                solution = chosen, _merge_chosen(layer_states, chosen, baseline_matrix, ops)
+        else:
+            solution = next(_iter_layer_solutions(layer_states, baseline_matrix, ops, grid_size,
+                                                  strategy, engine, stats), None)
+    
+    if solution is None:
+        return None
+    with _stage(stats, 'borders'):
+        return _report(filtered_candidate_layers, *solution, ops, grid_size)
+
+def _solve_resumable(clues, cluepos, max_tuple_length, max_factor, grid_size, backend,
+                     enumeration, workers, strategy, propagation, cache, stats, token,
+                     checkpoint, checkpoint_interval):
+    """
+    _solve with a cancel token and/or a checkpoint to resume from and save to.
+
+    Returns:
+        As _solve, or a budget.Incomplete once the token expires
+    """
+    fingerprint = _checkpoint_fingerprint(clues, grid_size, max_tuple_length, max_factor,
+                                          enumeration, strategy, propagation)
+    path = None
+    if isinstance(checkpoint, dict):
+        saved = checkpoint
+    elif checkpoint is not None:
+        path = checkpoint
+        saved = load_checkpoint(path)
+    else:
+        saved = None
+    resume = resume_frontier(saved, fingerprint)
+    periodic = None
+    if path is not None and checkpoint_interval is not None:
+        periodic = PeriodicCheckpoint(path, fingerprint, checkpoint_interval)
+
+    ops = _backend_ops(backend, grid_size, stats)
+    try:
+        prepared = _prepare_layers(clues, cluepos, max_tuple_length, max_factor, grid_size,
+                                   ops, enumeration, workers, propagation, cache, stats, token)
+        solution = None
+        if prepared is not None:
+            layers, baseline = prepared
+            layer_states = [states for _, states in layers]
+            with _stage(stats, 'search'):
+                solution = next(_iter_layer_solutions(layer_states, baseline, ops, grid_size,
+                                                      strategy, 'backtrack', stats, token,
+                                                      resume, periodic), None)
+    except SearchInterrupted as interrupted:
+        # Stopped before searching: keep the frontier we were resuming from
+        frontier = interrupted.frontier if interrupted.frontier is not None else resume
+        incomplete = Incomplete(interrupted.reason, make_checkpoint(fingerprint, frontier))
+        if path is not None:
+            incomplete.save(path)
+        return incomplete
+
+    if path is not None and os.path.exists(path):
+        # The search is over, its checkpoint would only resume past the answer
+        os.remove(path)
+    if solution is None:
+        return None
+    with _stage(stats, 'borders'):
+        return _report(layers, *solution, ops, grid_size)
+
+def _iter_solutions(clues, cluepos, max_tuple_length, max_factor, grid_size, backend='bitboard',
+                    enumeration='fused', workers=None, strategy='mrv', propagation=False,
+                    engine='backtrack', cache=None, stats=None, token=None):
+    """iter_solutions over a list of (clue_num, side, index) clues."""
+    if token is not None and engine != 'backtrack':
+        raise ValueError("time budgets need the backtrack engine")
+    ops = _backend_ops(backend, grid_size, stats)
+    if engine == 'cells':
+        solutions = CellSearch(_cell_clues(clues, cluepos, grid_size), grid_size).solutions()
+        if stats is not None:
+            solutions = stats.timed(solutions, 'search')
+        for mirrors in solutions:
+            if stats is not None:
+                stats.solution_found(None)
+            with _stage(stats, 'borders'):
+                solution = _report_layout(mirrors, clues, grid_size, ops)
+            yield solution
+        return
+
+    prepared = _prepare_layers(clues, cluepos, max_tuple_length, max_factor, grid_size,
+                               ops, enumeration, workers, propagation, cache, stats, token)
+    if prepared is None:
+        return
+    layers, baseline = prepared
+    layer_states = [states for _, states in layers]
+    solutions = _iter_layer_solutions(layer_states, baseline, ops, grid_size, strategy, engine,
+                                      stats, token)
+    if stats is not None:
+        # Only the time spent searching counts, not the caller's between solutions
+        solutions = stats.timed(solutions, 'search')
+    for chosen, final_state in solutions:
+        with _stage(stats, 'borders'):
+            solution = _report(layers, chosen, final_state, ops, grid_size)
+        yield solution
+
+def solve_puzzle(numbers, cluepos, dic, max_tuple_length, max_factor, grid_size=10,
+                 backend='bitboard', enumeration='fused', workers=None, search_workers=None,
+                 strategy='mrv', propagation=False, engine='backtrack', cache=None, stats=None,
+                 token=None, checkpoint=None, checkpoint_interval=60.0):
     """
     Solve the Hall of Mirrors puzzle.
     
@@ -96,78 +753,207 @@ def solve_puzzle(numbers, cluepos, dic, max_tuple_length, max_factor, grid_size=
         max_tuple_length: Maximum factorization tuple length
         max_factor: Maximum allowed factor
         grid_size: Size of the grid
+        backend: State representation used while filtering and searching,
+            'bitboard' (cells as bitmasks), 'numpy' (each layer stacked into
+            one array and filtered in a single pass) or 'matrix' (one numpy
+            matrix per candidate)
+        enumeration: How candidate paths are enumerated, 'fused' (a single
+            DFS over segment lengths that fit the grid), 'trie' (factorizations
+            first, validated once per shared prefix) or 'factorize' (all
+            factorizations first, then path validation per tuple)
+        workers: If greater than 1, generate the clues' candidate layers in a
+            pool of this many processes; results are identical to the serial run
+        search_workers: If greater than 1, run the backtracking search of
+            strategy in this many processes (see parallel.parallel_search); if
+            the puzzle has several solutions, the one returned may differ from
+            the serial search
+        strategy: Search strategy, 'mrv' (most constrained clue first,
+            forward checking, least-constraining candidates first), 'bitset'
+            (MRV over precomputed pairwise compatibility bitsets, without
+            touching matrices) or 'static' (clues in the order of numbers)
+        propagation: If True, prune the layers to a fixpoint with
+            propagation.propagate before searching; otherwise (the default,
+            cheaper unless the search itself dominates) only merge
+            single-candidate clues into the baseline and filter once
+        engine: 'backtrack' (the search selected by strategy/search_workers),
+            'sat' (CNF encoding solved by the built-in CDCL solver, see
+            sat.sat_search) or 'cells' (search directly over cell values with
+            cells.cell_search, without enumerating factorizations; every clue
+            in cluepos is enforced, and max_tuple_length, max_factor,
+            enumeration, workers and the search options are ignored)
+        cache: Optional layer_cache.LayerCache, or a directory for one, from
+            which candidate layers are reused across runs; new layers are
+            stored in it
+        stats: Optional stats.SolveStats recording candidate counts,
+            compatibility checks, stage times and search nodes, and calling
+            its node and solution callbacks (nodes are only recorded by the
+            serial backtracking strategies; solutions of the cells engine are
+            reported with chosen=None)
+        token: Optional budget.CancelToken; once its deadline passes or it is
+            cancelled, the solve stops and returns a budget.Incomplete
+        checkpoint: Optional checkpoint file: the search resumes from it if it
+            exists, saves its frontier there every checkpoint_interval seconds
+            and when stopped by the token, and removes it once finished. A
+            checkpoint dictionary (budget.Incomplete.checkpoint) can be given
+            instead, to resume without a file
+        checkpoint_interval: Seconds between two periodic saves of the checkpoint
+            file (None saves only when stopped by the token)
         
+    token and checkpoint need the serial backtrack engine. A checkpoint only
+    resumes the search: candidate layers are built again (use cache to make
+    that cheap).
+
     Returns:
         A tuple containing:
         - The list of mirror configurations
         - The final merged matrix
         - A dictionary of trajectory products
+        None if there is no solution, or a budget.Incomplete if the token
+        expired first
     """
-    # Generate factorizations for all numbers
-    result = ultra_factorizations(numbers, max_tuple_length, max_factor)
-    
-    # Find valid paths for each factorization
-    valid_configs = [[] for _ in range(len(numbers))]
-    for i in range(len(result)):
-        for factors in result[i]:
-            clue_num = numbers[i]
-            clue_side, clue_idx = dic[clue_num]
-            paths = is_valid_path(factors, clue_side, clue_idx, grid_size, 
-                                 clue_num, cluepos)
-            if paths:
-                valid_configs[i].extend(paths[0])
-    
-    # Create candidate layers
-    candidate_layers = []
-    for i in range(len(numbers)):
-        clue_num = numbers[i]
-        candidates = []
-        for config in valid_configs[i]:
-            mat = produce_matrix(config, clue_num, dic[clue_num], grid_size)
-            candidates.append((config, mat))
-        candidate_layers.append(candidates)
-    
-    # Build baseline matrix from unique candidates
-    baseline_matrix = np.zeros((grid_size, grid_size), dtype=int)
-    for i in range(len(numbers)):
-        if len(valid_configs[i]) == 1:
-            _, mat = candidate_layers[i][0]
-            baseline_matrix = merge_layers(baseline_matrix, mat)
+    clues = [(clue_num, *dic[clue_num]) for clue_num in numbers]
+    return _solve(clues, cluepos, max_tuple_length, max_factor, grid_size, backend,
+                  enumeration, workers, search_workers, strategy, propagation, engine, cache,
+                  stats, token, checkpoint, checkpoint_interval)
+
+def iter_solutions(numbers, cluepos, dic, max_tuple_length, max_factor, grid_size=10,
+                   backend='bitboard', enumeration='fused', workers=None,
+                   strategy='mrv', propagation=False, engine='backtrack', cache=None,
+                   stats=None, token=None):
+    """
+    Lazily enumerate every solution of the Hall of Mirrors puzzle.
     
-    # Filter candidate layers using baseline compatibility
-    filtered_candidate_layers = []
-    for i in range(len(candidate_layers)):
-        filtered = []
-        for (config, mat) in candidate_layers[i]:
-            if is_compatible(baseline_matrix, mat):
-                filtered.append((config, mat))
-        filtered_candidate_layers.append(filtered)
+    The candidate layers are built and propagated once, and a single search
+    is resumed after each solution, so the pruning done along a branch is
+    shared by all solutions below it.
     
-    # Backtracking search using filtered candidates
-    def search(i, current_matrix, chosen_configs):
-        if i == len(numbers):
-            return chosen_configs, current_matrix
-        for (config, mat) in filtered_candidate_layers[i]:
-            if is_compatible(current_matrix, mat):
-                new_matrix = merge_layers(current_matrix, mat)
-                result = search(i+1, new_matrix, chosen_configs + [config])
-                if result is not None:
-                    return result
-        return None
+    Args:
+        Same as solve_puzzle, except that the search always runs serially and
+        there are no checkpoints
+        
+    Yields:
+        (configs, matrix, products) tuples as returned by solve_puzzle, one per
+        distinct mirror layout
+
+    Raises:
+        budget.SearchInterrupted: When the token expires
+    """
+    clues = [(clue_num, *dic[clue_num]) for clue_num in numbers]
+    yield from _iter_solutions(clues, cluepos, max_tuple_length, max_factor, grid_size, backend,
+                               enumeration, workers, strategy, propagation, engine, cache,
+                               stats, token)
+
+def count_solutions(numbers, cluepos, dic, max_tuple_length, max_factor, grid_size=10,
+                    limit=2, **options):
+    """
+    Count the solutions of the puzzle, stopping early once 'limit' are found.
     
-    # Execute search
-    solution = search(0, baseline_matrix, [])
+    With the default limit of 2 this is a uniqueness check: the result is 0
+    (no solution), 1 (unique) or 2 (several).
     
-    if solution is None:
-        return None
+    Args:
+        numbers, cluepos, dic, max_tuple_length, max_factor, grid_size: As in
+            solve_puzzle
+        limit: Stop after this many solutions (None counts all of them)
+        **options: Further iter_solutions keyword arguments (backend, engine, ...)
+        
+    Returns:
+        The number of solutions found, at most limit
+    """
+    solutions = iter_solutions(numbers, cluepos, dic, max_tuple_length, max_factor,
+                               grid_size, **options)
+    return sum(1 for _ in islice(solutions, limit))
+
+def _slot_clues(clues, grid_size, max_tuple_length, max_factor):
+    """Expand position-keyed clues into the internal clue list, cluepos and default bounds."""
+    clue_list = [(value, side, index) for (side, index), value in clues.items()]
+    cluepos = {position_of_slot(side, index, grid_size): value
+               for (side, index), value in clues.items()}
+    if max_tuple_length is None:
+        # At most one mirror per two cells
+        max_tuple_length = grid_size**2 // 2
+    if max_factor is None:
+        # The longest possible segment
+        max_factor = grid_size + 1
+    return clue_list, cluepos, max_tuple_length, max_factor
+
+def solve_clues(clues, grid_size=10, max_tuple_length=None, max_factor=None, **options):
+    """
+    Solve a puzzle given as clues keyed by border slot.
     
-    chosen_configs, final_matrix = solution
+    Unlike solve_puzzle, whose dic is keyed by clue number, every clue is
+    kept even when several share the same value.
     
-    # Calculate all trajectory products
-    trajectory_products = {}
-    for side in ["top", "bottom", "left", "right"]:
-        for idx in range(grid_size):
-            prod = compute_trajectory_product(final_matrix, side, idx, grid_size)
-            trajectory_products[(side, idx)] = prod
+    Args:
+        clues: Dictionary mapping (side, index) slots to clue numbers
+        grid_size: Size of the grid
+        max_tuple_length: Maximum factorization tuple length (default
+            grid_size**2 // 2, one mirror per two cells)
+        max_factor: Maximum allowed factor (default grid_size + 1, the
+            longest segment)
+        **options: Further solve_puzzle keyword arguments (backend, engine, ...)
+        
+    Returns:
+        A tuple (configs, matrix, products) as in solve_puzzle, with configs
+        in the order of clues, None if there is no solution, or a
+        budget.Incomplete if the token expired first
+    """
+    clue_list, cluepos, max_tuple_length, max_factor = _slot_clues(
+        clues, grid_size, max_tuple_length, max_factor)
+    return _solve(clue_list, cluepos, max_tuple_length, max_factor, grid_size, **options)
+
+def iter_clue_solutions(clues, grid_size=10, max_tuple_length=None, max_factor=None, **options):
+    """
+    Lazily enumerate every solution of a puzzle given as clues keyed by border slot.
     
-    return chosen_configs, final_matrix, trajectory_products
\ No newline at end of file
+    Args:
+        Same as solve_clues, with the options of iter_solutions
+        
+    Yields:
+        (configs, matrix, products) tuples as returned by solve_clues
+    """
+    clue_list, cluepos, max_tuple_length, max_factor = _slot_clues(
+        clues, grid_size, max_tuple_length, max_factor)
+    yield from _iter_solutions(clue_list, cluepos, max_tuple_length, max_factor, grid_size,
+                               **options)
+
+def solve_canonical(clues, grid_size=10, max_tuple_length=None, max_factor=None, memo=None,
+                    **options):
+    """
+    Solve a puzzle through its canonical orientation.
+
+    The canonical form is solved (or looked up in memo) and the solution is
+    mapped back, so the eight symmetric variants of a puzzle cost one solve.
+    When a puzzle has several solutions, the one returned may differ from
+    solve_clues on the original orientation.
+
+    Args:
+        clues, grid_size, max_tuple_length, max_factor, **options: As in
+            solve_clues
+        memo: Optional dictionary of canonical solutions, keyed by grid size,
+            canonical clues and bounds, that is read and filled in
+
+    Returns:
+        A tuple (configs, matrix, products) as in solve_clues, None if there
+        is no solution, or a budget.Incomplete (whose checkpoint is that of the
+        canonical form) if the token expired first
+    """
+    name, canonical = canonicalize(clues, grid_size)
+    key = (grid_size, tuple(canonical.items()), max_tuple_length, max_factor)
+    if memo is not None and key in memo:
+        solution = memo[key]
+    else:
+        solution = solve_clues(canonical, grid_size, max_tuple_length, max_factor, **options)
+        if isinstance(solution, Incomplete):
+            return solution
+        if memo is not None:
+            memo[key] = solution
+    if solution is None:
+        return None
+
+    configs, mat, products = transform_solution(solution, inverse_symmetry(name), grid_size)
+    # Put the configs back in the order of the original clues
+    order = {slot: k for k, slot in enumerate(canonical)}
+    configs = [configs[order[transform_slot(side, index, name, grid_size)]]
+               for (side, index) in clues]
+    return configs, mat, products
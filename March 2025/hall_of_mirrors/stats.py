@@ -0,0 +1,182 @@
+import json
+import time
+from contextlib import contextmanager
+
+class SolveStats:
+    """
+    Statistics and profiling hooks of a solve.
+
+    Pass an instance as stats= to solve_puzzle (or any solver entry point) to
+    record, per clue, the candidates enumerated, kept by the baseline filter
+    and kept by propagation; the compatibility checks performed; the wall time
+    of every stage; and, for the serial backtracking strategies, the nodes
+    expanded and the dead ends at every search depth. Without an instance the
+    solver skips all of this.
+
+    A node is a candidate assigned to a layer; its depth is the number of
+    layers assigned before it. A node is a backtrack when its subtree holds no
+    solution.
+    """
+
+    def __init__(self, on_node_enter=None, on_node_exit=None, on_solution=None):
+        """
+        Args:
+            on_node_enter: Optional callback (depth, layer, index) called when
+                candidate index of a layer is assigned
+            on_node_exit: Optional callback (depth, layer, index) called when
+                that assignment is undone
+            on_solution: Optional callback (chosen) called with the selected
+                candidate index of every layer for each solution found
+        """
+        self.on_node_enter = on_node_enter
+        self.on_node_exit = on_node_exit
+        self.on_solution = on_solution
+        self.clues = []
+        self.stages = {}
+        self.nodes = []
+        self.backtracks = []
+        self.compat_checks = 0
+        self.solutions = 0
+        self.propagation = None
+        # Node counts keyed by the layers assigned along the branch
+        self.search_paths = {}
+        self._path = []
+        self._open = []
+
+    # Recording -------------------------------------------------------------
+
+    def add_clue(self, value, side, index, candidates, kept, seconds):
+        """Record the candidates of a clue before and after the baseline filter."""
+        self.clues.append({'side': side, 'index': index, 'value': value,
+                           'candidates': candidates, 'after_baseline': kept,
+                           'after_filter': kept, 'seconds': seconds})
+
+    def set_filtered(self, counts):
+        """Record the candidates of every clue left after propagation or filtering."""
+        for clue, count in zip(self.clues, counts):
+            clue['after_filter'] = count
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager adding the wall time of its block to a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def timed(self, iterator, name):
+        """Yield from iterator, adding only the time spent inside it to a stage."""
+        iterator = iter(iterator)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+            yield item
+
+    def count_checks(self, compatible):
+        """Wrap a compatible(base, candidate) function so that its calls are counted."""
+        def counted(base, candidate):
+            self.compat_checks += 1
+            return compatible(base, candidate)
+        return counted
+
+    def count_batch_checks(self, compatible_batch):
+        """Wrap a compatible_batch(base, stack) function, counting one check per candidate."""
+        def counted(base, stack):
+            self.compat_checks += len(stack)
+            return compatible_batch(base, stack)
+        return counted
+
+    def enter_node(self, depth, layer, index):
+        """Record the assignment of candidate index of a layer at a search depth."""
+        while depth >= len(self.nodes):
+            self.nodes.append(0)
+            self.backtracks.append(0)
+        self.nodes[depth] += 1
+        # Branches abandoned without exit_node (e.g. once a solution is
+        # returned) are dropped here.
+        del self._path[depth:]
+        del self._open[depth:]
+        self._path.append(layer)
+        self._open.append(self.solutions)
+        path = tuple(self._path)
+        self.search_paths[path] = self.search_paths.get(path, 0) + 1
+        if self.on_node_enter is not None:
+            self.on_node_enter(depth, layer, index)
+
+    def exit_node(self, depth, layer, index):
+        """Record that the assignment made by enter_node is undone."""
+        if depth < len(self._open):
+            if self._open[depth] == self.solutions:
+                self.backtracks[depth] += 1
+            del self._path[depth:]
+            del self._open[depth:]
+        if self.on_node_exit is not None:
+            self.on_node_exit(depth, layer, index)
+
+    def solution_found(self, chosen):
+        """Record a solution, given the selected candidate index of every layer."""
+        self.solutions += 1
+        if self.on_solution is not None:
+            self.on_solution(chosen)
+
+    # Export ----------------------------------------------------------------
+
+    def _clue_label(self, layer):
+        if layer < len(self.clues):
+            clue = self.clues[layer]
+            return f"{clue['side']}-{clue['index']}={clue['value']}"
+        return f"layer-{layer}"
+
+    def to_dict(self):
+        """The statistics as a JSON-ready dictionary."""
+        return {
+            'clues': self.clues,
+            'stages': self.stages,
+            'nodes': self.nodes,
+            'backtracks': self.backtracks,
+            'total_nodes': sum(self.nodes),
+            'total_backtracks': sum(self.backtracks),
+            'compat_checks': self.compat_checks,
+            'solutions': self.solutions,
+            'propagation': self.propagation,
+        }
+
+    def to_json(self, **kwargs):
+        """The statistics as a JSON string (kwargs are passed to json.dumps)."""
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_folded(self, kind='stages'):
+        """
+        The statistics in the folded-stack format read by flamegraph tools.
+
+        Args:
+            kind: 'stages' for the wall time of every stage in microseconds,
+                with the 'candidates' stage split by clue, or 'search' for the
+                nodes expanded below every branch of layers
+
+        Returns:
+            A string with one 'frame;frame;... weight' line per stack
+        """
+        lines = []
+        if kind == 'stages':
+            for name, seconds in self.stages.items():
+                if name == 'candidates':
+                    for k, clue in enumerate(self.clues):
+                        lines.append((f"solve;candidates;{self._clue_label(k)}",
+                                      clue['seconds']))
+                    seconds -= sum(clue['seconds'] for clue in self.clues)
+                lines.append((f"solve;{name}", seconds))
+            lines = [f"{stack} {max(0, round(seconds * 1e6))}" for stack, seconds in lines]
+        elif kind == 'search':
+            for path, count in self.search_paths.items():
+                frames = ';'.join(self._clue_label(layer) for layer in path)
+                lines.append(f"search;{frames} {count}")
+        else:
+            raise ValueError(f"Unknown folded stack kind: {kind!r}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,216 @@
+import numpy as np
+from functools import lru_cache
+from .simulation import SIDES, slot_of_position, position_of_slot
+from .bitboard import Bitboard
+from .candidate import Candidate
+
+# The eight symmetries of the square (the dihedral group D4), as integer
+# matrices (a, b, c, d) acting on coordinates relative to the grid centre:
+#   x' = a*x + b*y,  y' = c*x + d*y
+# with y pointing up. Rotations are counterclockwise.
+SYMMETRIES = {
+    'identity': (1, 0, 0, 1),
+    'rot90': (0, -1, 1, 0),
+    'rot180': (-1, 0, 0, -1),
+    'rot270': (0, 1, -1, 0),
+    'flip_x': (-1, 0, 0, 1),
+    'flip_y': (1, 0, 0, -1),
+    'transpose': (0, 1, 1, 0),
+    'anti_transpose': (0, -1, -1, 0),
+}
+
+_SYMMETRY_NAMES = {matrix: name for name, matrix in SYMMETRIES.items()}
+
+_SWAPPED_TYPE = {'A': 'B', 'B': 'A'}
+
+def inverse_symmetry(name):
+    """Name of the symmetry undoing 'name'."""
+    a, b, c, d = SYMMETRIES[name]
+    # Orthogonal matrix: the inverse is the transpose
+    return _SYMMETRY_NAMES[(a, c, b, d)]
+
+def compose_symmetries(first, second):
+    """Name of the symmetry applying 'first', then 'second'."""
+    a1, b1, c1, d1 = SYMMETRIES[first]
+    a2, b2, c2, d2 = SYMMETRIES[second]
+    return _SYMMETRY_NAMES[(a2*a1 + b2*c1, a2*b1 + b2*d1, c2*a1 + d2*c1, c2*b1 + d2*d1)]
+
+def swaps_mirrors(name):
+    """
+    Whether the symmetry turns A mirrors into B mirrors and back.
+
+    An A mirror '/' lies along the (1, 1) diagonal; it stays an A mirror
+    exactly when the symmetry maps that diagonal onto itself.
+    """
+    a, b, c, d = SYMMETRIES[name]
+    return a + b != c + d
+
+def transform_point(point, name, grid_size):
+    """
+    Apply a symmetry to a point, e.g. a half-integer cluepos position.
+
+    Args:
+        point: (x, y) coordinates, with cell (x, y) spanning [x, x+1] x [y, y+1]
+        name: Key of SYMMETRIES
+        grid_size: Size of the grid
+
+    Returns:
+        The transformed (x, y) point
+    """
+    a, b, c, d = SYMMETRIES[name]
+    centre = grid_size / 2
+    dx, dy = point[0] - centre, point[1] - centre
+    return (centre + a*dx + b*dy, centre + c*dx + d*dy)
+
+def transform_cell(x, y, name, grid_size):
+    """Apply a symmetry to cell (x, y), returning the image cell."""
+    a, b, c, d = SYMMETRIES[name]
+    # Doubled coordinates of the cell centre relative to the grid centre
+    last = grid_size - 1
+    u, v = 2*x - last, 2*y - last
+    return ((a*u + b*v + last) // 2, (c*u + d*v + last) // 2)
+
+def transform_slot(side, index, name, grid_size):
+    """Apply a symmetry to a (side, index) border slot."""
+    position = position_of_slot(side, index, grid_size)
+    return slot_of_position(transform_point(position, name, grid_size), grid_size)
+
+def transform_config(config, name, grid_size):
+    """Apply a symmetry to a list of (x, y, type) mirrors, keeping their order."""
+    swap = swaps_mirrors(name)
+    transformed = []
+    for (x, y, mtype) in config:
+        tx, ty = transform_cell(x, y, name, grid_size)
+        transformed.append((tx, ty, _SWAPPED_TYPE[mtype] if swap else mtype))
+    return transformed
+
+@lru_cache(maxsize=None)
+def _bit_permutation(name, grid_size):
+    """Index of the image of every cell y * grid_size + x (also its bitboard bit)."""
+    permutation = []
+    for bit in range(grid_size * grid_size):
+        tx, ty = transform_cell(bit % grid_size, bit // grid_size, name, grid_size)
+        permutation.append(ty * grid_size + tx)
+    return permutation
+
+def _permute_mask(mask, permutation):
+    result = 0
+    while mask:
+        low = mask & -mask
+        result |= 1 << permutation[low.bit_length() - 1]
+        mask ^= low
+    return result
+
+def transform_bitboard(bb, name, grid_size):
+    """Apply a symmetry to a Bitboard."""
+    if name == 'identity':
+        return bb
+    permutation = _bit_permutation(name, grid_size)
+    path, mirror_a, mirror_b, forbidden = (_permute_mask(mask, permutation) for mask in bb)
+    if swaps_mirrors(name):
+        mirror_a, mirror_b = mirror_b, mirror_a
+    return Bitboard(path, mirror_a, mirror_b, forbidden)
+
+def transform_candidate(candidate, name, grid_size):
+    """Apply a symmetry to a Candidate."""
+    if name == 'identity':
+        return candidate
+    permutation = _bit_permutation(name, grid_size)
+    return Candidate(transform_config(candidate.mirrors, name, grid_size),
+                     (permutation[cell] for cell in candidate.path))
+
+def transform_layer(layer, name, grid_size):
+    """
+    Apply a symmetry to a candidate layer (a list of Candidates).
+
+    The result is the layer of the image clue slot, under the image of the
+    cluepos the layer was built with.
+    """
+    if name == 'identity':
+        return layer
+    return [transform_candidate(candidate, name, grid_size) for candidate in layer]
+
+def transform_matrix(mat, name, grid_size):
+    """Apply a symmetry to a grid matrix (mat[y, x], -3 for A and -2 for B mirrors)."""
+    mat = np.asarray(mat)
+    result = np.empty_like(mat)
+    for y in range(grid_size):
+        for x in range(grid_size):
+            tx, ty = transform_cell(x, y, name, grid_size)
+            result[ty, tx] = mat[y, x]
+    if swaps_mirrors(name):
+        a_cells, b_cells = result == -3, result == -2
+        result[a_cells], result[b_cells] = -2, -3
+    return result
+
+def transform_clues(clues, name, grid_size):
+    """Apply a symmetry to clues keyed by (side, index) slot."""
+    return {transform_slot(side, index, name, grid_size): value
+            for (side, index), value in clues.items()}
+
+def transform_solution(solution, name, grid_size):
+    """
+    Apply a symmetry to a (configs, matrix, products) solution.
+
+    Configs keep their order; the products dictionary is keyed by the image
+    slots.
+    """
+    configs, mat, products = solution
+    return ([transform_config(config, name, grid_size) for config in configs],
+            transform_matrix(mat, name, grid_size),
+            {transform_slot(side, index, name, grid_size): product
+             for (side, index), product in products.items()})
+
+def _clue_sort_key(clues):
+    return tuple(sorted((SIDES.index(side), index, value) for (side, index), value in clues.items()))
+
+def canonicalize(clues, grid_size):
+    """
+    Map a clue set to its canonical orientation.
+
+    All eight rotations and reflections of a puzzle have the same canonical
+    form, so it can serve as a lookup key for work shared between them.
+
+    Args:
+        clues: Dictionary mapping (side, index) slots to clue numbers
+        grid_size: Size of the grid
+
+    Returns:
+        A tuple (name, canonical_clues) where name is the symmetry taking clues
+        to canonical_clues, whose slots are in sorted order
+    """
+    best = None
+    for name in SYMMETRIES:
+        key = _clue_sort_key(transform_clues(clues, name, grid_size))
+        if best is None or key < best[0]:
+            best = key, name
+    key, name = best
+    return name, {(SIDES[side], index): value for side, index, value in key}
+
+def canonical_layer_key(clue_num, side, index, grid_size, cluepos):
+    """
+    Canonical form of the input of a clue's candidate layer.
+
+    A layer depends on the clue, its slot and the border positions its path
+    may not exit through (those holding a different clue). Slots whose inputs
+    are images of each other under a symmetry get the same key, and their
+    layers are images of each other under transform_layer.
+
+    Args:
+        clue_num, side, index: The clue
+        grid_size: Size of the grid
+        cluepos: Dictionary mapping positions to clue numbers
+
+    Returns:
+        A tuple (name, key) where name is the symmetry taking the clue to its
+        canonical form and key is a hashable description of that form
+    """
+    blocked = [pos for pos, value in cluepos.items() if value != clue_num]
+    best = None
+    for name in SYMMETRIES:
+        key = (clue_num, transform_slot(side, index, name, grid_size),
+               tuple(sorted(transform_point(pos, name, grid_size) for pos in blocked)))
+        if best is None or key < best[0]:
+            best = key, name
+    key, name = best
+    return name, key
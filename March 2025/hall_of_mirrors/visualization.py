@@ -1,6 +1,6 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from .simulation import compute_trajectory_product
+from .simulation import trace_all_borders, border_products_dict
 
 def plot_solution(mirrors, grid_size=10, trajectory_products=None):
     """
@@ -25,11 +25,8 @@ def plot_solution(mirrors, grid_size=10, trajectory_products=None):
                 final_matrix[row, col] = -2
         
         # Calculate trajectory products for each border cell
-        trajectory_products = {}
-        for side in ["top", "bottom", "left", "right"]:
-            for idx in range(grid_size):
-                prod = compute_trajectory_product(final_matrix, side, idx, grid_size)
-                trajectory_products[(side, idx)] = prod
+        products, _ = trace_all_borders(final_matrix, grid_size)
+        trajectory_products = border_products_dict(products)
     
     # Setup the plot
     fig, ax = plt.subplots(figsize=(8, 8))
@@ -0,0 +1,62 @@
+import os
+import pytest
+from hall_of_mirrors.budget import CancelToken, Incomplete
+from hall_of_mirrors.generator import generate_puzzle
+from hall_of_mirrors.jobs import parse_spec
+from hall_of_mirrors.solver import solve_clues
+from hall_of_mirrors.stats import SolveStats
+
+# A puzzle whose first solution takes the static search 180 nodes to reach
+CLUES, KWARGS = parse_spec(generate_puzzle(8, n_clues=8, seed=2))
+
+def _solve_in_chunks(nodes, checkpoint=None, backends=('bitboard',), **options):
+    """
+    Solve CLUES, cancelling every 'nodes' search nodes and resuming from the
+    checkpoint until the solve completes; the backend cycles through backends.
+
+    Returns:
+        A tuple (result, runs)
+    """
+    runs = 0
+    while True:
+        token, entered = CancelToken(), [0]
+
+        def enter(depth, layer, index):
+            entered[0] += 1
+            if entered[0] == nodes:
+                token.cancel()
+
+        result = solve_clues(CLUES, **KWARGS, **options, backend=backends[runs % len(backends)],
+                             token=token, checkpoint=checkpoint,
+                             stats=SolveStats(on_node_enter=enter))
+        runs += 1
+        if not isinstance(result, Incomplete):
+            return result, runs
+        assert result.reason == 'cancelled'
+        assert runs < 100, "resumed searches are not making progress"
+        if not isinstance(checkpoint, (str, os.PathLike)):
+            checkpoint = result.checkpoint
+
+@pytest.mark.parametrize('strategy, nodes', [('static', 20), ('mrv', 3), ('bitset', 3)])
+def test_resume_matches_uninterrupted_solve(strategy, nodes):
+    expected = solve_clues(CLUES, **KWARGS, strategy=strategy)
+    result, runs = _solve_in_chunks(nodes, strategy=strategy)
+    assert runs > 2
+    assert (result[1] == expected[1]).all()
+    assert result[2] == expected[2]
+
+def test_resume_from_file_across_backends_and_cache(tmp_path):
+    expected = solve_clues(CLUES, **KWARGS, strategy='static')
+    path = tmp_path / 'puzzle.checkpoint.json'
+    result, runs = _solve_in_chunks(30, path, ('bitboard', 'numpy', 'matrix'),
+                                    strategy='static', cache=tmp_path / 'cache')
+    assert runs > 3
+    assert result[2] == expected[2]
+    # A finished solve removes its checkpoint
+    assert not path.exists()
+
+def test_deadline_returns_incomplete():
+    result = solve_clues(CLUES, **KWARGS, token=CancelToken(timeout=0))
+    assert isinstance(result, Incomplete)
+    assert result.reason == 'deadline'
+    assert result.checkpoint['frontier'] == []
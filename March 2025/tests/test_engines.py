@@ -0,0 +1,41 @@
+import json
+import os
+import pytest
+from hall_of_mirrors.jobs import parse_spec
+from hall_of_mirrors.solver import solve_clues
+
+PUZZLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       'solution', 'puzzles.jsonl')
+
+def _puzzles():
+    with open(PUZZLES) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+OPTIONS = [
+    {'engine': 'sat'},
+    {'engine': 'cells'},
+    {'backend': 'numpy'},
+    {'backend': 'matrix'},
+    {'strategy': 'bitset'},
+    {'strategy': 'static'},
+    {'propagation': True},
+    {'enumeration': 'trie'},
+    {'enumeration': 'factorize'},
+    {'workers': 2},
+    {'search_workers': 2},
+    {'search_workers': 2, 'strategy': 'bitset'},
+]
+
+@pytest.mark.parametrize('spec', _puzzles(), ids=lambda spec: spec['id'])
+@pytest.mark.parametrize('options', OPTIONS, ids=lambda options: ','.join(
+    f"{key}={value}" for key, value in options.items()))
+def test_engines_agree(spec, options):
+    clues, kwargs = parse_spec(spec)
+    expected = solve_clues(clues, **kwargs)
+    assert expected is not None
+
+    _, matrix, products = solve_clues(clues, **kwargs, **options)
+    assert (matrix == expected[1]).all()
+    assert products == expected[2]
+    for (side, index), value in clues.items():
+        assert products[(side, index)] == value
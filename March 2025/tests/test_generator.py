@@ -0,0 +1,23 @@
+from itertools import islice
+import pytest
+from hall_of_mirrors.generator import generate_puzzle, layout_products
+from hall_of_mirrors.jobs import parse_spec
+from hall_of_mirrors.solver import iter_clue_solutions
+
+# Seeds 6 and 9 used to store a layout other than the single solution found
+@pytest.mark.parametrize('seed', [1, 2, 6, 9])
+def test_unique_puzzle_solution_is_the_stored_layout(seed):
+    spec = generate_puzzle(6, n_clues=4, unique=True, seed=seed)
+    assert spec['unique']
+    clues, kwargs = parse_spec(spec)
+    solutions = list(islice(iter_clue_solutions(clues, **kwargs), 2))
+    assert len(solutions) == 1
+
+    expected = layout_products([tuple(mirror) for mirror in spec['solution']], 6)
+    assert solutions[0][2] == expected
+    for engine in ('sat', 'cells'):
+        (_, _, products), = islice(iter_clue_solutions(clues, **kwargs, engine=engine), 2)
+        assert products == expected
+
+def test_same_seed_same_puzzle():
+    assert generate_puzzle(8, n_clues=10, seed=3) == generate_puzzle(8, n_clues=10, seed=3)
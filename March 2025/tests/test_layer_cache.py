@@ -0,0 +1,58 @@
+import json
+from itertools import islice
+from hall_of_mirrors.layer_cache import LayerCache, layer_key, cached_clue_layers
+from hall_of_mirrors.solver import clue_layer, iter_clue_solutions, _slot_clues
+from hall_of_mirrors.jobs import parse_spec
+from tests.test_engines import PUZZLES
+
+def _tasks():
+    with open(PUZZLES) as f:
+        specs = [json.loads(line) for line in f if line.strip()]
+    clues, kwargs = parse_spec(specs[-1])
+    grid_size = kwargs['grid_size']
+    clue_list, cluepos, max_tuple_length, max_factor = _slot_clues(clues, grid_size, None, None)
+    return {tuple(clue): (grid_size, cluepos, max_tuple_length, max_factor, 'fused')
+            for clue in clue_list}
+
+def _build(tasks):
+    return {task: clue_layer(*task, *args) for task, args in tasks.items()}
+
+def test_put_get_round_trip(tmp_path):
+    tasks = _tasks()
+    (task, args), = islice(tasks.items(), 1)
+    layer = clue_layer(*task, *args)
+    key = layer_key(*task, *args)
+    writer = LayerCache(tmp_path)
+    writer.put(key, layer)
+    writer.flush()
+
+    cache = LayerCache(tmp_path)
+    assert cache.get(key) == layer
+    assert cache.hits == 1
+
+def test_cached_layers_keep_their_order(tmp_path):
+    tasks = _tasks()
+    expected = _build(tasks)
+
+    cache = LayerCache(tmp_path)
+    cold = cached_clue_layers(cache, tasks, _build)
+    warm = cached_clue_layers(LayerCache(tmp_path), tasks, _build)
+    assert cold == expected
+    assert warm == expected
+    assert cache.misses == len(tasks)
+
+def test_solutions_do_not_depend_on_the_cache(tmp_path):
+    clues = {('top', 1): 12, ('bottom', 6): 12, ('left', 3): 2}
+    expected = [products for _, _, products in islice(iter_clue_solutions(clues, 8), 4)]
+    assert len(expected) > 1
+
+    # The mirrored clue alone stores the layer that the first clue is then read from
+    list(islice(iter_clue_solutions({('bottom', 6): 12}, 8, cache=tmp_path), 1))
+    for _ in range(2):
+        found = [products for _, _, products in
+                 islice(iter_clue_solutions(clues, 8, cache=tmp_path), 4)]
+        assert found == expected
+    for enumeration in ('trie', 'factorize'):
+        found = [products for _, _, products in
+                 islice(iter_clue_solutions(clues, 8, enumeration=enumeration), 4)]
+        assert found == expected
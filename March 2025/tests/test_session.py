@@ -0,0 +1,58 @@
+from itertools import islice
+import pytest
+from hall_of_mirrors.generator import generate_puzzle, layout_products
+from hall_of_mirrors.jobs import parse_spec
+from hall_of_mirrors.session import PuzzleSession
+from hall_of_mirrors.solver import iter_clue_solutions
+
+# Above the solution counts of the puzzles below, so that all their solutions are compared
+LIMIT = 100
+
+def _products(solutions):
+    return sorted(tuple(sorted(products.items())) for _, _, products in islice(solutions, LIMIT))
+
+def _check(session):
+    expected = _products(iter_clue_solutions(session.clues, session.grid_size))
+    assert len(expected) < LIMIT
+    assert _products(session.iter_solutions()) == expected
+    assert session.count_solutions(LIMIT) == len(expected)
+    solution = session.solve()
+    if expected:
+        assert tuple(sorted(solution[2].items())) in expected
+    else:
+        assert solution is None
+
+@pytest.mark.parametrize('seed', [2, 3])
+def test_edits_match_fresh_solves(seed):
+    spec = generate_puzzle(10, n_clues=12, seed=seed)
+    clues, kwargs = parse_spec(spec)
+    products = layout_products([tuple(mirror) for mirror in spec['solution']], 10)
+    session = PuzzleSession(kwargs['grid_size'], clues)
+    _check(session)
+
+    removed = sorted(clues)[:3]
+    for slot in removed:
+        session.remove_clue(*slot)
+        _check(session)
+    for slot in removed:
+        session.add_clue(*slot, clues[slot])
+    assert session.clues == clues
+    _check(session)
+
+    hidden = sorted(slot for slot in products if slot not in clues)
+    session.add_clue(*hidden[0], products[hidden[0]])
+    _check(session)
+    # A wrong value leaves the clues without a solution, and undoing it restores them
+    session.add_clue(*hidden[0], products[hidden[0]] + 1)
+    _check(session)
+    session.remove_clue(*hidden[0])
+    _check(session)
+
+def test_invalid_edits():
+    session = PuzzleSession(5)
+    with pytest.raises(ValueError):
+        session.add_clue('top', 5, 4)
+    with pytest.raises(ValueError):
+        session.add_clue('middle', 0, 4)
+    with pytest.raises(KeyError):
+        session.remove_clue('top', 0)